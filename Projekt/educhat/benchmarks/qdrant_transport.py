@@ -0,0 +1,205 @@
+"""REST gegen gRPC an einem echten Qdrant: Latenz pro Suche und Durchsatz beim Bulk-Upsert.
+
+stubs.py spricht nur REST, deshalb läuft dieser Vergleich gegen eine laufende Instanz
+(``docker compose up qdrant``, Ports 6333 und 6334). Pro Transport wird eine Wegwerf-Collection
+mit denselben Punkten gefüllt und mit denselben Anfragen durchsucht:
+
+    python benchmarks/qdrant_transport.py --qdrant-url http://localhost:6333 --out transport.json
+    python benchmarks/qdrant_transport.py --points 50000 --concurrency 64 --compare transport.json
+
+Gemessen wird über ``educhat_common.qdrant_transport`` – also genau der Code, den die Dienste
+nutzen. Das Ergebnis-JSON hat das Format von run_benchmarks.py, ``--compare`` funktioniert gleich.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), "educhat-common"))
+from run_benchmarks import compare, git_commit, summarize  # noqa: E402
+from stubs import CITIES, FORMATS, TOPICS  # noqa: E402
+from educhat_common.clients import get_session  # noqa: E402
+from educhat_common.collection_schema import ensure_collection, search_body  # noqa: E402
+from educhat_common.qdrant_transport import GrpcTransport, RestTransport  # noqa: E402
+
+
+def vectors(count, dim, seed):
+    rng = np.random.default_rng(seed)
+    matrix = rng.standard_normal((count, dim)).astype(np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def points(matrix):
+    # Payload in der Größenordnung echter Kurse: Titel, ein paar hundert Zeichen Text, Tags
+    for i, vec in enumerate(matrix):
+        topic, city = TOPICS[i % len(TOPICS)], CITIES[i % len(CITIES)]
+        yield {"id": str(uuid.uuid5(uuid.NAMESPACE_URL, f"bench:transport:{i}")), "vector": vec.tolist(),
+               "payload": {"title": f"{FORMATS[i % len(FORMATS)]} {topic} in {city}",
+                           "content": f"{topic} praxisnah in {city}. " * 12, "tags": [topic, city],
+                           "topic": topic}}
+
+
+def make_transport(mode, args):
+    if mode == "grpc":
+        return GrpcTransport(args.qdrant_url, target=args.grpc_url or None)
+    return RestTransport(args.qdrant_url)
+
+
+def wait_green(collection, args, timeout=300):
+    """Wartet, bis Qdrant den Index fertig gebaut hat – sonst misst die Suche den Optimizer mit"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        r = get_session().get(f"{args.qdrant_url}/collections/{collection}")
+        if r.ok and r.json().get("result", {}).get("status") == "green":
+            return True
+        time.sleep(0.5)
+    return False
+
+
+async def bench_upsert(transport, collection, matrix, args):
+    batches, batch = [], []
+    for point in points(matrix):
+        batch.append(point)
+        if len(batch) >= args.batch_size:
+            batches.append(batch)
+            batch = []
+    if batch:
+        batches.append(batch)
+
+    latencies, queue = [], list(reversed(batches))
+
+    async def worker():
+        while queue:
+            part = queue.pop()
+            start = time.perf_counter()
+            await transport.aupsert(collection, part)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.upsert_concurrency)))
+    wall = time.perf_counter() - start
+    return dict(summarize(latencies, wall), points=len(matrix), batch_size=args.batch_size,
+                concurrency=args.upsert_concurrency, points_per_s=round(len(matrix) / wall, 1))
+
+
+def bench_search_sequential(transport, collection, bodies, args):
+    """Eine Anfrage nach der anderen (Sync-Pfad wie im Chat): reine Latenz pro Suche"""
+    for body in bodies[:args.warmup]:
+        transport.search(collection, body)
+    latencies = []
+    start = time.perf_counter()
+    for body in bodies[args.warmup:]:
+        t = time.perf_counter()
+        transport.search(collection, body)
+        latencies.append(time.perf_counter() - t)
+    return summarize(latencies, time.perf_counter() - start)
+
+
+async def bench_search_parallel(transport, collection, bodies, args):
+    """``--concurrency`` Anfragen gleichzeitig (Async-Pfad wie in der Alerts-API)"""
+    latencies, queue = [], list(reversed(bodies[args.warmup:]))
+    for body in bodies[:args.warmup]:
+        await transport.asearch(collection, body)
+
+    async def worker():
+        while queue:
+            body = queue.pop()
+            t = time.perf_counter()
+            await transport.asearch(collection, body)
+            latencies.append(time.perf_counter() - t)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    return dict(summarize(latencies, time.perf_counter() - start), concurrency=args.concurrency)
+
+
+def request_bytes(transport, collection, body):
+    """Größe einer Suchanfrage auf der Leitung (ohne HTTP-Header)"""
+    if isinstance(transport, GrpcTransport):
+        return transport._search_points(collection, body).ByteSize()
+    return len(json.dumps(body).encode("utf-8"))
+
+
+async def run(args, modes):
+    matrix = vectors(args.points, args.dim, seed=1)
+    queries = vectors(args.queries + args.warmup, args.dim, seed=2)
+    bodies = [search_body(q.tolist(), args.top_k, fields=("title",)) for q in queries]
+    results, transports = {}, {}
+    for mode in modes:
+        try:
+            transports[mode] = make_transport(mode, args)
+        except RuntimeError as e:
+            results[mode] = {"skipped": str(e)}
+
+    # erst alle Collections füllen, dann suchen: gleiche Bedingungen für beide Transporte
+    for mode, transport in transports.items():
+        collection = f"{args.collection_prefix}_{mode}"
+        get_session().delete(f"{args.qdrant_url}/collections/{collection}")
+        ensure_collection(get_session(), args.qdrant_url, collection, args.dim)
+        results[mode] = {"upsert": await bench_upsert(transport, collection, matrix, args)}
+    for mode, transport in transports.items():
+        collection = f"{args.collection_prefix}_{mode}"
+        results[mode]["indexed"] = await asyncio.to_thread(wait_green, collection, args)
+        results[mode]["search_request_bytes"] = request_bytes(transport, collection, bodies[0])
+        results[mode]["search"] = await asyncio.to_thread(bench_search_sequential, transport, collection,
+                                                          bodies, args)
+        results[mode]["search_parallel"] = await bench_search_parallel(transport, collection, bodies, args)
+        if not args.keep:
+            get_session().delete(f"{args.qdrant_url}/collections/{collection}")
+        transport.close()
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--qdrant-url", default=os.environ.get("QDRANT_URL", "http://localhost:6333"))
+    parser.add_argument("--grpc-url", default=os.environ.get("QDRANT_GRPC_URL", ""),
+                        help="host:port, leer = Host aus --qdrant-url mit Port 6334")
+    parser.add_argument("--transports", default="rest,grpc")
+    parser.add_argument("--collection-prefix", default="bench_transport")
+    parser.add_argument("--keep", action="store_true", help="Collections nach dem Lauf behalten")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--upsert-concurrency", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--out", default="-", help="JSON-Datei, '-' für stdout")
+    parser.add_argument("--compare", help="früheres Ergebnis-JSON als Vergleichsbasis")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    modes = [m.strip() for m in args.transports.split(",") if m.strip()]
+    report = {"meta": {"commit": git_commit(), "timestamp": datetime.now(timezone.utc).isoformat(),
+                       "python": platform.python_version(), "platform": platform.platform(),
+                       "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")}},
+              "results": {"qdrant_transport": asyncio.run(run(args, modes))}}
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            report["comparison"] = compare(report, json.load(f))
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out == "-":
+        print(text)
+    else:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"Ergebnisse nach {args.out} geschrieben.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+"""Offline-Benchmarks für Chat-CLI, Alerts-API und Scraper gegen lokale Stand-ins (stubs.py).
+
+Misst Latenzen (p50/p95/p99) und Durchsatz und schreibt alles als JSON, damit sich
+Commits vergleichen lassen:
+
+    python benchmarks/run_benchmarks.py --out bench.json
+    python benchmarks/run_benchmarks.py --only alerts --concurrency 64 --out neu.json --compare bench.json
+
+Kein Netzwerkzugriff nötig; der Scraper-Teil braucht im Browser-Modus Playwright und wird
+sonst als übersprungen vermerkt. ``--scraper-mode browser`` und ``api``
+gegeneinander laufen lassen zeigt, was der Abruf über die Such-API spart; ``--replay`` spielt
+aufgenommene Antworten der echten Such-API ab. REST gegen gRPC zu Qdrant vergleicht
+qdrant_transport.py, weil die Stand-ins nur REST sprechen.
+"""
+import argparse
+import asyncio
+import builtins
+import contextlib
+import io
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+CHAT_DIR = os.path.join(ROOT, "educhat-embed-chat", "app")
+ALERTS_DIR = os.path.join(ROOT, "educhat-alerts-api", "app")
+SCRAPER_DIR = os.path.join(ROOT, "educhat-scraper", "app")
+
+sys.path.insert(0, HERE)
+from stubs import CITIES, FORMATS, TOPICS  # noqa: E402
+
+SUITES = ("chat", "alerts", "scraper")
+
+
+def summarize(latencies, wall_seconds):
+    """Latenzen in ms als Perzentile (nearest rank) plus Durchsatz pro Sekunde"""
+    values = sorted(latencies)
+    if not values:
+        return {"count": 0}
+
+    def pct(p):
+        return round(values[min(len(values) - 1, max(0, int(round(p / 100 * len(values))) - 1))] * 1000, 3)
+
+    return {"count": len(values), "p50_ms": pct(50), "p95_ms": pct(95), "p99_ms": pct(99),
+            "mean_ms": round(sum(values) / len(values) * 1000, 3), "max_ms": round(values[-1] * 1000, 3),
+            "wall_s": round(wall_seconds, 3), "throughput_per_s": round(len(values) / wall_seconds, 3)}
+
+
+def questions(count):
+    return [f"Welche {FORMATS[i % len(FORMATS)]} {TOPICS[(i * 7) % len(TOPICS)]} gibt es in "
+            f"{CITIES[(i * 5) % len(CITIES)]}? ({i})" for i in range(count)]
+
+
+def loglines(count):
+    return [f"{TOPICS[i % len(TOPICS)]} {FORMATS[(i * 3) % len(FORMATS)]} job failed on node-{i % 17} "
+            f"request {i}" for i in range(count)]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+@contextlib.contextmanager
+def stub_server(args):
+    """Startet stubs.py als eigenen Prozess, damit Stub und Messung sich kein GIL teilen"""
+    cmd = [sys.executable, os.path.join(HERE, "stubs.py"), "--port", "0", "--dim", str(args.dim),
+           "--embed-latency", str(args.embed_latency), "--chat-latency", str(args.chat_latency),
+           "--token-latency", str(args.token_latency), "--answer-tokens", str(args.answer_tokens),
+           "--qdrant-latency", str(args.qdrant_latency), "--site-latency", str(args.site_latency),
+           "--site-page-size", str(args.site_page_size), "--site-pages", str(args.site_pages)]
+    if args.replay:
+        cmd += ["--replay", args.replay]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    try:
+        line = proc.stdout.readline().split()
+        if len(line) != 2 or line[0] != "READY":
+            raise RuntimeError("Stub-Server nicht gestartet")
+        yield f"http://127.0.0.1:{line[1]}"
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def service_env(base_url, args, state_dir):
+    return {
+        "OPENAI_API_KEY": "bench", "OPENAI_BASE_URL": f"{base_url}/v1", "QDRANT_URL": base_url,
+        "EMBED_DIM": str(args.dim), "EMBED_CACHE_PATH": "", "MIN_SCORE": str(args.min_score),
+        "ANSWER_CACHE_THRESHOLD": "0" if args.no_answer_cache else "0.95",
+        "LOCAL_INDEX_PATH": "", "LEXICAL_INDEX_PATH": "", "OPENAI_MAX_RETRIES": "0",
+        "MANIFEST_PATH": os.path.join(state_dir, "manifest.json"),
+        "CHECKPOINT_PATH": os.path.join(state_dir, "checkpoint.json"),
+        "JOURNAL_PATH": os.path.join(state_dir, "courses.jsonl"),
+        "SEARCH_URL": f"{base_url}/weiterbildungssuche/",
+        "SCRAPE_MODE": args.scraper_mode, "SEARCH_API_URL": f"{base_url}{args.search_api_path}",
+        "SEARCH_API_DELAY": "0",
+    }
+
+
+def seed(base_url, collection, count):
+    r = httpx.post(f"{base_url}/_bench/seed", json={"collection": collection, "count": count}, timeout=300)
+    r.raise_for_status()
+
+
+# --- Chat-CLI ---------------------------------------------------------------
+
+def bench_chat(base_url, args):
+    """Treibt run_chat_improved über eine gepatchte input()-Funktion; gemessen wird je Frage"""
+    sys.path.insert(0, CHAT_DIR)
+    import educhat_agent as agent
+    seed(base_url, agent.COLLECTION, args.docs)
+
+    pending = questions(args.chat_questions) + [":exit"]
+    stamps = []
+
+    def fake_input(prompt=""):
+        stamps.append(time.perf_counter())
+        return pending.pop(0)
+
+    original = builtins.input
+    builtins.input = fake_input
+    out = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(out):
+            agent.run_chat_improved()
+    finally:
+        builtins.input = original
+    latencies = [b - a for a, b in zip(stamps, stamps[1:])]
+    result = summarize(latencies, stamps[-1] - stamps[0])
+    result["errors"] = out.getvalue().count("Fehler:")
+    return result
+
+
+# --- Alerts-API -------------------------------------------------------------
+
+async def _load(url, bodies, concurrency):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    latencies, errors = [], 0
+    queue = list(reversed(bodies))
+
+    async with httpx.AsyncClient(limits=limits, timeout=120) as client:
+        async def worker():
+            nonlocal errors
+            while queue:
+                body = queue.pop()
+                start = time.perf_counter()
+                try:
+                    r = await client.post(url, json=body)
+                    if r.status_code >= 400:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return latencies, time.perf_counter() - start, errors
+
+
+def bench_alerts(base_url, args, env):
+    seed(base_url, "sentinel_docs", args.docs)
+    port = free_port()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+                             "--port", str(port), "--log-level", "warning"],
+                            cwd=ALERTS_DIR, env=dict(os.environ, **env))
+    try:
+        api = f"http://127.0.0.1:{port}"
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                if httpx.get(f"{api}/health", timeout=1).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline or proc.poll() is not None:
+                raise RuntimeError("Alerts-API nicht gestartet")
+            time.sleep(0.2)
+
+        lines = loglines(args.alerts_requests + args.warmup)
+        bodies = [{"logline": line} for line in lines]
+        asyncio.run(_load(f"{api}/analyze", bodies[:args.warmup], min(args.warmup, args.concurrency) or 1))
+        latencies, wall, errors = asyncio.run(_load(f"{api}/analyze", bodies[args.warmup:], args.concurrency))
+        result = summarize(latencies, wall)
+        result.update(errors=errors, concurrency=args.concurrency)
+        return result
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+# --- Scraper ----------------------------------------------------------------
+
+def bench_scraper(base_url, args):
+    try:
+        if args.scraper_mode != "api":
+            import playwright  # noqa: F401
+    except ImportError as e:
+        return {"skipped": f"{e.name} nicht installiert"}
+
+    sys.path.insert(0, SCRAPER_DIR)
+    import scraper as scraper_module
+
+    async def run():
+        scraper = scraper_module.WeiterbildungScraper()
+        chunk_times = []
+        upsert_chunk = scraper.upsert_chunk
+
+        async def timed_chunk(courses):
+            start = time.perf_counter()
+            try:
+                return await upsert_chunk(courses)
+            finally:
+                chunk_times.append(time.perf_counter() - start)
+
+        scraper.upsert_chunk = timed_chunk
+        scraper.init_api()
+        if scraper.api is None:
+            await scraper.init_browser()
+        try:
+            scraper.init_qdrant()
+            start = time.perf_counter()
+            results = await asyncio.gather(*(scraper.scrape_search_term(t) for t in args.scraper_terms))
+            scrape_wall = time.perf_counter() - start
+            courses = [c for found, _ in results for c in found]
+
+            phases = {}
+            for phase in ("cold", "warm"):
+                # warm: gleiche Kurse erneut, alles unverändert → nur Delta-Prüfung
+                chunk_times.clear()
+                start = time.perf_counter()
+                await scraper.save_courses([dict(c) for c in courses], args.scraper_terms)
+                wall = time.perf_counter() - start
+                phases[phase] = dict(summarize(chunk_times, wall), courses=len(courses),
+                                     courses_per_s=round(len(courses) / wall, 3) if wall else None)
+            return {"scrape": {"mode": args.scraper_mode, "terms": len(args.scraper_terms), "courses": len(courses),
+                               "wall_s": round(scrape_wall, 3),
+                               "courses_per_s": round(len(courses) / scrape_wall, 3) if scrape_wall else None},
+                    "save_courses": phases}
+        finally:
+            if scraper.api is not None:
+                await scraper.api.close()
+            if hasattr(scraper, "pages"):
+                await scraper.pages.close()
+                await scraper.browser.close()
+                await scraper.playwright.stop()
+
+    return asyncio.run(run())
+
+
+# --- Vergleich --------------------------------------------------------------
+
+def _flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and key.endswith(("_ms", "_per_s")):
+            flat[prefix + key] = value
+    return flat
+
+
+def compare(current, baseline):
+    """Relative Änderung je Kennzahl; positiv heißt bei *_ms langsamer, bei *_per_s schneller"""
+    now, before = _flatten(current["results"]), _flatten(baseline["results"])
+    return {key: {"baseline": before[key], "current": now[key],
+                  "change_pct": round((now[key] - before[key]) / before[key] * 100, 1) if before[key] else None}
+            for key in sorted(now.keys() & before.keys())}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", default="-", help="JSON-Datei, '-' für stdout")
+    parser.add_argument("--compare", help="früheres Ergebnis-JSON als Vergleichsbasis")
+    parser.add_argument("--only", default=",".join(SUITES), help="z. B. chat,alerts")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--docs", type=int, default=2000, help="Punkte pro Collection")
+    parser.add_argument("--min-score", type=float, default=0.4)
+    parser.add_argument("--no-answer-cache", action="store_true")
+    parser.add_argument("--chat-questions", type=int, default=30)
+    parser.add_argument("--alerts-requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--scraper-terms", type=lambda s: s.split(","), default=["e", "a", "kurs"])
+    parser.add_argument("--embed-latency", type=float, default=30.0)
+    parser.add_argument("--chat-latency", type=float, default=300.0)
+    parser.add_argument("--token-latency", type=float, default=10.0)
+    parser.add_argument("--answer-tokens", type=int, default=60)
+    parser.add_argument("--qdrant-latency", type=float, default=2.0)
+    parser.add_argument("--site-latency", type=float, default=50.0)
+    parser.add_argument("--site-page-size", type=int, default=25)
+    parser.add_argument("--site-pages", type=int, default=4)
+    parser.add_argument("--scraper-mode", choices=("api", "browser", "auto"), default="api")
+    parser.add_argument("--search-api-path", default="/api/search", help="Pfad der Such-API am Stub")
+    parser.add_argument("--replay", help="JSONL-Aufnahme (SEARCH_API_RECORD) statt der Fixture-Suche")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    suites = [s.strip() for s in args.only.split(",") if s.strip()]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        sys.exit(f"Unbekannte Suite(s): {', '.join(sorted(unknown))}")
+
+    report = {"meta": {"commit": git_commit(), "timestamp": datetime.now(timezone.utc).isoformat(),
+                       "python": platform.python_version(), "platform": platform.platform(),
+                       "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")}},
+              "results": {}}
+
+    with tempfile.TemporaryDirectory() as state_dir, stub_server(args) as base_url:
+        env = service_env(base_url, args, state_dir)
+        # Konstanten der Dienste werden beim Import gelesen
+        os.environ.update(env)
+        if "chat" in suites:
+            report["results"]["chat_cli"] = bench_chat(base_url, args)
+        if "alerts" in suites:
+            report["results"]["alerts_analyze"] = bench_alerts(base_url, args, env)
+        if "scraper" in suites:
+            report["results"]["scraper"] = bench_scraper(base_url, args)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            report["comparison"] = compare(report, json.load(f))
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out == "-":
+        print(text)
+    else:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"Ergebnisse nach {args.out} geschrieben.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,520 @@
+"""Lokale Stand-ins für OpenAI, Qdrant und die Weiterbildungssuche – ein Prozess, ein Port.
+
+- ``/v1/embeddings``, ``/v1/chat/completions`` (auch ``stream``): deterministische Fake-Antworten,
+  ``/v1/models`` für das Aufwärmen der Dienste
+- ``/`` und ``/collections/...``: In-Memory-Qdrant mit der REST-Teilmenge, die die Dienste nutzen
+- ``/weiterbildungssuche/`` und ``/api/search``: Fixture-Seite für den Scraper, mit ``--replay``
+  stattdessen aufgenommene Such-API-Antworten (JSONL aus ``SEARCH_API_RECORD``)
+- ``/_bench/seed``: füllt eine Collection mit einem synthetischen Korpus
+- Aliase (``/aliases``, ``/collections/aliases``) und ``dimensions`` bei Embeddings für Migrationstests
+
+Embeddings sind Bag-of-Words: jedes Wort bekommt einen festen Zufallsvektor, der Text die
+normierte Summe. Texte mit gemeinsamen Wörtern sind sich damit ähnlich, ohne echtes Modell.
+
+Start: ``python stubs.py --port 0`` – die erste Zeile auf stdout ist ``READY <port>``.
+"""
+import argparse
+import base64
+import hashlib
+import json
+import re
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, parse_qsl, urlparse
+
+import numpy as np
+
+TOPICS = ("Pflege", "SAP", "Buchhaltung", "Python", "Logistik", "Schweißen", "Elektrotechnik", "Marketing",
+          "Lagerwirtschaft", "Kinderbetreuung", "Projektmanagement", "Datenanalyse", "Gastronomie", "Vertrieb")
+FORMATS = ("Umschulung", "Weiterbildung", "Lehrgang", "Zertifikatskurs", "Fortbildung")
+CITIES = ("Berlin", "Hamburg", "München", "Köln", "Leipzig", "Dresden", "Essen", "Bremen", "Online")
+
+_WORD = re.compile(r"\w+")
+
+
+class FakeEmbedder:
+    def __init__(self, dim):
+        self.dim = dim
+        self._words = {}
+        self._lock = threading.Lock()
+
+    def _word(self, word):
+        vec = self._words.get(word)
+        if vec is None:
+            seed = int.from_bytes(hashlib.sha256(word.encode("utf-8")).digest()[:8], "little")
+            vec = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+            with self._lock:
+                self._words[word] = vec
+        return vec
+
+    def embed(self, text):
+        words = _WORD.findall(text.lower()) or ["<leer>"]
+        vec = np.sum([self._word(w) for w in words], axis=0)
+        return vec / (np.linalg.norm(vec) or 1.0)
+
+
+def corpus(count):
+    """Deterministischer Korpus: Kursbeschreibungen aus Thema × Format × Ort"""
+    docs = []
+    for i in range(count):
+        topic = TOPICS[i % len(TOPICS)]
+        fmt = FORMATS[(i // len(TOPICS)) % len(FORMATS)]
+        city = CITIES[(i // (len(TOPICS) * len(FORMATS))) % len(CITIES)]
+        title = f"{fmt} {topic} in {city}"
+        content = (f"{fmt} {topic} in {city}. Die {fmt} vermittelt Grundlagen und Praxis in {topic}. "
+                   f"Dauer {3 + i % 9} Monate, Start jeden Monat, förderfähig mit Bildungsgutschein. Kurs {i}.")
+        docs.append({"title": title, "content": content, "tags": [topic, fmt], "topic": topic,
+                     "doc_id": f"doc-{i}", "chunk_id": 1, "chunk_count": 1, "source": f"bench:{i}",
+                     "excerpt": content[:400], "language": "de"})
+    return docs
+
+
+def fixture_courses(term, page, per_page):
+    """Kurse, die die Fixture-Suche für ``term`` auf Seite ``page`` liefert"""
+    courses = []
+    for i in range(page * per_page, (page + 1) * per_page):
+        topic = TOPICS[(i + len(term)) % len(TOPICS)]
+        fmt = FORMATS[i % len(FORMATS)]
+        courses.append({"title": f"{fmt} {topic} – Angebot {term}-{i}",
+                        "description": f"{fmt} im Bereich {topic}. Vollzeit oder Teilzeit, Abschluss mit Zertifikat. "
+                                       f"Angebot {i} zum Suchbegriff {term}.",
+                        "url": f"/kurs/{term}/{i}",
+                        "provider": f"Bildungsträger {i % 17}", "location": CITIES[i % len(CITIES)],
+                        "start_date": f"2025-{1 + i % 12:02d}-01", "duration": f"{3 + i % 9} Monate",
+                        "format": fmt})
+    return courses
+
+
+SEARCH_PAGE = """<!doctype html>
+<html lang="de"><head><meta charset="utf-8"><title>Weiterbildungssuche (Fixture)</title></head>
+<body>
+<form id="suche" onsubmit="return false"><input type="search" name="sw"></form>
+<div id="ergebnisse"></div>
+<button id="load_more_angebote" style="display:none">Mehr laden</button>
+<script>
+let term = "", page = 0;
+async function load() {
+  const r = await fetch(`/api/search?sw=${encodeURIComponent(term)}&page=${page}`);
+  const data = await r.json();
+  const box = document.getElementById("ergebnisse");
+  for (const c of data.items) {
+    const a = document.createElement("article");
+    a.innerHTML = `<h3 class="title">${c.title}</h3><p>${c.description}</p><a href="${c.url}">Details</a>`;
+    box.appendChild(a);
+  }
+  document.getElementById("load_more_angebote").style.display = data.more ? "block" : "none";
+}
+document.querySelector("input[type=search]").addEventListener("keydown", e => {
+  if (e.key !== "Enter") return;
+  term = e.target.value; page = 0;
+  document.getElementById("ergebnisse").innerHTML = "";
+  load();
+});
+document.getElementById("load_more_angebote").addEventListener("click", () => { page += 1; load(); });
+</script>
+</body></html>
+"""
+
+
+class QdrantStore:
+    """Collections als dict; die Suchmatrix wird nach Schreibzugriffen neu aufgebaut"""
+
+    def __init__(self):
+        self.collections = {}
+        self.aliases = {}
+        self.lock = threading.Lock()
+
+    def update_aliases(self, actions):
+        with self.lock:
+            for action in actions:
+                if "delete_alias" in action:
+                    self.aliases.pop(action["delete_alias"]["alias_name"], None)
+                if "create_alias" in action:
+                    spec = action["create_alias"]
+                    self.aliases[spec["alias_name"]] = spec["collection_name"]
+
+    def create(self, name, config):
+        vectors = config.get("vectors", {})
+        with self.lock:
+            self.collections[name] = {"config": config, "dim": vectors.get("size"), "points": {},
+                                      "schema": {}, "matrix": None}
+
+    def upsert(self, name, points):
+        coll = self.collections[name]
+        with self.lock:
+            for p in points:
+                coll["points"][p["id"]] = (np.asarray(p["vector"], dtype=np.float32), p.get("payload") or {})
+            coll["matrix"] = None
+
+    def delete(self, name, ids):
+        coll = self.collections[name]
+        with self.lock:
+            for pid in ids:
+                coll["points"].pop(pid, None)
+            coll["matrix"] = None
+
+    def _matrix(self, coll):
+        with self.lock:
+            if coll["matrix"] is None:
+                ids = list(coll["points"])
+                if ids:
+                    matrix = np.stack([coll["points"][i][0] for i in ids])
+                    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+                else:
+                    matrix = np.zeros((0, coll["dim"] or 1), dtype=np.float32)
+                coll["matrix"] = (ids, matrix)
+            return coll["matrix"]
+
+    def search(self, name, body):
+        coll = self.collections[name]
+        ids, matrix = self._matrix(coll)
+        if not ids:
+            return []
+        query = np.asarray(body["vector"], dtype=np.float32)
+        scores = matrix @ (query / (np.linalg.norm(query) or 1.0))
+        order = np.argsort(-scores)
+        hits = []
+        with_payload = body.get("with_payload", True)
+        for row in order:
+            pid = ids[row]
+            payload = coll["points"][pid][1]
+            if not _matches(payload, body.get("filter")):
+                continue
+            if body.get("score_threshold") is not None and scores[row] < body["score_threshold"]:
+                break
+            hits.append({"id": pid, "version": 0, "score": float(scores[row]),
+                         "payload": _select(payload, with_payload)})
+            if len(hits) >= body.get("limit", 10):
+                break
+        return hits
+
+
+def _matches(payload, query_filter):
+    for cond in (query_filter or {}).get("must", []):
+        value = payload.get(cond["key"])
+        values = value if isinstance(value, list) else [value]
+        match = cond.get("match", {})
+        wanted = match["any"] if "any" in match else [match.get("value")]
+        if not any(v in wanted for v in values):
+            return False
+    return True
+
+
+def _select(payload, with_payload):
+    if with_payload is True:
+        return payload
+    if isinstance(with_payload, dict) and "include" in with_payload:
+        return {k: payload[k] for k in with_payload["include"] if k in payload}
+    if isinstance(with_payload, list):
+        return {k: payload[k] for k in with_payload if k in payload}
+    return None
+
+
+def _point_id(raw):
+    return int(raw) if raw.isdigit() else raw
+
+
+def _points_from_body(body):
+    if "points" in body:
+        return body["points"]
+    batch = body["batch"]
+    payloads = batch.get("payloads") or [{}] * len(batch["ids"])
+    return [{"id": i, "vector": v, "payload": p} for i, v, p in zip(batch["ids"], batch["vectors"], payloads)]
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "educhat-bench-stub"
+
+    def log_message(self, *args):
+        pass
+
+    # --- Hilfen ------------------------------------------------------------
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        return json.loads(raw) if raw else {}
+
+    def _send(self, status, data, content_type="application/json"):
+        raw = data if isinstance(data, bytes) else json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def _ok(self, result):
+        self._send(200, {"result": result, "status": "ok", "time": 0.0})
+
+    def _not_found(self, what="Not found"):
+        self._send(404, {"status": {"error": what}})
+
+    @staticmethod
+    def _sleep(ms):
+        if ms > 0:
+            time.sleep(ms / 1000.0)
+
+    # --- Routing -----------------------------------------------------------
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+    def do_PUT(self):
+        self._route("PUT")
+
+    def do_DELETE(self):
+        self._route("DELETE")
+
+    def _route(self, method):
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split("/") if p]
+        try:
+            replayed = self.server.replay.get((url.path, tuple(sorted(parse_qsl(url.query)))))
+            if replayed is not None:
+                self._sleep(self.server.opts.site_latency)
+                return self._send(replayed["status"], replayed["body"])
+            if parts[:1] == ["v1"]:
+                return self._openai(method, parts[1:])
+            if parts == ["aliases"]:
+                return self._ok({"aliases": [{"alias_name": a, "collection_name": c}
+                                             for a, c in self.server.store.aliases.items()]})
+            if parts[:1] == ["collections"]:
+                self._sleep(self.server.opts.qdrant_latency)
+                return self._qdrant(method, parts[1:])
+            if parts[:1] == ["weiterbildungssuche"]:
+                return self._send(200, SEARCH_PAGE.encode("utf-8"), "text/html; charset=utf-8")
+            if parts == ["api", "search"]:
+                return self._fixture_search(parse_qs(url.query))
+            if parts == ["_bench", "seed"] and method == "POST":
+                return self._seed(self._body())
+            if not parts and method == "GET":
+                return self._send(200, {"title": "qdrant - vector search engine (bench stub)", "version": "1.12.0"})
+            if parts and parts[0] in ("healthz", "readyz"):
+                return self._send(200, {"status": "ok"})
+            self._not_found()
+        except Exception as e:
+            self._send(500, {"status": {"error": f"{type(e).__name__}: {e}"}})
+
+    # --- OpenAI ------------------------------------------------------------
+
+    def _openai(self, method, parts):
+        body = self._body()
+        if parts == ["embeddings"]:
+            self._sleep(self.server.opts.embed_latency)
+            texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+            as_base64 = body.get("encoding_format") == "base64"
+            data = []
+            dims = body.get("dimensions")
+            for i, text in enumerate(texts):
+                vec = self.server.embedder.embed(text)
+                if dims:
+                    # wie text-embedding-3: vordere Komponenten, neu normalisiert
+                    vec = vec[:dims] / (np.linalg.norm(vec[:dims]) or 1.0)
+                embedding = base64.b64encode(vec.astype("<f4").tobytes()).decode() if as_base64 else vec.tolist()
+                data.append({"object": "embedding", "index": i, "embedding": embedding})
+            tokens = sum(len(t) // 4 + 1 for t in texts)
+            return self._send(200, {"object": "list", "data": data, "model": body.get("model"),
+                                    "usage": {"prompt_tokens": tokens, "total_tokens": tokens}})
+        if parts == ["chat", "completions"]:
+            return self._chat(body)
+        if parts == ["models"] and method == "GET":
+            return self._send(200, {"object": "list", "data": [
+                {"id": m, "object": "model", "created": 0, "owned_by": "bench"}
+                for m in ("text-embedding-3-small", "gpt-4o-mini")]})
+        self._not_found()
+
+    def _chat(self, body):
+        messages = body.get("messages", [])
+        system = next((m["content"] for m in messages if m.get("role") == "system"), "")
+        if "JSON-Array" in system:
+            text = json.dumps([{"title": d["title"], "content": d["content"], "tags": d["tags"]}
+                               for d in corpus(5)], ensure_ascii=False)
+        else:
+            words = ["Laut", "Quelle", "[1]"] + ["gibt", "es", "passende", "Angebote"] * 200
+            text = " ".join(words[:self.server.opts.answer_tokens])
+        self._sleep(self.server.opts.chat_latency)
+        created = int(time.time())
+        usage = {"prompt_tokens": sum(len(m.get("content") or "") for m in messages) // 4,
+                 "completion_tokens": len(text) // 4}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        if not body.get("stream"):
+            return self._send(200, {
+                "id": "chatcmpl-bench", "object": "chat.completion", "created": created, "model": body.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": usage})
+
+        # SSE ohne Content-Length: Verbindung nach dem Stream schließen
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def chunk(delta, finish=None):
+            data = {"id": "chatcmpl-bench", "object": "chat.completion.chunk", "created": created,
+                    "model": body.get("model"), "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+            self.wfile.write(f"data: {json.dumps(data)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        chunk({"role": "assistant", "content": ""})
+        for i, token in enumerate(text.split(" ")):
+            if i:
+                self._sleep(self.server.opts.token_latency)
+            chunk({"content": token if i == 0 else " " + token})
+        chunk({}, "stop")
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    # --- Qdrant ------------------------------------------------------------
+
+    def _qdrant(self, method, parts):
+        store = self.server.store
+        if not parts:
+            return self._ok({"collections": [{"name": n} for n in store.collections]})
+        if parts == ["aliases"] and method == "POST":
+            store.update_aliases(self._body().get("actions", []))
+            return self._ok(True)
+        name, rest = store.aliases.get(parts[0], parts[0]), parts[1:]
+        coll = store.collections.get(name)
+        if not rest:
+            if method == "PUT":
+                store.create(name, self._body())
+                return self._ok(True)
+            if method == "DELETE":
+                store.collections.pop(name, None)
+                return self._ok(True)
+            if coll is None:
+                return self._not_found(f"Collection `{name}` doesn't exist!")
+            return self._ok({"status": "green", "points_count": len(coll["points"]),
+                             "config": {"params": {"vectors": coll["config"].get("vectors", {})}},
+                             "payload_schema": coll["schema"]})
+        if coll is None:
+            return self._not_found(f"Collection `{name}` doesn't exist!")
+        body = self._body() if method in ("POST", "PUT") else {}
+        if rest == ["index"]:
+            coll["schema"][body["field_name"]] = {"data_type": body.get("field_schema"), "points": len(coll["points"])}
+            return self._ok({"operation_id": 0, "status": "completed"})
+        if rest == ["points"] and method == "PUT":
+            store.upsert(name, _points_from_body(body))
+            return self._ok({"operation_id": 0, "status": "completed"})
+        if rest == ["points", "delete"]:
+            ids = body.get("points")
+            if ids is None:
+                ids = [pid for pid, (_, payload) in list(coll["points"].items())
+                       if _matches(payload, body.get("filter"))]
+            store.delete(name, ids)
+            return self._ok({"operation_id": 0, "status": "completed"})
+        if rest == ["points", "search"]:
+            return self._ok(store.search(name, body))
+        if rest == ["points", "search", "batch"]:
+            return self._ok([store.search(name, search) for search in body.get("searches", [])])
+        if rest == ["points", "scroll"]:
+            return self._ok(self._scroll(coll, body))
+        if rest == ["points", "count"]:
+            count = sum(1 for _, payload in coll["points"].values() if _matches(payload, body.get("filter")))
+            return self._ok({"count": count})
+        if len(rest) == 2 and rest[0] == "points" and method == "GET":
+            point = coll["points"].get(_point_id(rest[1]))
+            if point is None:
+                return self._not_found(f"No point with id {rest[1]} found")
+            return self._ok({"id": _point_id(rest[1]), "payload": point[1], "vector": point[0].tolist()})
+        self._not_found()
+
+    @staticmethod
+    def _scroll(coll, body):
+        with_vector = body.get("with_vector", False)
+        ids = sorted(coll["points"], key=str)
+        start = 0
+        if body.get("offset") is not None:
+            start = next((i for i, pid in enumerate(ids) if str(pid) >= str(body["offset"])), len(ids))
+        limit = body.get("limit", 10)
+        page = ids[start:start + limit]
+        points = []
+        for pid in page:
+            vec, payload = coll["points"][pid]
+            point = {"id": pid, "payload": _select(payload, body.get("with_payload", True))}
+            if with_vector:
+                point["vector"] = vec.tolist()
+            points.append(point)
+        following = ids[start + limit] if start + limit < len(ids) else None
+        return {"points": points, "next_page_offset": following}
+
+    # --- Fixture-Seite und Seed --------------------------------------------
+
+    def _fixture_search(self, query):
+        self._sleep(self.server.opts.site_latency)
+        term = (query.get("sw") or [""])[0]
+        page = int((query.get("page") or ["0"])[0])
+        opts = self.server.opts
+        self._send(200, {"items": fixture_courses(term, page, opts.site_page_size),
+                         "more": page + 1 < opts.site_pages, "total": opts.site_page_size * opts.site_pages})
+
+    def _seed(self, body):
+        name, count = body["collection"], int(body.get("count", 1000))
+        embedder, store = self.server.embedder, self.server.store
+        if name not in store.collections:
+            store.create(name, {"vectors": {"size": embedder.dim, "distance": "Cosine"}})
+        points = [{"id": str(uuid.uuid5(uuid.NAMESPACE_URL, f"bench:{name}:{i}")),
+                   "vector": embedder.embed(doc["title"] + " " + doc["content"]), "payload": doc}
+                  for i, doc in enumerate(corpus(count))]
+        store.upsert(name, points)
+        self._send(200, {"result": {"count": len(points)}, "status": "ok"})
+
+
+def make_server(opts, host="127.0.0.1"):
+    server = ThreadingHTTPServer((host, opts.port), Handler)
+    server.daemon_threads = True
+    server.opts = opts
+    server.embedder = FakeEmbedder(opts.dim)
+    server.store = QdrantStore()
+    server.replay = load_replay(opts.replay) if opts.replay else {}
+    return server
+
+
+def load_replay(path):
+    """Aufnahme (``path``, ``params``, ``status``, ``body`` je Zeile) → Antwort pro Pfad und Query"""
+    replay = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                replay[(entry["path"], tuple(sorted(entry["params"].items())))] = entry
+    return replay
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--embed-latency", type=float, default=30.0, help="ms pro Embedding-Request")
+    parser.add_argument("--chat-latency", type=float, default=300.0, help="ms bis zum ersten Token")
+    parser.add_argument("--token-latency", type=float, default=10.0, help="ms zwischen Tokens")
+    parser.add_argument("--answer-tokens", type=int, default=60)
+    parser.add_argument("--qdrant-latency", type=float, default=2.0, help="ms pro Qdrant-Request")
+    parser.add_argument("--site-latency", type=float, default=50.0, help="ms pro Fixture-Suchseite")
+    parser.add_argument("--site-page-size", type=int, default=25)
+    parser.add_argument("--site-pages", type=int, default=4)
+    parser.add_argument("--replay", help="JSONL-Aufnahme der Such-API, die statt der Fixture geantwortet wird")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    server = make_server(parse_args(argv))
+    print(f"READY {server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,20 +1,90 @@
-import os, json
-from typing import List, Optional
-import requests
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from openai import OpenAI
+import os, sys, asyncio, time, uuid, logging
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, List, Optional
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import BaseModel, ValidationError
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI  # erst beim ersten Client importiert – schnellerer Start
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "educhat-common"))
+from educhat_common.clients import get_async_http_client, get_async_openai_client, get_session
+from educhat_common.collection_schema import ensure_collection_cached, search_body
+from educhat_common.collection_version import abump_version, aread_version
+from educhat_common.embed_cache import aembed_with_cache, cache_key, get_default_cache, normalize_text
+from educhat_common.embedding import cache_model, embed_batched, embedding_options
+from educhat_common import metrics
+from educhat_common.metrics import count_usage, qdrant_call, timed
+from educhat_common.qdrant_transport import QdrantTransportError, get_transport
+from educhat_common.ratelimit import INTERACTIVE, NORMAL, get_limiter
+from educhat_common.readiness import Readiness, awarm_up
+from educhat_common.singleflight import SingleFlight
+from educhat_common.tokens import count_tokens
 
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY","")
 QDRANT_URL     = os.environ.get("QDRANT_URL","http://qdrant:6333")
 COLLECTION     = os.environ.get("QDRANT_COLLECTION","sentinel_docs")
 EMBED_MODEL    = os.environ.get("EMBED_MODEL","text-embedding-3-small")
+EMBED_DIM      = int(os.environ.get("EMBED_DIM","1536"))  # < volle Breite: gekürzte Embeddings
 MIN_SCORE      = float(os.environ.get("MIN_SCORE","0.7"))
 TOP_K          = int(os.environ.get("TOP_K","5"))
+OPENAI_CONCURRENCY = int(os.environ.get("OPENAI_CONCURRENCY","16"))  # gleichzeitige OpenAI-Aufrufe pro Pod
+QDRANT_CONCURRENCY = int(os.environ.get("QDRANT_CONCURRENCY","32"))  # gleichzeitige Qdrant-Aufrufe pro Pod
+BATCH_MAX_ITEMS    = int(os.environ.get("BATCH_MAX_ITEMS","2000"))   # max. Loglines pro /analyze/batch
+SEARCH_BATCH_SIZE  = int(os.environ.get("SEARCH_BATCH_SIZE","100"))  # Suchen pro Qdrant-Batch-Request
+INGEST_BATCH_SIZE  = int(os.environ.get("INGEST_BATCH_SIZE","256"))  # Dokumente pro Embedding/Upsert-Block
+INGEST_MAX_INFLIGHT = int(os.environ.get("INGEST_MAX_INFLIGHT","4")) # Blöcke gleichzeitig in Arbeit
+LOCAL_INDEX_PATH   = os.environ.get("LOCAL_INDEX_PATH","")    # Snapshot-Verzeichnis oder points.json
+LOCAL_INDEX_MODE   = os.environ.get("LOCAL_INDEX_MODE","tier")  # tier: nur bei aktueller Version, only: immer
+VERSION_CHECK_SECONDS = float(os.environ.get("VERSION_CHECK_SECONDS","10"))
+WARM_UP = os.environ.get("WARM_UP","1").lower() in {"1","true","yes"}  # aus = sofort bereit
+WARM_UP_RETRY_SECONDS = float(os.environ.get("WARM_UP_RETRY_SECONDS","5"))
 
 BLOCK_WORDS = {"password","admin access","bypass","prompt injection","OpenAIKey","key"}
+# /analyze braucht Titel und Auszug; content nur für Punkte ohne excerpt (vor dem Feld
+# geschrieben oder aus einem alten points.json/Snapshot) – verdict kürzt ihn dann selbst
+EVIDENCE_FIELDS = ("title","excerpt","content")
+EXCERPT_CHARS = 400
+
+logger = logging.getLogger("educhat-alerts")
+
+# der Embedding-Cache beschleunigt nur, ohne ihn geht es auch
+readiness = Readiness(required=("qdrant","openai","local_index") if WARM_UP else ())
+
+async def warm_qdrant():
+    # Collection-Prüfung höchstens einmal pro COLLECTION_CHECK_TTL, danach nur noch der Async-Pool
+    checked = await asyncio.to_thread(ensure_collection_cached, get_session(), QDRANT_URL, COLLECTION, EMBED_DIM)
+    return {"version": await aread_version(get_async_http_client(), QDRANT_URL, COLLECTION), "checked": checked,
+            "transport": await get_transport(QDRANT_URL).aconnect()}
+
+async def warm_openai():
+    await get_async_openai_client(OPENAI_API_KEY).models.list()
+
+def warm_embed_cache():
+    return {"warm_items": get_default_cache().warm()}
+
+def warm_local_index():
+    index = local_index()
+    return {"points": len(index) if index is not None else None}
 
-app = FastAPI(title="educhat-embed-chat", version="1.0")
+@asynccontextmanager
+async def lifespan(app):
+    warm = None
+    if WARM_UP:
+        steps = [("qdrant",warm_qdrant),("openai",warm_openai),("embed_cache",warm_embed_cache),
+                 ("local_index",warm_local_index)]
+        warm = asyncio.create_task(awarm_up(readiness, steps, WARM_UP_RETRY_SECONDS))
+    yield
+    if warm is not None:
+        warm.cancel()
+
+app = FastAPI(title="educhat-embed-chat", version="1.0", lifespan=lifespan)
+
+# Begrenzung pro Abhängigkeit, damit eine langsame nicht alle Requests bindet
+openai_limit = asyncio.Semaphore(OPENAI_CONCURRENCY)
+qdrant_limit = asyncio.Semaphore(QDRANT_CONCURRENCY)
+embed_flight = SingleFlight()
+local = {"index":None, "version":None, "checked":0.0}
 
 class AnalyzeRequest(BaseModel):
     logline: str
@@ -25,33 +95,80 @@ class IngestItem(BaseModel):
     content: str
     tags: Optional[List[str]] = []
 
-def embed_text(client: OpenAI, text: str):
-    r = client.embeddings.create(model=EMBED_MODEL, input=[text])
-    return r.data[0].embedding
+async def embed_text(client: "AsyncOpenAI", text: str):
+    async def _embed(missing):
+        # /analyze ist interaktiv: zieht im Scheduler vor Batch- und Ingest-Embeddings
+        async with openai_limit, get_limiter().aslot(sum(count_tokens(t, EMBED_MODEL) for t in missing), INTERACTIVE) as ticket:
+            r = await client.embeddings.create(model=EMBED_MODEL, input=missing, **embedding_options(EMBED_MODEL, EMBED_DIM))
+        ticket.settle(r.usage.total_tokens)
+        count_usage(r.usage, "embedding")
+        return [d.embedding for d in r.data]
 
-def qdrant_search(vec):
-    body = {"vector": vec, "limit": TOP_K, "with_payload": True, "with_vector": False}
-    r = requests.post(f"{QDRANT_URL}/collections/{COLLECTION}/points/search",
-                      headers={"Content-Type":"application/json"},
-                      data=json.dumps(body), timeout=60)
-    if r.status_code >= 400:
-        raise HTTPException(502, f"Qdrant-Fehler: {r.status_code} {r.text}")
-    return r.json().get("result", [])
+    async def _cached():
+        return (await aembed_with_cache(get_default_cache(), cache_model(EMBED_MODEL, EMBED_DIM), [text], _embed))[0]
 
-@app.get("/health")
-def health():
-    return {"status":"ok"}
+    # identische Loglines, die gleichzeitig eintreffen, teilen sich einen Aufruf
+    with timed("embed"):
+        return await embed_flight.do(cache_key(cache_model(EMBED_MODEL, EMBED_DIM), text), _cached)
 
-@app.post("/analyze")
-def analyze(req: AnalyzeRequest):
-    if not OPENAI_API_KEY:
-        raise HTTPException(500, "OPENAI_API_KEY fehlt")
-    if any(w in req.logline.lower() for w in BLOCK_WORDS):
-        return {"alert":"blocked","reason":"Sicherheits-Schlüsselwort erkannt"}
+def local_index():
+    if local["index"] is None and LOCAL_INDEX_PATH:
+        from educhat_common.vector_index import VectorIndex
+        local["index"] = VectorIndex.load(LOCAL_INDEX_PATH)
+    return local["index"]
+
+async def current_local_index():
+    """Lokaler Index, falls vorhanden und auf dem Stand der Collection – sonst None"""
+    index = local_index()
+    if index is None or index.dim != EMBED_DIM:
+        # fehlt oder stammt aus der Zeit vor einer Dimensions-Migration
+        return None
+    if LOCAL_INDEX_MODE == "only":
+        return index
+    now = time.monotonic()
+    if now - local["checked"] >= VERSION_CHECK_SECONDS:
+        try:
+            local["version"] = await aread_version(get_async_http_client(), QDRANT_URL, COLLECTION)
+        except Exception:
+            # Qdrant nicht erreichbar: lieber der lokale Stand als gar keine Antwort
+            local["version"] = index.version
+        local["checked"] = now
+    return index if index.version is not None and index.version == local["version"] else None
+
+async def qdrant_search(vec):
+    index = await current_local_index()
+    if index is not None:
+        with timed("search_local"):
+            return index.search(vec, TOP_K)
+    body = search_body(vec, TOP_K, fields=EVIDENCE_FIELDS)
+    try:
+        with qdrant_call("search"):
+            async with qdrant_limit:
+                return await get_transport(QDRANT_URL).asearch(COLLECTION, body, timeout=60)
+    except QdrantTransportError as e:
+        raise HTTPException(502, f"Qdrant-Fehler: {e}")
 
-    client = OpenAI(api_key=OPENAI_API_KEY)
-    vec = embed_text(client, req.logline)
-    hits = qdrant_search(vec)
+async def qdrant_search_batch(vectors):
+    """Eine Qdrant-Batch-Suche pro SEARCH_BATCH_SIZE Vektoren, Blöcke parallel"""
+    async def _search(part):
+        bodies = [search_body(v, TOP_K, fields=EVIDENCE_FIELDS) for v in part]
+        try:
+            with qdrant_call("search_batch"):
+                async with qdrant_limit:
+                    return await get_transport(QDRANT_URL).asearch_batch(COLLECTION, bodies, timeout=60)
+        except QdrantTransportError as e:
+            raise HTTPException(502, f"Qdrant-Fehler: {e}")
+
+    index = await current_local_index()
+    if index is not None:
+        with timed("search_local"):
+            return index.search_batch(vectors, TOP_K) if vectors else []
+    parts = [vectors[i:i + SEARCH_BATCH_SIZE] for i in range(0, len(vectors), SEARCH_BATCH_SIZE)]
+    results = await asyncio.gather(*(_search(p) for p in parts))
+    return [hits for part in results for hits in part]
+
+def verdict(hits):
+    """Bewertet die Treffer einer Logline im Antwortformat von /analyze"""
     max_score = hits[0]["score"] if hits else 0.0
     if not hits or max_score < MIN_SCORE:
         return {"alert":"unknown","reason":"Keine ausreichende Ähnlichkeit", "max_score":max_score, "hits":[]}
@@ -59,22 +176,199 @@ def analyze(req: AnalyzeRequest):
     evidence = []
     for h in hits:
         p = h.get("payload", {}) or {}
-        evidence.append({"score":h.get("score",0.0),"title":p.get("title",""),"content":p.get("content","")[:400]})
+        excerpt = p.get("excerpt") or p.get("content","")[:EXCERPT_CHARS]
+        evidence.append({"score":h.get("score",0.0),"title":p.get("title",""),"content":excerpt})
     return {"alert":"similar-pattern","max_score":max_score, "evidence": evidence[:3]}
 
+def is_blocked(logline: str):
+    return any(w in logline.lower() for w in BLOCK_WORDS)
+
+def is_ndjson(request: Request):
+    return "ndjson" in request.headers.get("content-type", "")
+
+async def ndjson_lines(request: Request):
+    """Liefert die nicht-leeren Zeilen eines NDJSON-Bodys, ohne ihn ganz zu puffern"""
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
+
+async def read_analyze_requests(request: Request):
+    """Liest eine JSON-Liste oder – bei application/x-ndjson – eine Zeile pro AnalyzeRequest"""
+    items = []
+    try:
+        if is_ndjson(request):
+            async for line in ndjson_lines(request):
+                items.append(AnalyzeRequest.model_validate_json(line))
+                if len(items) > BATCH_MAX_ITEMS:
+                    break
+        else:
+            items = [AnalyzeRequest.model_validate(i) for i in await request.json()]
+    except (ValidationError, ValueError, TypeError) as e:
+        raise HTTPException(422, f"Ungültiger Batch: {e}")
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(413, f"Maximal {BATCH_MAX_ITEMS} Einträge pro Batch")
+    return items
+
+@app.get("/health")
+async def health():
+    return {"status":"ok","openai":get_limiter().state(),"qdrant_transport":get_transport(QDRANT_URL).name}
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness – unabhängig von Qdrant und OpenAI"""
+    return {"status":"ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness – 503, bis Collection, Verbindungspools und lokaler Index warm sind"""
+    report = readiness.report()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.post("/analyze")
+async def analyze(req: AnalyzeRequest):
+    if not OPENAI_API_KEY:
+        raise HTTPException(500, "OPENAI_API_KEY fehlt")
+    if is_blocked(req.logline):
+        return {"alert":"blocked","reason":"Sicherheits-Schlüsselwort erkannt"}
+
+    client = get_async_openai_client(OPENAI_API_KEY)
+    with timed("analyze"):
+        vec = await embed_text(client, req.logline)
+        hits = await qdrant_search(vec)
+        return verdict(hits)
+
+@app.post("/analyze/batch")
+async def analyze_batch(request: Request):
+    """Wie /analyze für viele Loglines: gebündelte Embeddings, eine Qdrant-Batch-Suche pro Block"""
+    if not OPENAI_API_KEY:
+        raise HTTPException(500, "OPENAI_API_KEY fehlt")
+    items = await read_analyze_requests(request)
+
+    results = [None] * len(items)
+    pending = []
+    for i, req in enumerate(items):
+        if is_blocked(req.logline):
+            results[i] = {"alert":"blocked","reason":"Sicherheits-Schlüsselwort erkannt"}
+        else:
+            pending.append(i)
+
+    with timed("analyze_batch_embed"):
+        vectors, errors = await embed_batched(
+            get_async_openai_client(OPENAI_API_KEY), EMBED_MODEL, [items[i].logline for i in pending],
+            concurrency=min(4, OPENAI_CONCURRENCY), cache=get_default_cache(), priority=NORMAL, dim=EMBED_DIM)
+    searchable = []
+    for j, i in enumerate(pending):
+        if vectors[j] is None:
+            results[i] = {"alert":"error","reason":f"Embedding fehlgeschlagen: {errors.get(j)}"}
+        else:
+            searchable.append((i, vectors[j]))
+
+    all_hits = await qdrant_search_batch([v for _, v in searchable])
+    for (i, _), hits in zip(searchable, all_hits):
+        results[i] = verdict(hits)
+    return {"count":len(results), "results":results}
+
+def point_id(item: IngestItem):
+    """Inhaltsabgeleitete ID – dasselbe Dokument landet immer auf demselben Punkt"""
+    return str(uuid.uuid5(uuid.NAMESPACE_OID, normalize_text(item.title) + "\n" + normalize_text(item.content)))
+
+async def read_ingest_batches(request: Request, stats):
+    """Liefert IngestItems in Blöcken; ungültige NDJSON-Zeilen werden gezählt statt abzubrechen"""
+    if not is_ndjson(request):
+        try:
+            items = [IngestItem.model_validate(i) for i in await request.json()]
+        except (ValidationError, ValueError, TypeError) as e:
+            raise HTTPException(422, f"Ungültiger Ingest-Body: {e}")
+        for start in range(0, len(items), INGEST_BATCH_SIZE):
+            yield items[start:start + INGEST_BATCH_SIZE]
+        return
+
+    batch = []
+    async for line in ndjson_lines(request):
+        try:
+            batch.append(IngestItem.model_validate_json(line))
+        except ValidationError:
+            stats["invalid"] += 1
+            continue
+        if len(batch) >= INGEST_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
 @app.post("/ingest")
-def ingest(items: List[IngestItem]):
-    # einfacher Upsert für API-Nutzer
-    points=[]
-    for i, it in enumerate(items, start=1):
-        points.append({
-          "id": i,
-          "vector": [0.0]*1536,  # Dummy – echtes Ingest bitte über Service A oder Embedding hier erweitern
-          "payload": {"title": it.title, "content": it.content, "tags": it.tags, "source": "api:manual"}
-        })
-    r = requests.put(f"{QDRANT_URL}/collections/{COLLECTION}/points?wait=true",
-                     headers={"Content-Type":"application/json"},
-                     data=json.dumps({"points":points}))
-    if r.status_code >= 400:
-        raise HTTPException(502, f"Upsert-Fehler: {r.status_code} {r.text}")
-    return {"status":"ok","count":len(points)}
\ No newline at end of file
+async def ingest(request: Request):
+    """Bulk-Ingest als JSON-Liste oder NDJSON-Stream: Embeddings und Upserts blockweise.
+
+    Höchstens INGEST_MAX_INFLIGHT Blöcke sind gleichzeitig in Arbeit; solange keiner
+    frei ist, wird nicht weiter vom Request gelesen.
+    """
+    if not OPENAI_API_KEY:
+        raise HTTPException(500, "OPENAI_API_KEY fehlt")
+    client = get_async_openai_client(OPENAI_API_KEY)
+    stats = {"received":0, "stored":0, "failed":0, "invalid":0, "batches":0}
+    errors_seen = []
+    slots = asyncio.Semaphore(INGEST_MAX_INFLIGHT)
+    tasks = set()
+    started = time.perf_counter()
+
+    async def _store(batch):
+        try:
+            with timed("ingest_embed"):
+                vectors, errors = await embed_batched(client, EMBED_MODEL, [it.content for it in batch],
+                                                      concurrency=1, cache=get_default_cache(), dim=EMBED_DIM)
+            stats["failed"] += len(errors)
+            errors_seen.extend(str(e) for e in list(errors.values())[:1])
+            points = [{
+                "id": point_id(it),
+                "vector": vec,
+                "payload": {"title": it.title, "content": it.content, "excerpt": it.content[:EXCERPT_CHARS],
+                            "tags": it.tags, "source": "api:manual"}
+            } for it, vec in zip(batch, vectors) if vec is not None]
+            if points:
+                try:
+                    with qdrant_call("upsert"):
+                        async with qdrant_limit:
+                            await get_transport(QDRANT_URL).aupsert(COLLECTION, points, timeout=120)
+                    stats["stored"] += len(points)
+                except QdrantTransportError as e:
+                    stats["failed"] += len(points)
+                    errors_seen.append(str(e)[:200])
+            stats["batches"] += 1
+        except Exception as e:
+            stats["failed"] += len(batch)
+            errors_seen.append(str(e))
+        finally:
+            slots.release()
+
+    async for batch in read_ingest_batches(request, stats):
+        stats["received"] += len(batch)
+        await slots.acquire()
+        task = asyncio.create_task(_store(batch))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    await asyncio.gather(*tasks)
+
+    if stats["stored"]:
+        try:
+            # Caches anderer Dienste auf dieser Collection verwerfen
+            await abump_version(get_async_http_client(), QDRANT_URL, COLLECTION)
+        except Exception as e:
+            errors_seen.append(f"Versionsmarke nicht gesetzt: {e}")
+
+    seconds = time.perf_counter() - started
+    if stats["received"] and not stats["stored"]:
+        raise HTTPException(502, f"Ingest fehlgeschlagen: {errors_seen[:3]}")
+    return {"status":"ok" if not stats["failed"] else "partial", "count":stats["stored"], **stats,
+            "seconds":round(seconds, 3), "items_per_s":round(stats["stored"] / seconds, 1) if seconds else 0.0,
+            "errors":errors_seen[:5]}
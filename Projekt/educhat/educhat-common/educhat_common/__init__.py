@@ -0,0 +1 @@
+"""Gemeinsame Bausteine für Chat, Alerts-API und Scraper."""
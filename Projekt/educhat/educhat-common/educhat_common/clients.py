@@ -0,0 +1,124 @@
+"""Geteilte, langlebige HTTP-Clients mit Keep-Alive-Pools für Qdrant (REST) und OpenAI."""
+import os
+import random
+import threading
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .ratelimit import get_limiter
+
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", "32"))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", "3"))
+HTTP_READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", "60"))
+HTTP_RETRIES = int(os.environ.get("HTTP_RETRIES", "3"))
+HTTP_BACKOFF = float(os.environ.get("HTTP_BACKOFF", "0.2"))
+OPENAI_TIMEOUT = float(os.environ.get("OPENAI_TIMEOUT", "60"))
+OPENAI_MAX_RETRIES = int(os.environ.get("OPENAI_MAX_RETRIES", "3"))
+
+RETRY_STATUS = (429, 502, 503, 504)
+
+_lock = threading.Lock()
+_session = None
+_openai = None
+_async_openai = None
+_async_http = None
+
+
+class JitteredRetry(Retry):
+    """Exponentielles Backoff mit Full Jitter, damit Pods nicht im Gleichtakt erneut anfragen"""
+
+    def get_backoff_time(self):
+        backoff = super().get_backoff_time()
+        return random.uniform(0, backoff) if backoff > 0 else 0
+
+
+class TimeoutSession(requests.Session):
+    """Session mit Standard-Timeout (connect, read), falls der Aufruf keinen setzt"""
+
+    def __init__(self, timeout):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+def make_session(pool_size=HTTP_POOL_SIZE, retries=HTTP_RETRIES):
+    session = TimeoutSession((HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+    retry = JitteredRetry(
+        total=retries, connect=retries, read=0, backoff_factor=HTTP_BACKOFF,
+        status_forcelist=RETRY_STATUS,
+        # Qdrant-Search (POST) und Upsert (PUT) mit fester ID sind idempotent
+        allowed_methods=frozenset({"GET", "POST", "PUT", "DELETE"}),
+        raise_on_status=False, respect_retry_after_header=True)
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["Content-Type"] = "application/json"
+    return session
+
+
+def get_session():
+    """Prozessweite Session für Qdrant-REST-Aufrufe"""
+    global _session
+    with _lock:
+        if _session is None:
+            _session = make_session()
+        return _session
+
+
+def get_async_http_client():
+    """Prozessweiter httpx.AsyncClient für Qdrant-REST-Aufrufe aus Async-Code"""
+    global _async_http
+    with _lock:
+        if _async_http is None:
+            _async_http = httpx.AsyncClient(
+                timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+                # wiederholt nur fehlgeschlagene Verbindungsaufbauten
+                transport=httpx.AsyncHTTPTransport(limits=_limits(), retries=HTTP_RETRIES),
+                headers={"Content-Type": "application/json"})
+        return _async_http
+
+
+def _limits():
+    return httpx.Limits(max_connections=HTTP_POOL_SIZE, max_keepalive_connections=HTTP_POOL_SIZE,
+                        keepalive_expiry=60)
+
+
+def _observe_openai(response):
+    # jede Antwort, auch die der SDK-internen Retries, stellt den Scheduler nach
+    get_limiter().observe(response.status_code, response.headers)
+
+
+async def _aobserve_openai(response):
+    _observe_openai(response)
+
+
+def get_openai_client(api_key=None):
+    """Prozessweiter OpenAI-Client – eine TLS-Verbindung wird über alle Aufrufe wiederverwendet"""
+    global _openai
+    from openai import OpenAI
+    with _lock:
+        if _openai is None:
+            _openai = OpenAI(api_key=api_key or os.environ.get("OPENAI_API_KEY", ""),
+                             timeout=OPENAI_TIMEOUT, max_retries=OPENAI_MAX_RETRIES,
+                             http_client=httpx.Client(limits=_limits(), timeout=OPENAI_TIMEOUT,
+                                                      event_hooks={"response": [_observe_openai]}))
+        return _openai
+
+
+def get_async_openai_client(api_key=None):
+    global _async_openai
+    from openai import AsyncOpenAI
+    with _lock:
+        if _async_openai is None:
+            _async_openai = AsyncOpenAI(api_key=api_key or os.environ.get("OPENAI_API_KEY", ""),
+                                        timeout=OPENAI_TIMEOUT, max_retries=OPENAI_MAX_RETRIES,
+                                        http_client=httpx.AsyncClient(
+                                            limits=_limits(), timeout=OPENAI_TIMEOUT,
+                                            event_hooks={"response": [_aobserve_openai]}))
+        return _async_openai
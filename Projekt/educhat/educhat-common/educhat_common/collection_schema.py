@@ -0,0 +1,135 @@
+"""Gemeinsames Collection-Schema: HNSW, Skalar-Quantisierung, Payload auf Platte, Keyword-Indizes."""
+import hashlib
+import json
+import os
+import threading
+import time
+
+QDRANT_HNSW_M = int(os.environ.get("QDRANT_HNSW_M", "16"))
+QDRANT_HNSW_EF_CONSTRUCT = int(os.environ.get("QDRANT_HNSW_EF_CONSTRUCT", "100"))
+QDRANT_HNSW_EF = int(os.environ.get("QDRANT_HNSW_EF", "64"))               # Suchbreite zur Abfragezeit
+QDRANT_QUANTIZATION = os.environ.get("QDRANT_QUANTIZATION", "int8")        # int8 oder none
+QDRANT_OVERSAMPLING = float(os.environ.get("QDRANT_OVERSAMPLING", "2.0"))  # Kandidaten für Rescoring
+COLLECTION_CHECK_CACHE = os.environ.get("COLLECTION_CHECK_CACHE", "")       # Stempeldatei, leer = nur im Prozess
+COLLECTION_CHECK_TTL = float(os.environ.get("COLLECTION_CHECK_TTL", "86400"))  # Sekunden bis zur erneuten Prüfung
+
+# Felder, nach denen gefiltert wird
+KEYWORD_INDEXES = ("tags", "topic", "doc_id", "search_term")
+
+
+_checked = set()
+_checked_lock = threading.Lock()
+
+
+class CollectionError(RuntimeError):
+    pass
+
+
+def collection_schema(dim):
+    schema = {
+        "vectors": {"size": dim, "distance": "Cosine"},
+        "hnsw_config": {"m": QDRANT_HNSW_M, "ef_construct": QDRANT_HNSW_EF_CONSTRUCT},
+        # Payload (lange content-Felder) liegt auf Platte, im RAM bleiben Vektoren und Indizes
+        "on_disk_payload": True,
+    }
+    if QDRANT_QUANTIZATION == "int8":
+        # int8-Kopie der Vektoren im RAM, Originale für das Rescoring
+        schema["quantization_config"] = {"scalar": {"type": "int8", "quantile": 0.99, "always_ram": True}}
+    return schema
+
+
+def search_params():
+    params = {"hnsw_ef": QDRANT_HNSW_EF}
+    if QDRANT_QUANTIZATION == "int8":
+        params["quantization"] = {"ignore": False, "rescore": True, "oversampling": QDRANT_OVERSAMPLING}
+    return params
+
+
+def build_filter(where):
+    """Qdrant-Filter aus ``{feld: wert | [werte]}`` – alle Felder müssen passen, Listen heißen 'eins davon'"""
+    if not where:
+        return None
+    must = []
+    for field, wanted in where.items():
+        if isinstance(wanted, (list, tuple, set)):
+            must.append({"key": field, "match": {"any": list(wanted)}})
+        else:
+            must.append({"key": field, "match": {"value": wanted}})
+    return {"must": must}
+
+
+def search_body(vector, limit, where=None, fields=None):
+    """Body für points/search; ``fields`` begrenzt die zurückgelieferten Payload-Felder"""
+    body = {"vector": vector, "limit": limit, "with_vector": False, "params": search_params(),
+            "with_payload": {"include": list(fields)} if fields else True}
+    query_filter = build_filter(where)
+    if query_filter:
+        body["filter"] = query_filter
+    return body
+
+
+def ensure_collection(session, qdrant_url, collection, dim):
+    """Legt die Collection nach Schema an, prüft die Dimension und setzt fehlende Payload-Indizes"""
+    r = session.get(f"{qdrant_url}/collections/{collection}")
+    if r.status_code == 404:
+        r = session.put(f"{qdrant_url}/collections/{collection}", data=json.dumps(collection_schema(dim)))
+        if r.status_code >= 400:
+            raise CollectionError(f"Collection-Create fehlgeschlagen: {r.status_code} {r.text}")
+        existing = set()
+    elif r.status_code >= 400:
+        raise CollectionError(f"Collection-Abfrage fehlgeschlagen: {r.status_code} {r.text}")
+    else:
+        info = r.json().get("result", {})
+        vectors = info.get("config", {}).get("params", {}).get("vectors", {})
+        if isinstance(vectors, dict) and vectors.get("size") not in (None, dim):
+            raise CollectionError(f"Collection '{collection}' hat Dimension {vectors['size']}, erwartet {dim}")
+        existing = set(info.get("payload_schema", {}))
+
+    for field in KEYWORD_INDEXES:
+        if field in existing:
+            continue
+        r = session.put(f"{qdrant_url}/collections/{collection}/index?wait=true",
+                        data=json.dumps({"field_name": field, "field_schema": "keyword"}))
+        if r.status_code >= 400:
+            raise CollectionError(f"Payload-Index '{field}' fehlgeschlagen: {r.status_code} {r.text}")
+
+
+def _check_key(qdrant_url, collection, dim):
+    # ändert sich Schema oder Index-Liste, gilt ein alter Stempel nicht mehr
+    schema = json.dumps([collection_schema(dim), KEYWORD_INDEXES], sort_keys=True)
+    return f"{qdrant_url}|{collection}|{dim}|{hashlib.sha1(schema.encode('utf-8')).hexdigest()[:12]}"
+
+
+def _read_stamps(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def ensure_collection_cached(session, qdrant_url, collection, dim, stamp_path=COLLECTION_CHECK_CACHE,
+                             ttl=COLLECTION_CHECK_TTL, force=False):
+    """Wie ``ensure_collection``, aber höchstens einmal pro Prozess und – mit ``stamp_path`` – pro TTL.
+
+    Der Stempel überlebt Neustarts (z. B. auf einem Volume), sodass ein Pod-Start ohne
+    Qdrant-Roundtrip auskommt. Gibt ``True`` zurück, wenn tatsächlich geprüft wurde.
+    """
+    key = _check_key(qdrant_url, collection, dim)
+    with _checked_lock:
+        if not force and key in _checked:
+            return False
+        stamps = _read_stamps(stamp_path) if stamp_path else {}
+        if not force and time.time() - stamps.get(key, 0) < ttl:
+            _checked.add(key)
+            return False
+        ensure_collection(session, qdrant_url, collection, dim)
+        _checked.add(key)
+        if stamp_path:
+            stamps[key] = time.time()
+            os.makedirs(os.path.dirname(os.path.abspath(stamp_path)), exist_ok=True)
+            tmp = f"{stamp_path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(stamps, f)
+            os.replace(tmp, stamp_path)
+        return True
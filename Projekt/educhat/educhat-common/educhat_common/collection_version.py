@@ -0,0 +1,90 @@
+"""Versionsmarke pro Collection, abgelegt in einer kleinen Meta-Collection in Qdrant.
+
+Schreibende Dienste (Ingest, Scraper) erhöhen die Marke; Leser verwerfen damit
+Caches, die auf einem älteren Stand der Collection beruhen.
+"""
+import json
+import os
+import time
+import uuid
+
+META_COLLECTION = os.environ.get("META_COLLECTION", "educhat_meta")
+
+_meta_ready = set()
+
+
+def _point_id(collection):
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"educhat-collection-version:{collection}"))
+
+
+def _marker(collection, version=None):
+    # die Meta-Collection braucht einen Vektor, der Inhalt ist egal
+    return {"points": [{"id": _point_id(collection), "vector": [1.0],
+                        "payload": {"collection": collection, "version": version or str(time.time_ns())}}]}
+
+
+_META_SCHEMA = {"vectors": {"size": 1, "distance": "Dot"}}
+
+
+def _check_meta(get, create=None):
+    # erst nach 200 oder erfolgreichem Anlegen gilt die Meta-Collection als vorhanden;
+    # 409 heißt, ein anderer Prozess hat sie gerade angelegt
+    if get.status_code != 404 or create is None:
+        get.raise_for_status()
+    elif create.status_code != 409:
+        create.raise_for_status()
+
+
+def _ensure_meta(session, qdrant_url):
+    if qdrant_url in _meta_ready:
+        return
+    r = session.get(f"{qdrant_url}/collections/{META_COLLECTION}")
+    created = None
+    if r.status_code == 404:
+        created = session.put(f"{qdrant_url}/collections/{META_COLLECTION}", data=json.dumps(_META_SCHEMA))
+    _check_meta(r, created)
+    _meta_ready.add(qdrant_url)
+
+
+def bump_version(session, qdrant_url, collection, version=None):
+    """Setzt eine neue Version; Fehler werden nicht verschluckt.
+
+    Mit ``version`` wird genau diese gesetzt – nach dem Import eines Snapshots dessen
+    Version, damit ein lokaler Index aus demselben Snapshot als aktuell gilt.
+    """
+    _ensure_meta(session, qdrant_url)
+    r = session.put(f"{qdrant_url}/collections/{META_COLLECTION}/points?wait=true",
+                    data=json.dumps(_marker(collection, version)))
+    r.raise_for_status()
+
+
+def read_version(session, qdrant_url, collection):
+    """Aktuelle Version oder "0", solange noch nie eine gesetzt wurde"""
+    r = session.get(f"{qdrant_url}/collections/{META_COLLECTION}/points/{_point_id(collection)}")
+    if r.status_code == 404:
+        return "0"
+    r.raise_for_status()
+    return (r.json().get("result") or {}).get("payload", {}).get("version", "0")
+
+
+async def abump_version(client, qdrant_url, collection):
+    """Async-Variante für httpx.AsyncClient"""
+    if qdrant_url not in _meta_ready:
+        r = await client.get(f"{qdrant_url}/collections/{META_COLLECTION}")
+        created = None
+        if r.status_code == 404:
+            created = await client.put(f"{qdrant_url}/collections/{META_COLLECTION}",
+                                       content=json.dumps(_META_SCHEMA))
+        _check_meta(r, created)
+        _meta_ready.add(qdrant_url)
+    r = await client.put(f"{qdrant_url}/collections/{META_COLLECTION}/points?wait=true",
+                         content=json.dumps(_marker(collection)))
+    r.raise_for_status()
+
+
+async def aread_version(client, qdrant_url, collection):
+    r = await client.get(f"{qdrant_url}/collections/{META_COLLECTION}/points/{_point_id(collection)}")
+    if r.status_code == 404:
+        return "0"
+    r.raise_for_status()
+    return (r.json().get("result") or {}).get("payload", {}).get("version", "0")
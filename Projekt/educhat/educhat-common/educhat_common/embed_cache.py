@@ -0,0 +1,263 @@
+"""Inhaltsadressierter Embedding-Cache: LRU im Speicher vor einer SQLite-Datei."""
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+
+from .metrics import count_cache
+
+EMBED_CACHE_PATH = os.environ.get(
+    "EMBED_CACHE_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "educhat", "embeddings.sqlite3"))
+EMBED_CACHE_MEMORY_ITEMS = int(os.environ.get("EMBED_CACHE_MEMORY_ITEMS", "4096"))
+EMBED_CACHE_MAX_ITEMS = int(os.environ.get("EMBED_CACHE_MAX_ITEMS", "200000"))
+EMBED_CACHE_SNAPSHOT = os.environ.get("EMBED_CACHE_SNAPSHOT", "")  # Vorlage, falls EMBED_CACHE_PATH noch fehlt
+
+
+def normalize_text(text: str) -> str:
+    """Unicode-NFC und zusammengefasste Leerzeichen – Grundlage für den Cache-Schlüssel"""
+    return " ".join(unicodedata.normalize("NFC", text or "").split())
+
+
+def cache_key(model: str, text: str) -> bytes:
+    return hashlib.sha256(f"{model}\x00{normalize_text(text)}".encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """Zwei Stufen: OrderedDict-LRU im Prozess, darunter SQLite mit Größenbegrenzung.
+
+    Ist ``path`` leer, arbeitet der Cache nur im Speicher.
+    """
+
+    def __init__(self, path=EMBED_CACHE_PATH, memory_items=EMBED_CACHE_MEMORY_ITEMS,
+                 max_items=EMBED_CACHE_MAX_ITEMS):
+        self.memory_items = memory_items
+        self.max_items = max_items
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._disk_count = 0
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, timeout=10, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS embeddings ("
+                             "key BLOB PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)")
+            self._db.commit()
+            self._disk_count = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _from_memory(self, keys):
+        result = [None] * len(keys)
+        missing = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    result[i] = vector
+                else:
+                    missing.append(i)
+        return result, missing
+
+    def _from_disk(self, keys, result, missing):
+        """Füllt ``result`` für die ``missing``-Positionen aus SQLite – blockiert auf Platten-I/O"""
+        with self._lock:
+            if self._db is None:
+                return
+            wanted = list({keys[i] for i in missing})
+            found = {}
+            for start in range(0, len(wanted), 500):
+                part = wanted[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})",
+                    part).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+            if found:
+                now = time.time()
+                self._db.executemany("UPDATE embeddings SET last_used=? WHERE key=?",
+                                     [(now, k) for k in found])
+                self._db.commit()
+            for i in missing:
+                vector = found.get(keys[i])
+                if vector is not None:
+                    self._remember(keys[i], vector)
+                    result[i] = vector
+
+    def _count(self, result):
+        hit_count = sum(v is not None for v in result)
+        with self._lock:
+            self.hits += hit_count
+            self.misses += len(result) - hit_count
+        count_cache("embedding", hit_count, len(result) - hit_count)
+        return result
+
+    def get_many(self, model, texts):
+        """Liefert pro Text den Vektor oder None"""
+        keys = [cache_key(model, t) for t in texts]
+        result, missing = self._from_memory(keys)
+        if missing and self._db is not None:
+            self._from_disk(keys, result, missing)
+        return self._count(result)
+
+    async def aget_many(self, model, texts):
+        """Wie ``get_many``; der Speicher-LRU antwortet direkt, SQLite läuft in einem Worker-Thread"""
+        keys = [cache_key(model, t) for t in texts]
+        result, missing = self._from_memory(keys)
+        if missing and self._db is not None:
+            await asyncio.to_thread(self._from_disk, keys, result, missing)
+        return self._count(result)
+
+    def warm(self, limit=None):
+        """Lädt die zuletzt genutzten Einträge von Platte in den Speicher-LRU; liefert die Anzahl"""
+        if self._db is None:
+            return 0
+        limit = self.memory_items if limit is None else min(limit, self.memory_items)
+        with self._lock:
+            rows = self._db.execute("SELECT key, vector FROM embeddings ORDER BY last_used DESC LIMIT ?",
+                                    (limit,)).fetchall()
+            # älteste zuerst, damit die jüngsten am Ende des LRU landen
+            for key, blob in reversed(rows):
+                self._remember(key, array("f", blob).tolist())
+        return len(rows)
+
+    def _to_memory(self, model, texts, vectors):
+        now = time.time()
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = cache_key(model, text)
+                vector = list(vector)
+                self._remember(key, vector)
+                rows.append((key, array("f", vector).tobytes(), now))
+        return rows
+
+    def _to_disk(self, rows):
+        with self._lock:
+            if self._db is None or not rows:
+                return
+            before = self._db.total_changes
+            self._db.executemany("INSERT OR IGNORE INTO embeddings(key, vector, last_used) VALUES (?, ?, ?)",
+                                 rows)
+            self._disk_count += self._db.total_changes - before
+            self._evict()
+            self._db.commit()
+
+    def put_many(self, model, texts, vectors):
+        rows = self._to_memory(model, texts, vectors)
+        if self._db is not None:
+            self._to_disk(rows)
+
+    async def aput_many(self, model, texts, vectors):
+        """Wie ``put_many``; Insert, Verdrängung und Commit laufen in einem Worker-Thread"""
+        rows = self._to_memory(model, texts, vectors)
+        if self._db is not None and rows:
+            await asyncio.to_thread(self._to_disk, rows)
+
+    def _evict(self):
+        overflow = self._disk_count - self.max_items
+        if overflow <= 0:
+            return
+        # 10 % Luft schaffen, damit nicht bei jedem Insert erneut geräumt wird
+        overflow += self.max_items // 10
+        self._db.execute("DELETE FROM embeddings WHERE key IN "
+                         "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (overflow,))
+        self._disk_count = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+def _pending(texts, vectors):
+    # gleiche Texte innerhalb eines Aufrufs nur einmal anfragen
+    pending = {}
+    for i, (text, vector) in enumerate(zip(texts, vectors)):
+        if vector is None:
+            pending.setdefault(normalize_text(text), []).append(i)
+    return pending
+
+
+def _fill(vectors, pending, fresh):
+    for vector, positions in zip(fresh, pending.values()):
+        for i in positions:
+            vectors[i] = vector
+    return vectors
+
+
+def embed_with_cache(cache, model, texts, embed_fn):
+    """Ruft ``embed_fn`` nur für die Texte auf, die noch nicht im Cache liegen"""
+    vectors = cache.get_many(model, texts)
+    pending = _pending(texts, vectors)
+    if not pending:
+        return vectors
+    fresh = embed_fn(list(pending))
+    cache.put_many(model, list(pending), fresh)
+    return _fill(vectors, pending, fresh)
+
+
+async def aembed_with_cache(cache, model, texts, aembed_fn):
+    """Async-Variante von embed_with_cache; SQLite blockiert dabei nie die Event-Loop"""
+    vectors = await cache.aget_many(model, texts)
+    pending = _pending(texts, vectors)
+    if not pending:
+        return vectors
+    fresh = await aembed_fn(list(pending))
+    await cache.aput_many(model, list(pending), fresh)
+    return _fill(vectors, pending, fresh)
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def _seed_from_snapshot(path=EMBED_CACHE_PATH, snapshot=EMBED_CACHE_SNAPSHOT):
+    """Kopiert eine mitgelieferte Cache-Datei (Image oder Volume), solange noch kein eigener Cache existiert"""
+    if not path or not snapshot or os.path.exists(path) or not os.path.exists(snapshot):
+        return False
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        # über die SQLite-Backup-API, damit auch ein Snapshot mit WAL-Anteil vollständig ankommt
+        src, dst = sqlite3.connect(snapshot), sqlite3.connect(tmp)
+        try:
+            src.backup(dst)
+        finally:
+            src.close()
+            dst.close()
+        os.replace(tmp, path)
+    except (OSError, sqlite3.Error):
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return False
+    return True
+
+
+def get_default_cache():
+    """Prozessweiter Cache; fällt auf reinen Speicher-Cache zurück, wenn die Datei nicht nutzbar ist"""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _seed_from_snapshot()
+            try:
+                _default_cache = EmbeddingCache()
+            except (OSError, sqlite3.Error):
+                _default_cache = EmbeddingCache(path="")
+        return _default_cache
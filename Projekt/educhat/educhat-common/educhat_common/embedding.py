@@ -0,0 +1,141 @@
+"""Gebündelte, nebenläufige Embedding-Aufrufe mit stabiler Reihenfolge."""
+import asyncio
+import logging
+
+from .embed_cache import normalize_text
+from .metrics import count_usage, timed
+from .ratelimit import BULK, get_limiter, is_rate_limit_error
+from .tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Grenzen der OpenAI-Embeddings-API
+MAX_INPUT_TOKENS = 8191
+MAX_BATCH_ITEMS = 2048
+# weitere Versuche nach einem 429, wenn auch die Retries des SDK erschöpft sind
+RATE_LIMIT_RETRIES = 3
+# volle Ausgabebreite; die text-embedding-3-Modelle lassen sich per ``dimensions`` kürzen
+MODEL_DIMS = {"text-embedding-3-small": 1536, "text-embedding-3-large": 3072, "text-embedding-ada-002": 1536}
+SHORTENABLE_PREFIX = "text-embedding-3-"
+
+
+def embedding_options(model, dim=None):
+    """Zusatzargumente für ``embeddings.create``, damit die API ``dim`` Dimensionen liefert.
+
+    Leer bei voller Breite. ``dimensions`` geht über ``extra_body``, weil die gepinnte
+    openai-Version den Parameter noch nicht kennt – die API wertet ihn trotzdem aus.
+    """
+    native = MODEL_DIMS.get(model)
+    if not dim or dim == native:
+        return {}
+    if not model.startswith(SHORTENABLE_PREFIX):
+        if native is None:
+            # unbekanntes Modell: EMBED_DIM beschreibt dessen Ausgabe, gekürzt wird nichts
+            return {}
+        raise ValueError(f"{model} liefert nur {native} Dimensionen, EMBED_DIM={dim} geht nicht")
+    if native is not None and dim > native:
+        raise ValueError(f"{model} liefert höchstens {native} Dimensionen, nicht {dim}")
+    return {"extra_body": {"dimensions": dim}}
+
+
+def cache_model(model, dim=None):
+    """Namensraum im Embedding-Cache: gekürzte Vektoren dürfen volle nicht überschreiben"""
+    return f"{model}@{dim}" if embedding_options(model, dim) else model
+
+
+def token_sizes(texts, model="text-embedding-3-small"):
+    return [min(count_tokens(text, model), MAX_INPUT_TOKENS) for text in texts]
+
+
+def token_batches(texts, max_tokens=50000, max_items=512, model="text-embedding-3-small", sizes=None):
+    """Teilt die Indizes von ``texts`` in Batches, die das Token-Budget einhalten"""
+    max_items = min(max_items, MAX_BATCH_ITEMS)
+    sizes = sizes or token_sizes(texts, model)
+    batches, current, used = [], [], 0
+    for i, tokens in enumerate(sizes):
+        if current and (used + tokens > max_tokens or len(current) >= max_items):
+            batches.append(current)
+            current, used = [], 0
+        current.append(i)
+        used += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _is_input_error(exc):
+    # 400er liegen an einzelnen Eingaben, alles andere (Timeout, 429, 5xx) am ganzen Batch
+    return getattr(exc, "status_code", None) in (400, 422)
+
+
+async def embed_batched(aclient, model, texts, max_tokens=50000, max_items=512, concurrency=4, cache=None,
+                        priority=BULK, dim=None):
+    """Embeddet ``texts`` in Token-budgetierten Batches über einen Async-Client.
+
+    Gibt ``(vectors, errors)`` zurück: ``vectors[i]`` ist None, wenn Text ``i`` fehlschlug,
+    ``errors`` ordnet diesen Indizes die Exception zu. Schlägt ein Batch wegen einer
+    ungültigen Eingabe fehl, wird er halbiert, bis der fehlerhafte Text isoliert ist.
+    Jeder Batch läuft über den Rate-Limit-Scheduler (``priority``); nach einem 429 wird
+    er erneut eingeplant, statt verloren zu gehen. ``dim`` kürzt die Ausgabe (``EMBED_DIM``).
+    """
+    vectors = [None] * len(texts)
+    errors = {}
+    options = embedding_options(model, dim)
+    namespace = cache_model(model, dim)
+
+    if cache is not None:
+        for i, vector in enumerate(await cache.aget_many(namespace, texts)):
+            vectors[i] = vector
+
+    # gleiche Texte nur einmal schicken
+    unique = {}
+    for i, text in enumerate(texts):
+        if vectors[i] is None:
+            unique.setdefault(normalize_text(text), []).append(i)
+    inputs = list(unique)
+    positions = list(unique.values())
+    if not inputs:
+        return vectors, errors
+
+    semaphore = asyncio.Semaphore(concurrency)
+    sizes = token_sizes(inputs, model)
+    limiter = get_limiter()
+
+    async def run(batch, attempt=0):
+        async with semaphore:
+            try:
+                async with limiter.aslot(sum(sizes[j] for j in batch), priority) as ticket:
+                    with timed("embed_batch"):
+                        resp = await aclient.embeddings.create(model=model, input=[inputs[j] for j in batch],
+                                                               **options)
+            except Exception as e:
+                failure = e
+            else:
+                usage = getattr(resp, "usage", None)
+                ticket.settle(getattr(usage, "total_tokens", None))
+                count_usage(usage, "embedding")
+                fresh = [None] * len(batch)
+                for item in resp.data:
+                    fresh[item.index] = item.embedding
+                if cache is not None:
+                    await cache.aput_many(namespace, [inputs[j] for j in batch], fresh)
+                for j, vector in zip(batch, fresh):
+                    for i in positions[j]:
+                        vectors[i] = vector
+                return
+        if len(batch) > 1 and _is_input_error(failure):
+            mid = len(batch) // 2
+            await asyncio.gather(run(batch[:mid]), run(batch[mid:]))
+            return
+        if is_rate_limit_error(failure) and attempt < RATE_LIMIT_RETRIES:
+            # der Scheduler ist nach dem 429 gesperrt – der neue Versuch wartet dort
+            logger.warning(f"Embedding-Batch mit {len(batch)} Texten rate-limitiert, neuer Versuch {attempt + 1}")
+            await run(batch, attempt + 1)
+            return
+        logger.error(f"Embedding-Batch mit {len(batch)} Texten fehlgeschlagen: {failure}")
+        for j in batch:
+            for i in positions[j]:
+                errors[i] = failure
+
+    await asyncio.gather(*(run(b) for b in token_batches(inputs, max_tokens, max_items, model, sizes)))
+    return vectors, errors
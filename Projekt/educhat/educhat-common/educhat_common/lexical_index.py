@@ -0,0 +1,178 @@
+"""Lokaler BM25-Index über title/content/tags mit deutscher Tokenisierung und Reciprocal Rank Fusion."""
+import heapq
+import json
+import math
+import os
+import re
+import unicodedata
+from collections import Counter
+
+STOPWORDS = {
+    "der", "die", "das", "den", "dem", "des", "ein", "eine", "einer", "eines", "einem", "einen",
+    "und", "oder", "aber", "in", "im", "ist", "sind", "war", "zu", "zum", "zur", "mit", "von", "vom",
+    "für", "fuer", "auf", "an", "am", "als", "auch", "bei", "nach", "aus", "wie", "was", "wer", "wo",
+    "welche", "welcher", "welches", "ich", "du", "sie", "es", "wir", "ihr", "man", "nicht", "kein",
+    "keine", "gibt", "kann", "ich", "mir", "mich", "mein", "meine", "sich", "so", "um", "über", "ueber",
+}
+# Reihenfolge zählt: längste Endung zuerst
+SUFFIXES = ("ungen", "heiten", "keiten", "ung", "heit", "keit", "en", "er", "em", "es", "e", "n", "s")
+UMLAUTS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+# Feldgewichte: ein Titel-Treffer zählt doppelt
+FIELD_WEIGHTS = (("title", 2), ("tags", 2), ("content", 1), ("description", 1))
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def _stem(word):
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text):
+    """Kleinschreibung, Umlaute/ß gefaltet, Stoppwörter raus, leichte Endungskürzung"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    words = _WORD.findall(text.replace("-", " ").translate(UMLAUTS))
+    return [_stem(w) for w in words if w not in STOPWORDS and len(w) > 1]
+
+
+def _document_terms(payload):
+    counts = Counter()
+    for field, weight in FIELD_WEIGHTS:
+        value = payload.get(field)
+        if isinstance(value, list):
+            value = " ".join(str(v) for v in value)
+        for term in tokenize(value or ""):
+            counts[term] += weight
+    return counts
+
+
+class LexicalIndex:
+    """BM25 über gewichtete Felder; Treffer ``{"id", "coverage", "bm25", "payload"}``.
+
+    ``coverage`` ist der Anteil der Suchbegriffe, die im Dokument vorkommen (0..1). Ein
+    ``score`` fehlt bewusst: der bleibt dem Kosinus der Vektorsuche vorbehalten.
+    """
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.version = None
+        self._docs = {}
+        self._postings = {}
+        self._total_len = 0
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, point_id, payload):
+        self.remove(point_id)
+        terms = _document_terms(payload)
+        length = sum(terms.values())
+        self._docs[point_id] = {"terms": terms, "len": length, "payload": payload}
+        self._total_len += length
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[point_id] = tf
+
+    def remove(self, point_id):
+        doc = self._docs.pop(point_id, None)
+        if doc is None:
+            return
+        self._total_len -= doc["len"]
+        for term in doc["terms"]:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(point_id, None)
+                if not postings:
+                    del self._postings[term]
+
+    def remove_where(self, field, values):
+        """Entfernt alle Dokumente, deren Payload-Feld ``field`` einen der ``values`` hat"""
+        values = set(values)
+        for point_id in [pid for pid, doc in self._docs.items() if doc["payload"].get(field) in values]:
+            self.remove(point_id)
+
+    def search(self, query, limit=5):
+        terms = set(tokenize(query))
+        if not terms or not self._docs:
+            return []
+        n = len(self._docs)
+        avg_len = self._total_len / n or 1.0
+        scores, matched = {}, Counter()
+        for term in terms:
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for pid, tf in postings.items():
+                norm = tf + self.k1 * (1 - self.b + self.b * self._docs[pid]["len"] / avg_len)
+                scores[pid] = scores.get(pid, 0.0) + idf * tf * (self.k1 + 1) / norm
+                matched[pid] += 1
+        top = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [{"id": pid, "coverage": matched[pid] / len(terms), "bm25": bm25, "payload": self._docs[pid]["payload"]}
+                for pid, bm25 in top]
+
+    def search_confident(self, query, limit=5, margin=1.5):
+        """Treffer plus Urteil, ob der beste Treffer eindeutig genug ist, um ohne Embedding zu antworten:
+        alle Suchbegriffe kommen vor und der BM25-Wert liegt um ``margin`` vor dem zweiten"""
+        hits = self.search(query, limit)
+        if not hits or hits[0]["coverage"] < 1.0:
+            return hits, False
+        if len(hits) > 1 and hits[0]["bm25"] < margin * hits[1]["bm25"]:
+            return hits, False
+        return hits, True
+
+    # --- Persistenz --------------------------------------------------------
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # eigene Temp-Datei pro Prozess: mehrere Pods können sich ein Volume teilen
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            # Liste statt Dict, damit Integer-IDs Integer bleiben
+            json.dump({"version": self.version,
+                       "docs": [{"id": pid, "payload": d["payload"]} for pid, d in self._docs.items()]},
+                      f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls()
+        for doc in data.get("docs", []):
+            index.add(doc["id"], doc.get("payload") or {})
+        index.version = data.get("version")
+        return index
+
+    @classmethod
+    def from_qdrant(cls, session, qdrant_url, collection, batch_size=512, version=None):
+        """Baut den Index aus den Payloads der Collection (ohne Vektoren)"""
+        from .vector_index import scroll_pages
+        index = cls()
+        for page in scroll_pages(session, qdrant_url, collection, batch_size, with_vector=False):
+            for point in page:
+                index.add(point["id"], point.get("payload") or {})
+        index.version = version
+        return index
+
+
+def rrf_fuse(rankings, limit=5, k=60):
+    """Reciprocal Rank Fusion mehrerer Trefferlisten.
+
+    ``score`` (Kosinus) und ``coverage`` (Begriffsabdeckung) bleiben getrennt erhalten – je der
+    höchste Wert aus den Listen, die den Treffer enthalten. Ein rein lexikalischer Treffer hat
+    also keinen ``score``. Der RRF-Wert steht in ``rrf``.
+    """
+    fused = {}
+    for hits in rankings:
+        for rank, hit in enumerate(hits, start=1):
+            entry = fused.get(hit["id"])
+            if entry is None:
+                entry = fused[hit["id"]] = dict(hit, rrf=0.0)
+            entry["rrf"] += 1.0 / (k + rank)
+            for field in ("score", "coverage"):
+                if field in hit:
+                    entry[field] = max(entry.get(field, hit[field]), hit[field])
+    return sorted(fused.values(), key=lambda h: h["rrf"], reverse=True)[:limit]
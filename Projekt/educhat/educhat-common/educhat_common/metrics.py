@@ -0,0 +1,189 @@
+"""Prozessweite Metriken ohne Zusatzpaket: Histogramme und Zähler im Prometheus-Textformat.
+
+Die Dienste messen dieselben Schritte unter denselben Namen, damit Dashboards und
+Kapazitätsplanung für Chat, Alerts-API und Scraper gleich aussehen:
+
+- ``educhat_stage_seconds{stage}``        – Dauer je Verarbeitungsschritt
+- ``educhat_tokens_total{kind}``          – prompt, completion, embedding
+- ``educhat_cache_lookups_total{cache,result}`` – hit / miss
+- ``educhat_qdrant_requests_total{op,outcome}`` – ok / error, daraus die Fehlerrate
+- ``educhat_openai_rate_limited_total``   – 429-Antworten von OpenAI (siehe ``ratelimit``)
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+METRICS_TEXTFILE = os.environ.get("METRICS_TEXTFILE", "")  # für den node-exporter Textfile-Collector
+
+# von lokalen Index-Treffern (ms) bis zu langen Completions (s)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, values)) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, doc, labels=()):
+        self.name = name
+        self.doc = doc
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, "")) for n in self.label_names)
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            for key, value in sorted(self._series.items()):
+                lines.append(f"{self.name}{_labels(self.label_names, key)} {value}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, doc, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, doc, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            series["counts"][bisect_left(self.buckets, value)] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def quantile(self, q, **labels):
+        """Schätzung aus den Buckets (lineare Interpolation wie histogram_quantile)"""
+        series = self._series.get(self._key(labels))
+        if not series or not series["count"]:
+            return None
+        rank, seen, lower = q * series["count"], 0, 0.0
+        for bound, count in zip(self.buckets + (float("inf"),), series["counts"]):
+            if count and seen + count >= rank:
+                if bound == float("inf"):
+                    return lower
+                return lower + (bound - lower) * (rank - seen) / count
+            seen += count
+            lower = bound
+        return lower
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), series["counts"]):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{self.name}_bucket{_labels(self.label_names + ('le',), key + (le,))} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {series['sum']}")
+                lines.append(f"{self.name}_count{_labels(self.label_names, key)} {series['count']}")
+        return lines
+
+
+STAGE_SECONDS = Histogram("educhat_stage_seconds", "Dauer je Verarbeitungsschritt in Sekunden", ("stage",))
+TOKENS = Counter("educhat_tokens_total", "Verbrauchte Tokens nach Art", ("kind",))
+CACHE_LOOKUPS = Counter("educhat_cache_lookups_total", "Cache-Abfragen nach Ergebnis", ("cache", "result"))
+QDRANT_REQUESTS = Counter("educhat_qdrant_requests_total", "Qdrant-Aufrufe nach Ausgang", ("op", "outcome"))
+OPENAI_RATE_LIMITED = Counter("educhat_openai_rate_limited_total", "429-Antworten von OpenAI")
+
+REGISTRY = [STAGE_SECONDS, TOKENS, CACHE_LOOKUPS, QDRANT_REQUESTS, OPENAI_RATE_LIMITED]
+
+
+@contextmanager
+def timed(stage):
+    """Misst die Dauer des Blocks als ``educhat_stage_seconds{stage=...}``"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+@contextmanager
+def qdrant_call(op):
+    """Wie ``timed``, zählt zusätzlich Erfolg/Fehler des Qdrant-Aufrufs"""
+    with timed(f"qdrant_{op}"):
+        try:
+            yield
+        except Exception:
+            QDRANT_REQUESTS.inc(op=op, outcome="error")
+            raise
+    QDRANT_REQUESTS.inc(op=op, outcome="ok")
+
+
+def count_cache(cache, hits, misses):
+    if hits:
+        CACHE_LOOKUPS.inc(hits, cache=cache, result="hit")
+    if misses:
+        CACHE_LOOKUPS.inc(misses, cache=cache, result="miss")
+
+
+def count_usage(usage, kind="prompt"):
+    """Tokens aus einem OpenAI-``usage``-Objekt übernehmen (Embeddings haben nur prompt_tokens)"""
+    if usage is None:
+        return
+    if kind == "embedding":
+        TOKENS.inc(getattr(usage, "prompt_tokens", 0) or 0, kind="embedding")
+        return
+    TOKENS.inc(getattr(usage, "prompt_tokens", 0) or 0, kind="prompt")
+    TOKENS.inc(getattr(usage, "completion_tokens", 0) or 0, kind="completion")
+
+
+def render():
+    """Alle Metriken im Prometheus-Textformat 0.0.4"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(path=METRICS_TEXTFILE):
+    """Schreibt atomar für den Textfile-Collector; ohne Pfad passiert nichts"""
+    if not path:
+        return False
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(render())
+    os.replace(tmp, path)
+    return True
+
+
+def summary():
+    """Kurze Tabelle für CLI und Logs: Schritte mit Anzahl, p50/p95 und Summe, danach die Zähler"""
+    lines = [f"{'Schritt':<28}{'Anzahl':>8}{'p50 ms':>10}{'p95 ms':>10}{'Summe s':>10}"]
+    for key, series in sorted(STAGE_SECONDS._series.items()):
+        stage = key[0]
+        p50 = STAGE_SECONDS.quantile(0.5, stage=stage) * 1000
+        p95 = STAGE_SECONDS.quantile(0.95, stage=stage) * 1000
+        lines.append(f"{stage:<28}{series['count']:>8}{p50:>10.1f}{p95:>10.1f}{series['sum']:>10.2f}")
+    for metric in (TOKENS, CACHE_LOOKUPS, QDRANT_REQUESTS, OPENAI_RATE_LIMITED):
+        for key, value in sorted(metric._series.items()):
+            lines.append(f"{metric.name}{_labels(metric.label_names, key)} {value}")
+    return "\n".join(lines)
@@ -0,0 +1,161 @@
+"""Collection auf eine andere Embedding-Dimension umziehen und per Alias atomar umschalten.
+
+Die Dienste sprechen Qdrant immer unter demselben Namen an (``QDRANT_COLLECTION``). Nach
+der ersten Migration ist das ein Alias; jede weitere legt eine neue Collection an, füllt
+sie und biegt den Alias in einem einzigen ``/collections/aliases``-Aufruf um – Leser sehen
+entweder die alte oder die neue Collection, nie eine halb gefüllte.
+
+Zwei Wege zu den neuen Vektoren:
+
+- kürzen: erste ``dim`` Komponenten, neu normalisiert. Bei text-embedding-3 liefert die API
+  mit ``dimensions=dim`` genau das – ohne einen einzigen Embedding-Aufruf.
+- neu embedden: für Modelle ohne kürzbare Ausgabe oder beim Modellwechsel; Text aus
+  ``content`` bzw. Titel und Beschreibung der Payload.
+"""
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from .collection_schema import ensure_collection
+from .vector_index import scroll_pages, shorten
+
+
+class MigrationError(RuntimeError):
+    pass
+
+
+def parallel_upsert(upsert, batches, concurrency=4):
+    """Ruft ``upsert(points)`` für jeden Block auf, höchstens ``concurrency`` gleichzeitig.
+
+    ``batches`` wird nur so weit vorausgelesen, wie Blöcke in Arbeit sind; ``upsert``
+    gibt die Zahl geschriebener Punkte zurück, die Summe ist das Ergebnis.
+    """
+    done, pending = 0, deque()
+    with ThreadPoolExecutor(concurrency) as pool:
+        for points in batches:
+            pending.append(pool.submit(upsert, points))
+            while len(pending) >= 2 * concurrency:
+                done += pending.popleft().result()
+        while pending:
+            done += pending.popleft().result()
+    return done
+
+
+def resolve_alias(session, qdrant_url, name):
+    """Collection hinter ``name``, falls das ein Alias ist – sonst ``None``"""
+    r = session.get(f"{qdrant_url}/aliases")
+    r.raise_for_status()
+    for alias in (r.json().get("result") or {}).get("aliases", []):
+        if alias["alias_name"] == name:
+            return alias["collection_name"]
+    return None
+
+
+def collection_info(session, qdrant_url, collection):
+    r = session.get(f"{qdrant_url}/collections/{collection}")
+    if r.status_code == 404:
+        raise MigrationError(f"Collection '{collection}' gibt es nicht")
+    r.raise_for_status()
+    return r.json().get("result", {})
+
+
+def vector_size(info):
+    vectors = info.get("config", {}).get("params", {}).get("vectors", {})
+    return vectors.get("size") if isinstance(vectors, dict) else None
+
+
+def count_points(session, qdrant_url, collection):
+    r = session.post(f"{qdrant_url}/collections/{collection}/points/count", data=json.dumps({"exact": True}))
+    r.raise_for_status()
+    return r.json()["result"]["count"]
+
+
+def switch_alias(session, qdrant_url, alias, collection, replace_collection=False):
+    """Setzt ``alias`` auf ``collection`` – atomar, solange ``alias`` schon ein Alias ist.
+
+    Ist ``alias`` noch eine echte Collection, muss sie erst gelöscht werden (``replace_collection``);
+    bis der Alias steht, vergehen dann einige Millisekunden ohne Ziel.
+    """
+    actions = [{"create_alias": {"collection_name": collection, "alias_name": alias}}]
+    if resolve_alias(session, qdrant_url, alias) is not None:
+        actions.insert(0, {"delete_alias": {"alias_name": alias}})
+    elif replace_collection:
+        r = session.delete(f"{qdrant_url}/collections/{alias}")
+        r.raise_for_status()
+    r = session.post(f"{qdrant_url}/collections/aliases", data=json.dumps({"actions": actions}))
+    if r.status_code >= 400:
+        raise MigrationError(f"Alias '{alias}' nicht umgeschaltet: {r.status_code} {r.text}")
+
+
+def point_text(payload):
+    """Text zum Neu-Embedden: ``content`` (Chat, Alerts) oder Titel + Beschreibung (Scraper)"""
+    if payload.get("content"):
+        return payload["content"]
+    return "\n".join(str(payload[f]) for f in ("title", "description") if payload.get(f))
+
+
+def migrate_collection(session, qdrant_url, name, dim, upsert, embed=None, target=None, batch_size=512,
+                       concurrency=4, replace_collection=False, switch=True, log=print):
+    """Kopiert die Collection hinter ``name`` mit ``dim``-dimensionalen Vektoren nach ``target``.
+
+    ``upsert(collection, points)`` schreibt einen Block (z. B. über ``qdrant_transport``),
+    ``embed(texts)`` liefert Vektoren in Zieldimension – ohne ``embed`` wird gekürzt.
+    Mit ``switch`` zeigt ``name`` danach per Alias auf ``target``. Schreibende Dienste sollten
+    währenddessen ruhen, sonst fehlen ihre Änderungen in ``target``. Gibt eine Übersicht zurück.
+    """
+    alias_target = resolve_alias(session, qdrant_url, name)
+    source = alias_target or name
+    if alias_target is None and switch and not replace_collection:
+        raise MigrationError(f"'{name}' ist eine Collection, kein Alias. Die erste Migration ersetzt sie "
+                             "durch einen Alias und löscht dabei die alte Collection – vorher mit "
+                             "'export' sichern und mit --replace-collection bestätigen.")
+    source_dim = vector_size(collection_info(session, qdrant_url, source))
+    if embed is None and source_dim is not None and dim >= source_dim:
+        raise MigrationError(f"Kürzen geht nur auf weniger als {source_dim} Dimensionen, nicht {dim}")
+    target = target or f"{name}_{dim}d_{int(time.time())}"
+    if target in (source, name):
+        raise MigrationError(f"Ziel '{target}' muss eine neue Collection sein")
+    ensure_collection(session, qdrant_url, target, dim)
+    log(f"Migration '{source}' ({source_dim} Dim.) → '{target}' ({dim} Dim., "
+        f"{'neu embeddet' if embed else 'gekürzt'})")
+
+    start = time.perf_counter()
+
+    def converted():
+        for pages, page in enumerate(scroll_pages(session, qdrant_url, source, batch_size), start=1):
+            points = [p for p in page if p.get("vector") is not None or embed is not None]
+            if not points:
+                continue
+            if embed is None:
+                vectors = shorten([p["vector"] for p in points], dim)
+            else:
+                vectors = embed([point_text(p.get("payload") or {}) for p in points])
+            yield [{"id": p["id"], "vector": v, "payload": p.get("payload") or {}}
+                   for p, v in zip(points, vectors) if v is not None]
+            if pages % 20 == 0:
+                log(f"  {pages * batch_size} Punkte gelesen")
+
+    def write(points):
+        upsert(target, points)
+        return len(points)
+
+    written = parallel_upsert(write, converted(), concurrency)
+    copied = count_points(session, qdrant_url, target)
+    if copied != written:
+        raise MigrationError(f"'{target}' enthält {copied} Punkte, geschrieben wurden {written}")
+    # ohne Vektor oder ohne Embedding (Fehler, kein Text) – bleiben in der alten Collection
+    stats = {"source": source, "target": target, "dim": dim, "copied": copied,
+             "skipped": count_points(session, qdrant_url, source) - copied,
+             "seconds": round(time.perf_counter() - start, 1), "switched": False}
+
+    if stats["skipped"]:
+        log(f"  {stats['skipped']} Punkte nicht übernommen (ohne Vektor oder Text, Embedding-Fehler)")
+        if switch and alias_target is None:
+            # die alte Collection würde gelöscht – lieber gar nicht umschalten
+            raise MigrationError(f"{stats['skipped']} Punkte fehlen in '{target}', '{name}' bleibt unverändert")
+    if switch:
+        switch_alias(session, qdrant_url, name, target, replace_collection)
+        stats["switched"] = True
+        log(f"Alias '{name}' zeigt jetzt auf '{target}'")
+    return stats
@@ -0,0 +1,345 @@
+"""Suche, Upsert und Löschen in Qdrant über REST (JSON) oder gRPC (Protobuf) hinter einer Schnittstelle.
+
+REST schickt jeden Vektor als JSON-Text – 1536 Floats sind rund 30 KB pro Suche, die
+beide Seiten formatieren und parsen. gRPC überträgt sie als gepackte float32 (6 KB), und
+alle Aufrufe eines Prozesses teilen sich einen HTTP/2-Kanal (Multiplexing statt Pool).
+
+Beide Transporte nehmen dieselben Eingaben – Search-Bodies aus ``search_body``, Punkte als
+``{"id", "vector", "payload"}`` – und liefern Treffer im REST-Format ``{"id", "score",
+"payload"}``; die Aufrufer merken vom Wechsel nichts. Collection-Verwaltung, Scroll und
+Versionsmarken bleiben auf REST.
+
+gRPC braucht ``qdrant-client`` (grpcio und die generierten Stubs) und wird erst dann importiert.
+"""
+import asyncio
+import json
+import os
+import threading
+import weakref
+from urllib.parse import urlsplit
+
+QDRANT_TRANSPORT = os.environ.get("QDRANT_TRANSPORT", "rest")  # rest oder grpc
+QDRANT_GRPC_URL = os.environ.get("QDRANT_GRPC_URL", "")         # host:port, leer = Host aus QDRANT_URL
+QDRANT_GRPC_PORT = int(os.environ.get("QDRANT_GRPC_PORT", "6334"))
+
+TRANSPORTS = ("rest", "grpc")
+
+# Kanal-Optionen: große Upsert-Batches erlauben, Verbindung bei Leerlauf offen halten
+GRPC_OPTIONS = [("grpc.max_send_message_length", -1), ("grpc.max_receive_message_length", -1),
+                ("grpc.keepalive_time_ms", 30000), ("grpc.keepalive_permit_without_calls", 1)]
+
+_transports = {}
+_lock = threading.Lock()
+
+
+class QdrantTransportError(RuntimeError):
+    pass
+
+
+def _floats(vector):
+    # numpy-Zeilen (Snapshot-Import) wie Listen behandeln
+    return vector.tolist() if hasattr(vector, "tolist") else vector
+
+
+def _dumps(body):
+    return json.dumps(body, default=_floats)
+
+
+class RestTransport:
+    """JSON über die geteilten Keep-Alive-Pools aus ``clients``"""
+
+    name = "rest"
+
+    def __init__(self, qdrant_url):
+        self.url = qdrant_url.rstrip("/")
+
+    @staticmethod
+    def _result(r, op):
+        if r.status_code >= 400:
+            raise QdrantTransportError(f"{op} fehlgeschlagen: {r.status_code} {r.text}")
+        return r.json().get("result")
+
+    def _path(self, collection, suffix):
+        return f"{self.url}/collections/{collection}/points{suffix}"
+
+    # --- sync --------------------------------------------------------------
+
+    def search(self, collection, body, timeout=60):
+        from .clients import get_session
+        r = get_session().post(self._path(collection, "/search"), data=_dumps(body), timeout=timeout)
+        return self._result(r, "Search") or []
+
+    def search_batch(self, collection, bodies, timeout=60):
+        from .clients import get_session
+        r = get_session().post(self._path(collection, "/search/batch"), data=_dumps({"searches": bodies}),
+                               timeout=timeout)
+        return self._result(r, "Batch-Search") or []
+
+    def upsert(self, collection, points, wait=True, timeout=120):
+        from .clients import get_session
+        r = get_session().put(self._path(collection, f"?wait={str(wait).lower()}"), data=_dumps({"points": points}),
+                              timeout=timeout)
+        self._result(r, "Upsert")
+
+    def delete(self, collection, ids, wait=True, timeout=60):
+        from .clients import get_session
+        r = get_session().post(self._path(collection, f"/delete?wait={str(wait).lower()}"),
+                               data=_dumps({"points": list(ids)}), timeout=timeout)
+        self._result(r, "Delete")
+
+    # --- async -------------------------------------------------------------
+
+    async def asearch(self, collection, body, timeout=60):
+        from .clients import get_async_http_client
+        r = await get_async_http_client().post(self._path(collection, "/search"), content=_dumps(body),
+                                               timeout=timeout)
+        return self._result(r, "Search") or []
+
+    async def asearch_batch(self, collection, bodies, timeout=60):
+        from .clients import get_async_http_client
+        r = await get_async_http_client().post(self._path(collection, "/search/batch"),
+                                               content=_dumps({"searches": bodies}), timeout=timeout)
+        return self._result(r, "Batch-Search") or []
+
+    async def aupsert(self, collection, points, wait=True, timeout=120):
+        from .clients import get_async_http_client
+        r = await get_async_http_client().put(self._path(collection, f"?wait={str(wait).lower()}"),
+                                              content=_dumps({"points": points}), timeout=timeout)
+        self._result(r, "Upsert")
+
+    async def adelete(self, collection, ids, wait=True, timeout=60):
+        from .clients import get_async_http_client
+        r = await get_async_http_client().post(self._path(collection, f"/delete?wait={str(wait).lower()}"),
+                                               content=_dumps({"points": list(ids)}), timeout=timeout)
+        self._result(r, "Delete")
+
+    def connect(self, timeout=10):
+        """Für das Aufwärmen; der Keep-Alive-Pool öffnet Verbindungen bei Bedarf"""
+        return self.name
+
+    async def aconnect(self, timeout=10):
+        return self.name
+
+    def close(self):
+        pass
+
+
+def grpc_target(qdrant_url, grpc_url=QDRANT_GRPC_URL, port=QDRANT_GRPC_PORT):
+    """``host:port`` des gRPC-Endpunkts; ohne ``QDRANT_GRPC_URL`` derselbe Host wie REST"""
+    if grpc_url:
+        return grpc_url.split("://", 1)[-1]
+    return f"{urlsplit(qdrant_url).hostname or 'localhost'}:{port}"
+
+
+class GrpcTransport:
+    """Protobuf über einen HTTP/2-Kanal pro Prozess (sync) bzw. pro Event-Loop (async)"""
+
+    name = "grpc"
+
+    def __init__(self, qdrant_url, target=None):
+        try:
+            import grpc
+            from qdrant_client import grpc as pb
+            from qdrant_client.conversions.conversion import grpc_to_payload, payload_to_grpc
+        except ImportError as e:
+            raise RuntimeError("QDRANT_TRANSPORT=grpc braucht das Paket 'qdrant-client'") from e
+        self._grpc, self.pb = grpc, pb
+        self._to_payload, self._from_payload = payload_to_grpc, grpc_to_payload
+        self.target = target or grpc_target(qdrant_url)
+        self._channel = None
+        self._stub = None
+        self._aio = weakref.WeakKeyDictionary()  # Event-Loop → (aio-Kanal, Stub)
+        self._lock = threading.Lock()
+
+    def _sync_stub(self):
+        with self._lock:
+            if self._stub is None:
+                self._channel = self._grpc.insecure_channel(self.target, options=GRPC_OPTIONS)
+                self._stub = self.pb.PointsStub(self._channel)
+            return self._stub
+
+    def _async_channel(self):
+        # aio-Kanäle gehören zu dem Event-Loop, in dem sie angelegt wurden – jeder Loop
+        # (asyncio.run pro Aufruf, Worker-Threads) bekommt seinen eigenen
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if loop not in self._aio:
+                channel = self._grpc.aio.insecure_channel(self.target, options=GRPC_OPTIONS)
+                self._aio[loop] = (channel, self.pb.PointsStub(channel))
+            return self._aio[loop]
+
+    def _async_stub(self):
+        return self._async_channel()[1]
+
+    # --- REST-Bodies → Protobuf --------------------------------------------
+
+    def _point_id(self, point_id):
+        if isinstance(point_id, int):
+            return self.pb.PointId(num=point_id)
+        return self.pb.PointId(uuid=str(point_id))
+
+    def _match(self, match):
+        pb = self.pb
+        if "any" in match:
+            values = list(match["any"])
+            if values and all(isinstance(v, int) and not isinstance(v, bool) for v in values):
+                return pb.Match(integers=pb.RepeatedIntegers(integers=values))
+            return pb.Match(keywords=pb.RepeatedStrings(strings=[str(v) for v in values]))
+        value = match["value"]
+        if isinstance(value, bool):
+            return pb.Match(boolean=value)
+        if isinstance(value, int):
+            return pb.Match(integer=value)
+        return pb.Match(keyword=str(value))
+
+    def _filter(self, query_filter):
+        # deckt ab, was ``build_filter`` erzeugt: must/should/must_not mit key + match
+        conditions = {}
+        for clause in ("must", "should", "must_not"):
+            conditions[clause] = [self.pb.Condition(field=self.pb.FieldCondition(key=c["key"],
+                                                                                 match=self._match(c["match"])))
+                                  for c in query_filter.get(clause, [])]
+        return self.pb.Filter(**conditions)
+
+    def _with_payload(self, with_payload):
+        if isinstance(with_payload, dict) and "include" in with_payload:
+            return self.pb.WithPayloadSelector(include=self.pb.PayloadIncludeSelector(fields=with_payload["include"]))
+        return self.pb.WithPayloadSelector(enable=bool(with_payload))
+
+    def _search_points(self, collection, body):
+        pb = self.pb
+        params = body.get("params") or {}
+        search_params = pb.SearchParams(hnsw_ef=params["hnsw_ef"]) if "hnsw_ef" in params else pb.SearchParams()
+        if "quantization" in params:
+            q = params["quantization"]
+            search_params.quantization.CopyFrom(pb.QuantizationSearchParams(
+                ignore=q.get("ignore", False), rescore=q.get("rescore", False),
+                oversampling=q.get("oversampling", 1.0)))
+        request = pb.SearchPoints(collection_name=collection, vector=_floats(body["vector"]), limit=body["limit"],
+                                  with_payload=self._with_payload(body.get("with_payload", True)),
+                                  with_vectors=pb.WithVectorsSelector(enable=bool(body.get("with_vector"))),
+                                  params=search_params)
+        if body.get("filter"):
+            request.filter.CopyFrom(self._filter(body["filter"]))
+        if body.get("score_threshold") is not None:
+            request.score_threshold = body["score_threshold"]
+        return request
+
+    def _upsert_points(self, collection, points, wait):
+        pb = self.pb
+        return pb.UpsertPoints(collection_name=collection, wait=wait, points=[
+            pb.PointStruct(id=self._point_id(p["id"]), payload=self._to_payload(p.get("payload") or {}),
+                           vectors=pb.Vectors(vector=pb.Vector(data=_floats(p["vector"]))))
+            for p in points])
+
+    def _delete_points(self, collection, ids, wait):
+        pb = self.pb
+        return pb.DeletePoints(collection_name=collection, wait=wait, points=pb.PointsSelector(
+            points=pb.PointsIdsList(ids=[self._point_id(i) for i in ids])))
+
+    # --- Protobuf → REST-Format --------------------------------------------
+
+    def _hit(self, point):
+        kind = point.id.WhichOneof("point_id_options")
+        return {"id": point.id.num if kind == "num" else point.id.uuid, "version": point.version,
+                "score": point.score, "payload": self._from_payload(point.payload)}
+
+    def _error(self, op, e):
+        return QdrantTransportError(f"{op} fehlgeschlagen: {e.code().name} {e.details()}")
+
+    # --- sync --------------------------------------------------------------
+
+    def search(self, collection, body, timeout=60):
+        try:
+            response = self._sync_stub().Search(self._search_points(collection, body), timeout=timeout)
+        except self._grpc.RpcError as e:
+            raise self._error("Search", e) from e
+        return [self._hit(p) for p in response.result]
+
+    def search_batch(self, collection, bodies, timeout=60):
+        request = self.pb.SearchBatchPoints(collection_name=collection,
+                                            search_points=[self._search_points(collection, b) for b in bodies])
+        try:
+            response = self._sync_stub().SearchBatch(request, timeout=timeout)
+        except self._grpc.RpcError as e:
+            raise self._error("Batch-Search", e) from e
+        return [[self._hit(p) for p in batch.result] for batch in response.result]
+
+    def upsert(self, collection, points, wait=True, timeout=120):
+        try:
+            self._sync_stub().Upsert(self._upsert_points(collection, points, wait), timeout=timeout)
+        except self._grpc.RpcError as e:
+            raise self._error("Upsert", e) from e
+
+    def delete(self, collection, ids, wait=True, timeout=60):
+        try:
+            self._sync_stub().Delete(self._delete_points(collection, ids, wait), timeout=timeout)
+        except self._grpc.RpcError as e:
+            raise self._error("Delete", e) from e
+
+    # --- async -------------------------------------------------------------
+
+    async def asearch(self, collection, body, timeout=60):
+        try:
+            response = await self._async_stub().Search(self._search_points(collection, body), timeout=timeout)
+        except self._grpc.RpcError as e:
+            raise self._error("Search", e) from e
+        return [self._hit(p) for p in response.result]
+
+    async def asearch_batch(self, collection, bodies, timeout=60):
+        request = self.pb.SearchBatchPoints(collection_name=collection,
+                                            search_points=[self._search_points(collection, b) for b in bodies])
+        try:
+            response = await self._async_stub().SearchBatch(request, timeout=timeout)
+        except self._grpc.RpcError as e:
+            raise self._error("Batch-Search", e) from e
+        return [[self._hit(p) for p in batch.result] for batch in response.result]
+
+    async def aupsert(self, collection, points, wait=True, timeout=120):
+        try:
+            await self._async_stub().Upsert(self._upsert_points(collection, points, wait), timeout=timeout)
+        except self._grpc.RpcError as e:
+            raise self._error("Upsert", e) from e
+
+    async def adelete(self, collection, ids, wait=True, timeout=60):
+        try:
+            await self._async_stub().Delete(self._delete_points(collection, ids, wait), timeout=timeout)
+        except self._grpc.RpcError as e:
+            raise self._error("Delete", e) from e
+
+    def connect(self, timeout=10):
+        """Baut den Kanal beim Aufwärmen auf, statt in der ersten Anfrage"""
+        self._sync_stub()
+        try:
+            self._grpc.channel_ready_future(self._channel).result(timeout=timeout)
+        except self._grpc.FutureTimeoutError as e:
+            raise QdrantTransportError(f"gRPC-Kanal zu {self.target} nicht bereit") from e
+        return self.name
+
+    async def aconnect(self, timeout=10):
+        channel, _ = self._async_channel()
+        try:
+            await asyncio.wait_for(channel.channel_ready(), timeout)
+        except asyncio.TimeoutError as e:
+            raise QdrantTransportError(f"gRPC-Kanal zu {self.target} nicht bereit") from e
+        return self.name
+
+    def close(self):
+        with self._lock:
+            if self._channel is not None:
+                self._channel.close()
+            self._channel = self._stub = None
+            # aio-Kanäle werden mit ihrem Event-Loop abgebaut
+            self._aio.clear()
+
+
+def get_transport(qdrant_url, mode=None):
+    """Prozessweiter Transport pro Qdrant-URL; ``mode`` überschreibt QDRANT_TRANSPORT"""
+    mode = (mode or QDRANT_TRANSPORT).lower()
+    if mode not in TRANSPORTS:
+        raise ValueError(f"QDRANT_TRANSPORT {mode!r} unbekannt, erlaubt: {', '.join(TRANSPORTS)}")
+    with _lock:
+        key = (mode, qdrant_url)
+        if key not in _transports:
+            _transports[key] = GrpcTransport(qdrant_url) if mode == "grpc" else RestTransport(qdrant_url)
+        return _transports[key]
@@ -0,0 +1,300 @@
+"""Prozessweiter Scheduler für OpenAI-Aufrufe: Token-Buckets, AIMD und Prioritätsklassen.
+
+- Zwei Token-Buckets pro Minute – Requests (``OPENAI_RPM``) und Tokens (``OPENAI_TPM``).
+  Kommen ``x-ratelimit-*``-Header, übernehmen sie Limit und Restbestand; ohne Konfiguration
+  und ohne Header ist nichts begrenzt.
+- AIMD auf die Zahl gleichzeitiger Aufrufe: +1/Fenster pro Erfolg, Halbierung bei 429,
+  dazu eine Sperre bis ``retry-after`` bzw. exponentielles Backoff mit Jitter.
+- Prioritäten: ``interactive`` (Chat, /analyze) vor ``normal`` vor ``bulk`` (Scraper, Ingest).
+  Wartet eine höhere Klasse, kommt keine niedrigere dran, und ``bulk`` lässt
+  ``RATE_LIMIT_RESERVE`` der Buckets und des Fensters für interaktive Aufrufe frei.
+
+Sync- und Async-Code teilen sich eine Instanz (``get_limiter``); die Header liest ein
+Response-Hook der HTTP-Clients aus ``clients``, sodass auch die SDK-internen Retries zählen.
+"""
+import asyncio
+import os
+import random
+import re
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+from .metrics import OPENAI_RATE_LIMITED, STAGE_SECONDS
+
+OPENAI_RPM = float(os.environ.get("OPENAI_RPM", "0"))  # Requests/Minute, 0 = aus den Headern lernen
+OPENAI_TPM = float(os.environ.get("OPENAI_TPM", "0"))  # Tokens/Minute, 0 = aus den Headern lernen
+RATE_LIMIT_SHARE = float(os.environ.get("RATE_LIMIT_SHARE", "1.0"))      # Anteil dieses Pods am Org-Limit
+RATE_LIMIT_RESERVE = float(os.environ.get("RATE_LIMIT_RESERVE", "0.2"))  # für interaktive Aufrufe freigehalten
+RATE_LIMIT_CONCURRENCY = float(os.environ.get("RATE_LIMIT_CONCURRENCY", "8"))       # Startfenster
+RATE_LIMIT_MAX_CONCURRENCY = int(os.environ.get("RATE_LIMIT_MAX_CONCURRENCY", "64"))
+RATE_LIMIT_MAX_BACKOFF = float(os.environ.get("RATE_LIMIT_MAX_BACKOFF", "60"))  # Sekunden
+
+INTERACTIVE, NORMAL, BULK = "interactive", "normal", "bulk"
+PRIORITIES = (INTERACTIVE, NORMAL, BULK)
+
+# Wartezeit, wenn nur das Fenster oder eine höhere Klasse blockiert
+POLL_SECONDS = 0.01
+
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value):
+    """OpenAI-Reset-Angaben wie ``1s``, ``6m0s`` oder ``20ms`` in Sekunden; unlesbar = None"""
+    if not value:
+        return None
+    parts = _DURATION.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(n) * _UNITS[unit] for n, unit in parts)
+
+
+def retry_after(headers):
+    """Wartezeit aus ``retry-after-ms`` oder ``retry-after`` (nur Sekunden, kein HTTP-Datum)"""
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        try:
+            return float(headers.get(name)) * scale
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+class TokenBucket:
+    """Füllt sich kontinuierlich mit ``per_minute``/60 pro Sekunde bis zur Kapazität ``per_minute``"""
+
+    def __init__(self, per_minute=0.0):
+        self.per_minute = per_minute
+        self.level = per_minute
+        self._updated = time.monotonic()
+
+    @property
+    def unlimited(self):
+        return self.per_minute <= 0
+
+    def _refill(self, now):
+        if not self.unlimited:
+            self.level = min(self.per_minute, self.level + (now - self._updated) * self.per_minute / 60.0)
+        self._updated = now
+
+    def wait_time(self, amount, reserve=0.0, now=None):
+        """Sekunden, bis ``amount`` entnommen werden kann, ohne unter ``reserve`` × Kapazität zu fallen"""
+        if self.unlimited:
+            return 0.0
+        self._refill(now or time.monotonic())
+        # größer als der Bucket: bei vollem Bucket trotzdem zulassen, sonst wartet der Aufruf ewig
+        amount = min(amount, self.per_minute * (1.0 - reserve))
+        missing = amount + reserve * self.per_minute - self.level
+        return max(0.0, missing * 60.0 / self.per_minute)
+
+    def take(self, amount):
+        if not self.unlimited:
+            self.level -= min(amount, self.per_minute)
+
+    def refund(self, amount):
+        if not self.unlimited:
+            self.level = min(self.per_minute, self.level + amount)
+
+    def sync(self, limit=None, remaining=None, now=None):
+        """Übernimmt Limit und Restbestand aus den Response-Headern"""
+        self._refill(now or time.monotonic())
+        if limit:
+            if self.unlimited:
+                # erstes Limit aus den Headern: mit dem gemeldeten Rest starten, nicht leer
+                self.level = limit if remaining is None else remaining
+            self.per_minute = limit
+            self.level = min(self.level, limit)
+        if remaining is not None and not self.unlimited:
+            self.level = min(self.level, remaining)
+
+
+class Ticket:
+    def __init__(self, limiter, tokens):
+        self.limiter = limiter
+        self.tokens = tokens
+
+    def settle(self, actual):
+        """Schätzung durch den tatsächlichen Verbrauch (``usage.total_tokens``) ersetzen"""
+        if actual is None:
+            return
+        with self.limiter._lock:
+            diff = self.tokens - actual
+            if diff > 0:
+                self.limiter.tokens.refund(diff)
+            else:
+                self.limiter.tokens.take(-diff)
+            self.tokens = actual
+
+
+class RateLimiter:
+    def __init__(self, rpm=OPENAI_RPM, tpm=OPENAI_TPM, share=RATE_LIMIT_SHARE, reserve=RATE_LIMIT_RESERVE,
+                 concurrency=RATE_LIMIT_CONCURRENCY, max_concurrency=RATE_LIMIT_MAX_CONCURRENCY,
+                 max_backoff=RATE_LIMIT_MAX_BACKOFF):
+        self.share = share
+        self.reserve = reserve
+        self.requests = TokenBucket(rpm * share)
+        self.tokens = TokenBucket(tpm * share)
+        self.window = float(concurrency)
+        self.max_concurrency = max_concurrency
+        self.max_backoff = max_backoff
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.rate_limited = 0
+        self._streak = 0
+        self._last_decrease = 0.0
+        self._waiting = {p: 0 for p in PRIORITIES}
+        self._lock = threading.Lock()
+
+    # --- Zulassung ---------------------------------------------------------
+
+    def _allowed(self, priority):
+        window = max(1, int(self.window))
+        if priority == BULK:
+            return max(1, int(window * (1.0 - self.reserve)))
+        return window
+
+    def _try_acquire(self, priority, tokens):
+        """0 = zugelassen, sonst Sekunden bis zum nächsten Versuch"""
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        rank = PRIORITIES.index(priority)
+        if any(self._waiting[p] for p in PRIORITIES[:rank]) or self.in_flight >= self._allowed(priority):
+            return POLL_SECONDS
+        reserve = self.reserve if priority == BULK else 0.0
+        wait = max(self.requests.wait_time(1, reserve, now), self.tokens.wait_time(tokens, reserve, now))
+        if wait > 0:
+            return wait
+        self.requests.take(1)
+        self.tokens.take(tokens)
+        self.in_flight += 1
+        return 0.0
+
+    def _wait_step(self, priority, tokens, waiting):
+        with self._lock:
+            wait = self._try_acquire(priority, tokens)
+            if wait and not waiting:
+                self._waiting[priority] += 1
+            elif not wait and waiting:
+                self._waiting[priority] -= 1
+        # kurz halten, damit eine frei werdende Lücke nicht verschlafen wird
+        return min(wait, 1.0)
+
+    def _release(self, ok):
+        with self._lock:
+            self.in_flight -= 1
+            if ok:
+                self._streak = 0
+                # additive increase: etwa +1 pro vollem Fenster erfolgreicher Aufrufe
+                self.window = min(self.max_concurrency, self.window + 1.0 / max(self.window, 1.0))
+
+    def _cancel_wait(self, priority, waiting):
+        if waiting:
+            with self._lock:
+                self._waiting[priority] -= 1
+
+    @contextmanager
+    def slot(self, tokens=0, priority=NORMAL):
+        """Blockierend: wartet auf Fenster und Budget, gibt ein ``Ticket`` für ``settle`` zurück"""
+        start, waiting = time.monotonic(), False
+        try:
+            while True:
+                wait = self._wait_step(priority, tokens, waiting)
+                if not wait:
+                    break
+                waiting = True
+                time.sleep(wait)
+        except BaseException:
+            self._cancel_wait(priority, waiting)
+            raise
+        STAGE_SECONDS.observe(time.monotonic() - start, stage=f"ratelimit_wait_{priority}")
+        ok = False
+        try:
+            yield Ticket(self, tokens)
+            ok = True
+        finally:
+            self._release(ok)
+
+    @asynccontextmanager
+    async def aslot(self, tokens=0, priority=NORMAL):
+        """Wie ``slot``, wartet aber mit ``asyncio.sleep``"""
+        start, waiting = time.monotonic(), False
+        try:
+            while True:
+                wait = self._wait_step(priority, tokens, waiting)
+                if not wait:
+                    break
+                waiting = True
+                await asyncio.sleep(wait)
+        except BaseException:
+            self._cancel_wait(priority, waiting)
+            raise
+        STAGE_SECONDS.observe(time.monotonic() - start, stage=f"ratelimit_wait_{priority}")
+        ok = False
+        try:
+            yield Ticket(self, tokens)
+            ok = True
+        finally:
+            self._release(ok)
+
+    # --- Rückmeldung aus den Antworten -------------------------------------
+
+    def observe(self, status_code, headers):
+        """Header jeder OpenAI-Antwort auswerten; bei 429 Fenster halbieren und sperren"""
+        now = time.monotonic()
+        with self._lock:
+            for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+                limit = _number(headers.get(f"x-ratelimit-limit-{kind}"))
+                remaining = _number(headers.get(f"x-ratelimit-remaining-{kind}"))
+                bucket.sync(limit * self.share if limit else None, remaining, now)
+                if remaining == 0:
+                    reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                    if reset:
+                        self.blocked_until = max(self.blocked_until, now + reset)
+            if status_code != 429:
+                return
+            self.rate_limited += 1
+            self._streak += 1
+            # mehrere 429 aus demselben Fenster zählen als ein Signal
+            if now - self._last_decrease >= 1.0:
+                self.window = max(1.0, self.window / 2)
+                self._last_decrease = now
+            backoff = retry_after(headers)
+            if backoff is None:
+                backoff = random.uniform(0.5, 1.0) * min(self.max_backoff, 0.5 * 2 ** self._streak)
+            self.blocked_until = max(self.blocked_until, now + backoff)
+        OPENAI_RATE_LIMITED.inc()
+
+    def state(self):
+        with self._lock:
+            return {"window": round(self.window, 2), "in_flight": self.in_flight,
+                    "rpm": self.requests.per_minute, "tpm": self.tokens.per_minute,
+                    "blocked_s": round(max(0.0, self.blocked_until - time.monotonic()), 2),
+                    "waiting": dict(self._waiting), "rate_limited": self.rate_limited}
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def is_rate_limit_error(exc):
+    return getattr(exc, "status_code", None) == 429
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter():
+    """Prozessweiter Scheduler – alle OpenAI-Aufrufe eines Pods teilen sich Budget und Fenster"""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter()
+        return _limiter
@@ -0,0 +1,85 @@
+"""Aufwärmen beim Start und Readiness-Zustand für /readyz.
+
+Jeder Dienst meldet benannte Schritte (Qdrant, OpenAI, Caches). Bereit ist der
+Pod erst, wenn alle Pflicht-Schritte einmal geklappt haben; fehlgeschlagene
+Schritte werden im Hintergrund wiederholt, ohne den Prozess zu blockieren.
+"""
+import asyncio
+import inspect
+import logging
+import threading
+import time
+
+logger = logging.getLogger("educhat.readiness")
+
+
+class Readiness:
+    def __init__(self, required=()):
+        self.required = tuple(required)
+        self.started = time.time()
+        self._checks = {}
+        self._lock = threading.Lock()
+
+    def mark(self, name, ok=True, detail=None):
+        with self._lock:
+            self._checks[name] = {"ok": ok, "detail": detail, "at": round(time.time() - self.started, 3)}
+
+    def ok(self, name):
+        return self._checks.get(name, {}).get("ok", False)
+
+    @property
+    def ready(self):
+        return all(self.ok(name) for name in self.required)
+
+    def report(self):
+        with self._lock:
+            return {"ready": self.ready, "uptime_s": round(time.time() - self.started, 1),
+                    "checks": {name: dict(check) for name, check in self._checks.items()}}
+
+
+def warm_up(readiness, steps, retry_seconds=5.0, stop=None):
+    """Führt ``steps`` (Liste von ``(name, fn)``) aus, bis jeder einmal erfolgreich war.
+
+    ``fn`` darf ein Detail (z. B. Anzahl geladener Einträge) zurückgeben. Blockiert –
+    Dienste starten das in einem Thread bzw. per ``asyncio.to_thread``.
+    """
+    stop = stop or threading.Event()
+    pending = list(steps)
+    while pending and not stop.is_set():
+        for name, fn in list(pending):
+            try:
+                readiness.mark(name, True, fn())
+                pending.remove((name, fn))
+            except Exception as e:
+                readiness.mark(name, False, f"{type(e).__name__}: {e}")
+                logger.warning(f"Aufwärmen '{name}' fehlgeschlagen, neuer Versuch folgt: {e}")
+        if pending:
+            stop.wait(retry_seconds)
+    return not pending
+
+
+def start_warm_up(readiness, steps, retry_seconds=5.0):
+    """``warm_up`` in einem Daemon-Thread; liefert das Stop-Event"""
+    stop = threading.Event()
+    threading.Thread(target=warm_up, args=(readiness, steps, retry_seconds, stop), daemon=True,
+                     name="educhat-warm-up").start()
+    return stop
+
+
+async def awarm_up(readiness, steps, retry_seconds=5.0):
+    """Async-Variante von ``warm_up``: Coroutine-Funktionen werden erwartet, alles andere läuft im Threadpool.
+
+    Als Task starten und beim Herunterfahren abbrechen.
+    """
+    pending = list(steps)
+    while pending:
+        for name, fn in list(pending):
+            try:
+                detail = await fn() if inspect.iscoroutinefunction(fn) else await asyncio.to_thread(fn)
+                readiness.mark(name, True, detail)
+                pending.remove((name, fn))
+            except Exception as e:
+                readiness.mark(name, False, f"{type(e).__name__}: {e}")
+                logger.warning(f"Aufwärmen '{name}' fehlgeschlagen, neuer Versuch folgt: {e}")
+        if pending:
+            await asyncio.sleep(retry_seconds)
@@ -0,0 +1,17 @@
+"""Single-Flight: gleichzeitige identische Anfragen teilen sich einen Aufruf."""
+import asyncio
+
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight = {}
+
+    async def do(self, key, fn):
+        """Führt ``fn()`` aus, oder wartet auf den bereits laufenden Aufruf mit gleichem ``key``"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: bricht ein Aufrufer ab, laufen die anderen weiter
+        return await asyncio.shield(task)
@@ -0,0 +1,25 @@
+"""Lokale Token-Zählung – tiktoken, falls installiert, sonst eine konservative Schätzung."""
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:  # optional
+    tiktoken = None
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str, model: str = "text-embedding-3-small") -> int:
+    enc = _encoding(model)
+    if enc is None:
+        # deutscher Text liegt bei ~3–4 Zeichen pro Token, wir schätzen eher zu hoch
+        return (len(text) + 2) // 3
+    return len(enc.encode(text, disallowed_special=()))
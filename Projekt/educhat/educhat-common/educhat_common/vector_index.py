@@ -0,0 +1,276 @@
+"""In-Process-Vektorindex auf NumPy: normalisierte float32-Matrix, Top-k per Matmul + argpartition.
+
+Dient als heiße Stufe vor Qdrant und als eigenständiges Backend für Tests und Offline-Betrieb.
+Snapshot-Format (Verzeichnis), zugleich Export-/Importformat für Collections:
+
+- ``vectors.npy``       – (n, dim) float32 oder float16, zeilenweise L2-normalisiert, per mmap ladbar
+- ``payloads.jsonl``    – pro Zeile ``{"id": ..., "payload": {...}}`` in Matrix-Reihenfolge, oder
+  ``payloads.msgpack``  – dieselben Einträge als msgpack, je mit 4-Byte-Länge (little endian) davor
+- ``manifest.json``     – collection, model, dim, count, version, dtype, payloads
+"""
+import io
+import json
+import os
+import struct
+
+import numpy as np
+
+SNAPSHOT_FORMAT = 1
+DTYPES = {"float32": "<f4", "float16": "<f2"}
+PAYLOAD_FILES = {"jsonl": "payloads.jsonl", "msgpack": "payloads.msgpack"}
+
+
+def _msgpack():
+    try:
+        import msgpack
+    except ImportError:
+        raise RuntimeError("Für payloads.msgpack bitte 'msgpack' installieren (oder JSONL verwenden)")
+    return msgpack
+
+
+def read_manifest(directory):
+    with open(os.path.join(directory, "manifest.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def iter_payload_rows(directory, manifest=None):
+    """``{"id", "payload"}`` je Punkt in Matrix-Reihenfolge, gestreamt aus JSONL oder msgpack"""
+    fmt = (manifest or read_manifest(directory)).get("payloads", "jsonl")
+    path = os.path.join(directory, PAYLOAD_FILES[fmt])
+    if fmt == "jsonl":
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+        return
+    msgpack = _msgpack()
+    with open(path, "rb") as f:
+        while True:
+            head = f.read(4)
+            if not head:
+                return
+            yield msgpack.unpackb(f.read(struct.unpack("<I", head)[0]), raw=False)
+
+
+def scroll_pages(session, qdrant_url, collection, batch_size=256, with_vector=True):
+    """Die ganze Collection seitenweise per Scroll-API, je Seite eine Liste von Punkten"""
+    offset = None
+    while True:
+        body = {"limit": batch_size, "with_payload": True, "with_vector": with_vector}
+        if offset is not None:
+            body["offset"] = offset
+        r = session.post(f"{qdrant_url}/collections/{collection}/points/scroll", data=json.dumps(body))
+        r.raise_for_status()
+        result = r.json().get("result", {})
+        yield result.get("points", [])
+        offset = result.get("next_page_offset")
+        if offset is None:
+            return
+
+
+def shorten(matrix, dim):
+    """Ersten ``dim`` Komponenten, neu normalisiert – bei text-embedding-3 dasselbe wie ``dimensions=dim``"""
+    return _normalize(np.asarray(matrix, dtype=np.float32)[:, :dim])
+
+
+def _npy_header(dtype, shape):
+    buf = io.BytesIO()
+    np.lib.format.write_array_header_1_0(buf, {"descr": dtype, "fortran_order": False, "shape": shape})
+    return buf.getvalue()
+
+
+def export_snapshot(session, qdrant_url, collection, directory, dtype="float32", payloads="jsonl",
+                    batch_size=1024, **manifest):
+    """Schreibt die Collection gestreamt als Snapshot: pro Scroll-Seite ein Block, nie alles im Speicher.
+
+    Der npy-Header wird mit Platzhalter-Größe vorab geschrieben und am Ende überschrieben.
+    Gibt die Anzahl exportierter Punkte zurück.
+    """
+    if dtype not in DTYPES or payloads not in PAYLOAD_FILES:
+        raise ValueError(f"dtype {dtype!r} oder payloads {payloads!r} nicht unterstützt")
+    packb = _msgpack().packb if payloads == "msgpack" else None
+    os.makedirs(directory, exist_ok=True)
+    dim, count, header_len = manifest.get("dim"), 0, None
+    with open(os.path.join(directory, "vectors.npy"), "wb") as vf, \
+            open(os.path.join(directory, PAYLOAD_FILES[payloads]), "wb") as pf:
+        for page in scroll_pages(session, qdrant_url, collection, batch_size):
+            points = [p for p in page if p.get("vector") is not None]
+            if points:
+                block = _normalize(np.asarray([p["vector"] for p in points], dtype=np.float32))
+                if header_len is None:
+                    dim = block.shape[1]
+                    # Platzhalter mit großer Zeilenzahl: der endgültige Header ist nie länger
+                    header_len = len(_npy_header(DTYPES[dtype], (10 ** 15, dim)))
+                    vf.write(b"\0" * header_len)
+                vf.write(block.astype(DTYPES[dtype]).tobytes())
+                for p in points:
+                    row = {"id": p["id"], "payload": p.get("payload") or {}}
+                    if packb is None:
+                        pf.write((json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8"))
+                    else:
+                        data = packb(row, use_bin_type=True)
+                        pf.write(struct.pack("<I", len(data)) + data)
+                count += len(points)
+        header = _npy_header(DTYPES[dtype], (count, dim or 0))
+        if header_len is None:
+            vf.write(header)
+        else:
+            # gleiche Länge dank Padding auf 64 Byte; sonst wäre die Datei unlesbar
+            if len(header) != header_len:
+                raise RuntimeError("npy-Header passt nicht in den reservierten Platz")
+            vf.seek(0)
+            vf.write(header)
+    manifest = dict(manifest, collection=collection, format=SNAPSHOT_FORMAT, count=count, dim=dim or 0,
+                    dtype=dtype, normalized=True, payloads=payloads)
+    with open(os.path.join(directory, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return count
+
+
+def iter_snapshot(directory, batch_size=512):
+    """Blöcke ``(ids, vectors float32, payloads)`` eines Snapshots – Vektoren per mmap, Payloads gestreamt"""
+    manifest = read_manifest(directory)
+    matrix = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+    ids, payloads, start = [], [], 0
+    for row in iter_payload_rows(directory, manifest):
+        ids.append(row["id"])
+        payloads.append(row.get("payload") or {})
+        if len(ids) >= batch_size:
+            yield ids, np.asarray(matrix[start:start + len(ids)], dtype=np.float32), payloads
+            start += len(ids)
+            ids, payloads = [], []
+    if ids:
+        yield ids, np.asarray(matrix[start:start + len(ids)], dtype=np.float32), payloads
+
+
+def _normalize(matrix):
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class VectorIndex:
+    def __init__(self, ids, matrix, payloads, manifest=None, normalized=False):
+        self.ids = list(ids)
+        self.matrix = matrix if normalized else _normalize(matrix)
+        self.payloads = list(payloads)
+        self.manifest = dict(manifest or {})
+        self.manifest.setdefault("dim", int(self.matrix.shape[1]) if self.matrix.ndim == 2 else 0)
+        self._field_index = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def dim(self):
+        return self.manifest["dim"]
+
+    @property
+    def version(self):
+        return self.manifest.get("version")
+
+    # --- Laden / Speichern -------------------------------------------------
+
+    @classmethod
+    def from_points(cls, points, **manifest):
+        points = [p for p in points if p.get("vector") is not None]
+        if not points:
+            return cls([], np.zeros((0, manifest.get("dim", 0)), dtype=np.float32), [], manifest, normalized=True)
+        matrix = np.asarray([p["vector"] for p in points], dtype=np.float32)
+        return cls([p["id"] for p in points], matrix, [p.get("payload") or {} for p in points], manifest)
+
+    @classmethod
+    def load_points_json(cls, path):
+        """Lädt Dateien im Format von points.json: ``{"points": [{"id", "vector", "payload"}]}``"""
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls.from_points(data.get("points", data) if isinstance(data, dict) else data)
+
+    @classmethod
+    def load_snapshot(cls, directory, mmap=True):
+        manifest = read_manifest(directory)
+        matrix = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r" if mmap else None)
+        ids, payloads = [], []
+        for row in iter_payload_rows(directory, manifest):
+            ids.append(row["id"])
+            payloads.append(row.get("payload") or {})
+        normalized = manifest.get("normalized", False) and matrix.dtype == np.float32
+        return cls(ids, matrix, payloads, manifest, normalized=normalized)
+
+    @classmethod
+    def load(cls, path):
+        """Snapshot-Verzeichnis oder points.json-Datei"""
+        if os.path.isdir(path):
+            return cls.load_snapshot(path)
+        return cls.load_points_json(path)
+
+    @classmethod
+    def from_qdrant(cls, session, qdrant_url, collection, batch_size=256, **manifest):
+        """Liest die ganze Collection per Scroll-API ein"""
+        points = [p for page in scroll_pages(session, qdrant_url, collection, batch_size) for p in page]
+        manifest.setdefault("collection", collection)
+        return cls.from_points(points, **manifest)
+
+    def save_snapshot(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "vectors.npy"), np.ascontiguousarray(self.matrix, dtype=np.float32))
+        with open(os.path.join(directory, "payloads.jsonl"), "w", encoding="utf-8") as f:
+            for pid, payload in zip(self.ids, self.payloads):
+                f.write(json.dumps({"id": pid, "payload": payload}, ensure_ascii=False) + "\n")
+        manifest = dict(self.manifest, format=SNAPSHOT_FORMAT, count=len(self), dim=self.dim,
+                        dtype="float32", normalized=True)
+        with open(os.path.join(directory, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    # --- Suche -------------------------------------------------------------
+
+    def _rows_for(self, field, value):
+        """Zeilen, deren Payload-Feld ``value`` enthält bzw. gleich ``value`` ist"""
+        index = self._field_index.get(field)
+        if index is None:
+            index = {}
+            for row, payload in enumerate(self.payloads):
+                values = payload.get(field)
+                for v in values if isinstance(values, list) else [values]:
+                    if v is not None:
+                        index.setdefault(v, []).append(row)
+            index = {k: np.asarray(v, dtype=np.int64) for k, v in index.items()}
+            self._field_index[field] = index
+        return index.get(value, np.empty(0, dtype=np.int64))
+
+    def _mask(self, where):
+        """Bool-Maske für Keyword-Filter: alle Felder müssen passen, Listen bedeuten 'eins davon'"""
+        if not where:
+            return None
+        mask = np.ones(len(self), dtype=bool)
+        for field, wanted in where.items():
+            field_mask = np.zeros(len(self), dtype=bool)
+            for value in wanted if isinstance(wanted, (list, tuple, set)) else [wanted]:
+                field_mask[self._rows_for(field, value)] = True
+            mask &= field_mask
+        return mask
+
+    def _hits(self, scores, limit, min_score):
+        k = min(limit, scores.shape[0])
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [{"id": self.ids[i], "score": float(scores[i]), "payload": self.payloads[i]}
+                for i in top if scores[i] > -np.inf and (min_score is None or scores[i] >= min_score)]
+
+    def search_batch(self, vectors, limit=5, where=None, min_score=None):
+        """Top-k Kosinus-Treffer für mehrere Anfragen in einem Matmul"""
+        queries = _normalize(np.atleast_2d(np.asarray(vectors, dtype=np.float32)))
+        if len(self) == 0:
+            return [[] for _ in range(queries.shape[0])]
+        if queries.shape[1] != self.dim:
+            raise ValueError(f"Vektordimension {queries.shape[1]} passt nicht zum Index ({self.dim})")
+        scores = queries @ self.matrix.T
+        mask = self._mask(where)
+        if mask is not None:
+            scores[:, ~mask] = -np.inf
+        return [self._hits(row, limit, min_score) for row in scores]
+
+    def search(self, vector, limit=5, where=None, min_score=None):
+        return self.search_batch([vector], limit, where, min_score)[0]
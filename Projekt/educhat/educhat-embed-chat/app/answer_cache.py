@@ -0,0 +1,67 @@
+"""Semantischer Cache für fertige Antworten, gebunden an Treffer-IDs und Collection-Version."""
+import math
+import threading
+import time
+from collections import OrderedDict
+
+
+def _unit(vector):
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+class AnswerCache:
+    """Antworten werden pro Kombination aus Treffer-IDs abgelegt.
+
+    Innerhalb dieses Buckets gilt eine Frage als Treffer, wenn ihr Embedding
+    mindestens ``threshold`` Kosinus-Ähnlichkeit zu einer gespeicherten Frage hat.
+    Einträge laufen nach ``ttl`` Sekunden ab; über ``max_entries`` hinaus wird der
+    am längsten unbenutzte Bucket verdrängt. Ändert sich die Version, wird alles verworfen.
+    """
+
+    def __init__(self, threshold=0.95, ttl=3600, max_entries=1000):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.version = None
+        self._buckets = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def _check_version(self, version):
+        if version != self.version:
+            self._buckets.clear()
+            self._size = 0
+            self.version = version
+
+    def lookup(self, vector, hit_ids, version):
+        key = tuple(hit_ids)
+        now = time.time()
+        with self._lock:
+            self._check_version(version)
+            bucket = self._buckets.get(key)
+            if not bucket:
+                return None
+            fresh = [e for e in bucket if now - e[2] < self.ttl]
+            self._size -= len(bucket) - len(fresh)
+            self._buckets[key] = fresh
+            unit = _unit(vector)
+            best, best_score = None, self.threshold
+            for stored, answer, _ in fresh:
+                score = sum(a * b for a, b in zip(unit, stored))
+                if score >= best_score:
+                    best, best_score = answer, score
+            if best is not None:
+                self._buckets.move_to_end(key)
+            return best
+
+    def store(self, vector, hit_ids, version, answer):
+        key = tuple(hit_ids)
+        with self._lock:
+            self._check_version(version)
+            self._buckets.setdefault(key, []).append((_unit(vector), answer, time.time()))
+            self._buckets.move_to_end(key)
+            self._size += 1
+            while self._size > self.max_entries and self._buckets:
+                _, evicted = self._buckets.popitem(last=False)
+                self._size -= len(evicted)
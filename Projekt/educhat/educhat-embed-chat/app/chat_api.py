@@ -0,0 +1,147 @@
+import json
+import os
+import threading
+import uuid
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+
+import educhat_agent as agent
+from educhat_common import metrics
+from educhat_common.ratelimit import get_limiter
+from educhat_common.readiness import Readiness, start_warm_up
+
+WARM_UP = os.environ.get("WARM_UP", "1").lower() in {"1", "true", "yes"}  # aus = sofort bereit
+WARM_UP_RETRY_SECONDS = float(os.environ.get("WARM_UP_RETRY_SECONDS", "5"))
+
+BLOCKED_ANSWER = "Sicherheitshinweis: Diese Anfrage kann nicht bearbeitet werden."
+# der Embedding-Cache beschleunigt nur, ohne ihn geht es auch
+READINESS = Readiness(required=("qdrant", "openai", "indexes") if WARM_UP else ())
+
+
+def _prune_sessions(stop):
+    # verdrängt abgelaufene Sessions auch ohne neue Anfragen und räumt den Spill-Ordner
+    while not stop.wait(max(agent.SESSION_TTL / 4, 30)):
+        agent.SESSIONS.prune()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    stop = threading.Event()
+    threading.Thread(target=_prune_sessions, args=(stop,), daemon=True).start()
+    # Aufwärmen im Hintergrund: /healthz antwortet sofort, /readyz erst nach den Abhängigkeiten
+    warm_stop = start_warm_up(READINESS, agent.warm_up_steps(), WARM_UP_RETRY_SECONDS) if WARM_UP else None
+    yield
+    stop.set()
+    if warm_stop is not None:
+        warm_stop.set()
+
+
+app = FastAPI(title="educhat-chat", version="1.0", lifespan=lifespan)
+
+
+class ChatRequest(BaseModel):
+    question: str
+    session_id: Optional[str] = None
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _session(session_id):
+    return agent.SESSIONS.get(session_id or uuid.uuid4().hex)
+
+
+def _answer_events(question, session):
+    """Server-Sent-Events für eine Frage – läuft als Sync-Generator im Threadpool"""
+    yield _sse("session", {"session_id": session.id})
+    if any(w in question.lower() for w in agent.BLOCK_WORDS):
+        yield _sse("done", {"answer": BLOCKED_ANSWER, "retracted": False})
+        return
+    try:
+        follow_up = session.is_follow_up(question)
+        vec, hits = agent.retrieve(agent.get_openai_client(agent.OPENAI_API_KEY), question, session)
+        for event in agent.stream_answer_improved(hits, question, vector=vec, history=session.render(),
+                                                  follow_up=follow_up):
+            if event["type"] == "token":
+                yield _sse("token", {"text": event["text"]})
+                continue
+            if event["retracted"]:
+                # Client verwirft den bisher angezeigten Text
+                yield _sse("retract", {"reason": "Antwort nicht ausreichend durch Quellen gedeckt"})
+            session.add_turn(question, event["answer"])
+            yield _sse("done", {"answer": event["answer"], "retracted": event["retracted"]})
+    except Exception as e:
+        yield _sse("error", {"detail": str(e)})
+
+
+@app.get("/health")
+def health():
+    return {"status": "ok", "sessions": len(agent.SESSIONS), "openai": get_limiter().state()}
+
+
+@app.get("/healthz")
+def healthz():
+    """Liveness: der Prozess bedient Anfragen – Abhängigkeiten spielen hier keine Rolle"""
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+def readyz():
+    """Readiness: 503, bis Qdrant, OpenAI-Verbindung und Indizes warm sind"""
+    report = READINESS.report()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.post("/sessions")
+def create_session():
+    return {"session_id": _session(None).id}
+
+
+@app.get("/sessions/{session_id}")
+def get_session_history(session_id: str):
+    session = agent.SESSIONS.get(session_id, create=False)
+    if session is None:
+        raise HTTPException(404, "Session unbekannt oder abgelaufen")
+    return {"session_id": session.id, "summary": session.summary,
+            "turns": [{"question": q, "answer": a} for q, a, _ in session.turns]}
+
+
+@app.delete("/sessions/{session_id}")
+def delete_session(session_id: str):
+    agent.SESSIONS.delete(session_id)
+    return {"status": "ok"}
+
+
+@app.post("/chat")
+def chat(req: ChatRequest):
+    """Wie /chat/stream, aber eine Antwort am Stück"""
+    if not agent.OPENAI_API_KEY:
+        raise HTTPException(500, "OPENAI_API_KEY fehlt")
+    question, session = req.question.strip(), _session(req.session_id)
+    if any(w in question.lower() for w in agent.BLOCK_WORDS):
+        return {"session_id": session.id, "answer": BLOCKED_ANSWER}
+    follow_up = session.is_follow_up(question)
+    vec, hits = agent.retrieve(agent.get_openai_client(agent.OPENAI_API_KEY), question, session)
+    answer = agent.answer_from_hits_improved(hits, question, vector=vec, history=session.render(),
+                                             follow_up=follow_up)
+    session.add_turn(question, answer)
+    return {"session_id": session.id, "answer": answer}
+
+
+@app.post("/chat/stream")
+def chat_stream(req: ChatRequest):
+    if not agent.OPENAI_API_KEY:
+        raise HTTPException(500, "OPENAI_API_KEY fehlt")
+    return StreamingResponse(_answer_events(req.question.strip(), _session(req.session_id)),
+                             media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
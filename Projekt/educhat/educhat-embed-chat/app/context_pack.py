@@ -0,0 +1,141 @@
+"""Kontext für den Prompt: Duplikate zusammenfassen, Nachbar-Chunks verbinden, in ein Token-Budget packen."""
+import hashlib
+import re
+
+from educhat_common.embed_cache import normalize_text
+from educhat_common.tokens import count_tokens
+
+_WORD = re.compile(r"\w+")
+
+
+def _content(hit):
+    return ((hit.get("payload") or {}).get("content") or "").strip()
+
+
+def _identity(hit):
+    """Schlüssel, unter denen zwei Treffer als derselbe Inhalt gelten"""
+    p = hit.get("payload") or {}
+    keys = [("text", hashlib.sha1(normalize_text(_content(hit)).lower().encode("utf-8")).hexdigest())]
+    if p.get("doc_id") is not None and p.get("chunk_id") is not None:
+        keys.append(("chunk", p["doc_id"], p["chunk_id"]))
+    if p.get("url"):
+        keys.append(("url", p["url"]))
+    return keys
+
+
+def term_vectors(texts, dim=1024):
+    """Gehashte Wortzähl-Vektoren (L2-normiert) – genügt, um fast gleiche Texte zu erkennen"""
+    import numpy as np  # erst beim ersten Duplikatvergleich, nicht beim Start
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        words = _WORD.findall(normalize_text(text).lower())
+        if words:
+            cols = [int.from_bytes(hashlib.blake2b(w.encode("utf-8"), digest_size=4).digest(), "little") % dim
+                    for w in words]
+            np.add.at(matrix[row], cols, 1.0)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    return matrix
+
+
+def collapse_duplicates(hits, similarity=0.9):
+    """Behält pro Duplikatgruppe den Treffer mit dem höchsten Score.
+
+    Duplikat heißt: gleiches doc_id+chunk_id, gleiche URL, gleicher normalisierter Text oder
+    Kosinus-Ähnlichkeit der Wortvektoren ab ``similarity`` (eine Matrixmultiplikation für alle).
+    """
+    ordered = sorted(hits, key=lambda h: h.get("score", 0.0), reverse=True)
+    seen, unique = set(), []
+    for hit in ordered:
+        keys = _identity(hit)
+        if any(k in seen for k in keys):
+            continue
+        seen.update(keys)
+        unique.append(hit)
+    if similarity >= 1 or len(unique) < 2:
+        return unique
+
+    matrix = term_vectors([_content(h) for h in unique])
+    sims = matrix @ matrix.T
+    # nur gegen bessere (weiter oben stehende), selbst behaltene Treffer vergleichen
+    keep = [0]
+    for row in range(1, len(unique)):
+        if sims[row, keep].max() < similarity:
+            keep.append(row)
+    return [unique[i] for i in keep]
+
+
+def merge_adjacent(hits):
+    """Fasst aufeinanderfolgende chunk_ids eines Dokuments zu einer Passage zusammen.
+
+    Die Passage steht an der Stelle ihres besten Treffers und trägt dessen Score.
+    """
+    passages, by_doc = [], {}
+    for hit in hits:
+        p = hit.get("payload") or {}
+        passage = {"ids": [hit.get("id")], "score": hit.get("score", 0.0), "title": (p.get("title") or "").strip(),
+                   "source": p.get("source") or p.get("url") or "-", "doc_id": p.get("doc_id"),
+                   "chunks": [(p.get("chunk_id"), _content(hit))]}
+        doc_id, chunk_id = p.get("doc_id"), p.get("chunk_id")
+        if doc_id is not None and isinstance(chunk_id, int):
+            for other in by_doc.get(doc_id, []):
+                numbers = [c for c, _ in other["chunks"]]
+                if min(numbers) - 1 <= chunk_id <= max(numbers) + 1:
+                    other["chunks"].append((chunk_id, _content(hit)))
+                    other["chunks"].sort(key=lambda c: c[0])
+                    other["ids"].append(hit.get("id"))
+                    break
+            else:
+                by_doc.setdefault(doc_id, []).append(passage)
+                passages.append(passage)
+            continue
+        passages.append(passage)
+    for passage in passages:
+        passage["content"] = "\n".join(text for _, text in passage.pop("chunks") if text)
+    return passages
+
+
+def _truncate(text, tokens, model):
+    """Kürzt auf höchstens ``tokens``, möglichst an einer Satzgrenze"""
+    if count_tokens(text, model) <= tokens:
+        return text
+    cut = text[:max(0, int(len(text) * tokens / max(count_tokens(text, model), 1)))]
+    while cut and count_tokens(cut + " …", model) > tokens:
+        cut = cut[:int(len(cut) * 0.9)]
+    sentence_end = cut.rfind(". ")
+    if sentence_end > len(cut) // 2:
+        cut = cut[:sentence_end + 1]
+    return cut.rstrip() + " …" if cut else ""
+
+
+def pack_context(hits, budget_tokens=1500, max_sources=5, similarity=0.9, model="gpt-4o-mini", min_tokens=60):
+    """Wählt Passagen nach Score, bis ``budget_tokens`` erreicht ist.
+
+    Passt eine Passage nicht mehr ganz hinein, wird sie gekürzt, sofern noch
+    mindestens ``min_tokens`` frei sind; kleinere Passagen dahinter rücken nach.
+    Gibt die Passagen mit ``title``, ``content``, ``source``, ``score``, ``ids`` und ``tokens`` zurück.
+    """
+    passages = merge_adjacent(collapse_duplicates(hits, similarity))
+    packed, remaining = [], budget_tokens
+    for passage in passages:
+        if len(packed) >= max_sources or remaining < min_tokens:
+            break
+        if not passage["content"]:
+            continue
+        header = f"[Quelle {len(packed) + 1} - {passage['title']}]: "
+        overhead = count_tokens(header, model)
+        tokens = overhead + count_tokens(passage["content"], model)
+        if tokens > remaining:
+            if remaining - overhead < min_tokens:
+                continue
+            content = _truncate(passage["content"], remaining - overhead, model)
+            if not content:
+                continue
+            passage = dict(passage, content=content)
+            tokens = overhead + count_tokens(content, model)
+        packed.append(dict(passage, tokens=tokens))
+        remaining -= tokens
+    return packed
+
+
+def format_context(passages):
+    return "\n\n".join(f"[Quelle {i} - {p['title']}]: {p['content']}" for i, p in enumerate(passages, 1))
@@ -1,20 +1,68 @@
-import os, sys, json, re, time
+from __future__ import annotations
+
+import os, sys, json, re, threading, time, uuid
 from textwrap import fill
 from datetime import datetime, timezone
-from slugify import slugify
-import requests
-from openai import OpenAI
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    # openai wird erst beim ersten Client geladen – spart beim Start Importzeit
+    from openai import OpenAI
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "educhat-common"))
+from educhat_common.clients import get_openai_client, get_session
+from educhat_common.collection_schema import CollectionError, ensure_collection_cached, search_body
+from educhat_common.collection_version import bump_version, read_version
+from educhat_common.embed_cache import embed_with_cache, get_default_cache
+from educhat_common.embedding import cache_model, embedding_options
+from educhat_common.lexical_index import LexicalIndex, rrf_fuse
+from educhat_common import metrics
+from educhat_common.metrics import count_cache, count_usage, qdrant_call, timed
+from educhat_common.qdrant_transport import QdrantTransportError as QdrantError, get_transport
+from educhat_common.ratelimit import BULK, INTERACTIVE, get_limiter
+from educhat_common.tokens import count_tokens
+from answer_cache import AnswerCache
+from context_pack import format_context, pack_context
+from session_store import SessionStore
 
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY", "")
 QDRANT_URL = os.environ.get("QDRANT_URL", "http://localhost:6333")
 COLLECTION = os.environ.get("QDRANT_COLLECTION", "weiterbildung")
 EMBED_MODEL = os.environ.get("EMBED_MODEL", "text-embedding-3-small")
+EMBED_DIM = int(os.environ.get("EMBED_DIM", "1536"))  # < volle Breite: gekürzte Embeddings (text-embedding-3-*)
+CHAT_MODEL = os.environ.get("CHAT_MODEL", "gpt-4o-mini")
 TOP_K = int(os.environ.get("TOP_K", "5"))
 MIN_SCORE = float(os.environ.get("MIN_SCORE", "0.65"))
 WRAP_COLS = int(os.environ.get("WRAP_COLS", "100"))
+ANSWER_CACHE_THRESHOLD = float(os.environ.get("ANSWER_CACHE_THRESHOLD", "0.95"))  # 0 oder größer 1 = aus
+ANSWER_CACHE_TTL = float(os.environ.get("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_SIZE = int(os.environ.get("ANSWER_CACHE_SIZE", "1000"))
+VERSION_CHECK_SECONDS = float(os.environ.get("VERSION_CHECK_SECONDS", "10"))
+LOCAL_INDEX_PATH = os.environ.get("LOCAL_INDEX_PATH", "")  # Snapshot-Verzeichnis oder points.json
+LOCAL_INDEX_MODE = os.environ.get("LOCAL_INDEX_MODE", "tier")  # tier: nur bei aktueller Version, only: immer
+LEXICAL_INDEX_PATH = os.environ.get("LEXICAL_INDEX_PATH", "")  # leer = nur Vektorsuche
+LEXICAL_FAST_PATH = os.environ.get("LEXICAL_FAST_PATH", "1").lower() in {"1", "true", "yes"}
+LEXICAL_MARGIN = float(os.environ.get("LEXICAL_MARGIN", "1.5"))  # BM25-Vorsprung für den Fast Path
+LEXICAL_MIN_COVERAGE = float(os.environ.get("LEXICAL_MIN_COVERAGE", "1.0"))  # Schwelle für reine BM25-Treffer
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "1500"))  # Tokens für Quellen im Prompt
+CONTEXT_MAX_SOURCES = int(os.environ.get("CONTEXT_MAX_SOURCES", "5"))
+CONTEXT_DUP_SIMILARITY = float(os.environ.get("CONTEXT_DUP_SIMILARITY", "0.9"))  # ab hier gilt ein Treffer als Duplikat
+SESSION_MAX = int(os.environ.get("SESSION_MAX", "10000"))        # Sessions im Speicher pro Pod
+SESSION_TTL = float(os.environ.get("SESSION_TTL", "1800"))      # Sekunden ohne Zugriff bis zur Verdrängung
+SESSION_HISTORY_TOKENS = int(os.environ.get("SESSION_HISTORY_TOKENS", "800"))  # wörtlicher Verlauf
+SESSION_SUMMARY_TOKENS = int(os.environ.get("SESSION_SUMMARY_TOKENS", "300"))  # verdichtete ältere Runden
+SESSION_SPILL_DIR = os.environ.get("SESSION_SPILL_DIR", "")     # leer = verdrängte Sessions verwerfen
+STREAM_ANSWERS = os.environ.get("STREAM_ANSWERS", "1").lower() in {"1", "true", "yes"}
+SNAPSHOT_BATCH_SIZE = int(os.environ.get("SNAPSHOT_BATCH_SIZE", "1024"))  # Punkte pro Scroll bzw. Upsert
+IMPORT_CONCURRENCY = int(os.environ.get("IMPORT_CONCURRENCY", "4"))  # parallele Upserts bei Import und Migration
+INGEST_CONCURRENCY = int(os.environ.get("INGEST_CONCURRENCY", "8"))  # Themen gleichzeitig bei "ingest --file"
+INGEST_EMBED_BATCH = int(os.environ.get("INGEST_EMBED_BATCH", "256"))  # Chunks pro Embedding-Request und Upsert
+METRICS_SUMMARY = os.environ.get("METRICS_SUMMARY", "1").lower() in {"1", "true", "yes"}  # Tabelle beim Beenden
 
 BLOCK_WORDS = {"password", "admin access", "bypass", "prompt injection"}
 
+UNSAFE_ANSWER = "Ich kann diese Frage auf Basis der verfügbaren Informationen nicht sicher beantworten."
+
 EDUCHAT_SYSTEM_PROMPT = """Du bist ein präziser Bildungsassistent, der NUR auf Basis der bereitgestellten Dokumente antwortet.
 
 WICHTIGE REGELN:
@@ -30,6 +78,17 @@ Antwortformat:
 - Keine Einleitung wie "Laut den Dokumenten..." - direkt zur Sache"""
 
 
+ANSWER_CACHE = AnswerCache(ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_TTL, ANSWER_CACHE_SIZE)
+_version = {"value": None, "checked": 0.0}
+_local_index = None
+_lexical = {"index": None, "rebuild": None}
+# Neubau und Speichern des BM25-Index nur in einem Thread zugleich
+_lexical_lock = threading.Lock()
+_lexical_rebuild_lock = threading.Lock()
+SESSIONS = SessionStore(SESSION_MAX, SESSION_TTL, SESSION_HISTORY_TOKENS, SESSION_SUMMARY_TOKENS,
+                        SESSION_SPILL_DIR, CHAT_MODEL)
+
+
 def _die(msg, code=2):
     print(f"Fehler: {msg}", file=sys.stderr)
     sys.exit(code)
@@ -39,56 +98,213 @@ def _now():
     return datetime.now(timezone.utc).isoformat()
 
 
-def ensure_collection():
-    r = requests.get(f"{QDRANT_URL}/collections/{COLLECTION}", timeout=8)
-    if r.status_code == 200:
+def collection_version():
+    """Version der Collection, höchstens alle VERSION_CHECK_SECONDS von Qdrant gelesen"""
+    now = time.monotonic()
+    if _version["value"] is None or now - _version["checked"] >= VERSION_CHECK_SECONDS:
+        _version["value"] = read_version(get_session(), QDRANT_URL, COLLECTION)
+        _version["checked"] = now
+    return _version["value"]
+
+
+def local_index():
+    """Lokaler NumPy-Index aus LOCAL_INDEX_PATH, beim ersten Zugriff geladen"""
+    global _local_index
+    if _local_index is None and LOCAL_INDEX_PATH:
+        from educhat_common.vector_index import VectorIndex
+        _local_index = VectorIndex.load(LOCAL_INDEX_PATH)
+    return _local_index
+
+
+def _local_index_is_current(index):
+    if index.dim != EMBED_DIM:
+        # Snapshot aus der Zeit vor einer Dimensions-Migration
+        return False
+    if LOCAL_INDEX_MODE == "only":
+        return True
+    try:
+        return index.version is not None and index.version == collection_version()
+    except Exception:
+        # Qdrant nicht erreichbar: lieber der lokale Stand als gar keine Antwort
+        return True
+
+
+def _load_lexical():
+    if _lexical["index"] is None and os.path.exists(LEXICAL_INDEX_PATH):
+        _lexical["index"] = LexicalIndex.load(LEXICAL_INDEX_PATH)
+    return _lexical["index"]
+
+
+def _rebuild_lexical(version):
+    with _lexical_lock:
+        index = _lexical["index"]
+        # ein anderer Thread kann ihn inzwischen gebaut haben
+        if index is None or index.version != version:
+            index = LexicalIndex.from_qdrant(get_session(), QDRANT_URL, COLLECTION, version=version)
+            index.save(LEXICAL_INDEX_PATH)
+            _lexical["index"] = index
+        return index
+
+
+def _rebuild_lexical_in_background(version):
+    def run():
+        try:
+            _rebuild_lexical(version)
+        except Exception as e:
+            print(f"BM25-Index nicht neu gebaut: {e}", file=sys.stderr)
+
+    with _lexical_rebuild_lock:
+        running = _lexical["rebuild"]
+        if running is None or not running.is_alive():
+            _lexical["rebuild"] = threading.Thread(target=run, name="lexical-rebuild", daemon=True)
+            _lexical["rebuild"].start()
+
+
+def lexical_index():
+    """BM25-Index aus LEXICAL_INDEX_PATH, bei Bedarf aus den Payloads der Collection gebaut.
+
+    Fehlt er, wird er blockierend gebaut (normalerweise schon beim Aufwärmen). Ist er nur
+    veraltet, baut ein Hintergrund-Thread ihn neu, und bis dahin antwortet der alte Stand.
+    """
+    if not LEXICAL_INDEX_PATH:
+        return None
+    index = _load_lexical()
+    try:
+        version = collection_version()
+    except Exception:
+        # Qdrant nicht erreichbar: vorhandenen Stand weiterverwenden
+        return index
+    if index is None:
+        return _rebuild_lexical(version)
+    if index.version != version:
+        _rebuild_lexical_in_background(version)
+    return index
+
+
+def _drop_lexical():
+    _lexical["index"] = None
+    if os.path.exists(LEXICAL_INDEX_PATH):
+        os.remove(LEXICAL_INDEX_PATH)
+
+
+def _index_lexical(points, base_version):
+    """Neue Punkte direkt in den BM25-Index übernehmen, statt ihn beim nächsten Lesen neu zu bauen.
+
+    ``base_version`` ist die Version vor dem eigenen ``bump_version``. Nur ein Index auf genau
+    diesem Stand wird ergänzt; einem fehlenden oder veralteten fehlt mehr als diese Punkte –
+    er wird verworfen und beim nächsten ``lexical_index()`` aus der Collection neu gebaut.
+    """
+    if not LEXICAL_INDEX_PATH:
         return
-    body = {"vectors": {"size": 1536, "distance": "Cosine"}}
-    r = requests.put(f"{QDRANT_URL}/collections/{COLLECTION}",
-                     headers={"Content-Type": "application/json"},
-                     data=json.dumps(body), timeout=30)
-    if r.status_code >= 400:
-        _die(f"Collection-Create fehlgeschlagen: {r.status_code} {r.text}")
+    _version["value"] = None
+    with _lexical_lock:
+        index = _load_lexical()
+        if index is None or index.version != base_version:
+            _drop_lexical()
+            return
+        # beim erneuten Ingest gelöschte Chunks eines Dokuments auch hier entfernen
+        index.remove_where("doc_id", {p["payload"].get("doc_id") for p in points})
+        for p in points:
+            index.add(p["id"], p["payload"])
+        index.version = read_version(get_session(), QDRANT_URL, COLLECTION)
+        index.save(LEXICAL_INDEX_PATH)
+        _lexical["index"] = index
 
 
-def embed_texts(client: OpenAI, texts):
-    resp = client.embeddings.create(model=EMBED_MODEL, input=texts)
-    return [d.embedding for d in resp.data]
+def ensure_collection():
+    try:
+        ensure_collection_cached(get_session(), QDRANT_URL, COLLECTION, EMBED_DIM)
+    except CollectionError as e:
+        _die(str(e))
+
+
+def warm_up_steps():
+    """Schritte für den Start als API: erst danach meldet /readyz bereit.
+
+    Collection-Prüfung (gecacht), OpenAI-Verbindung samt Import, Embedding-Cache und
+    die lokalen Indizes – alles, was sonst die erste Anfrage ausbremst.
+    """
+    def qdrant():
+        checked = ensure_collection_cached(get_session(), QDRANT_URL, COLLECTION, EMBED_DIM)
+        return {"version": collection_version(), "checked": checked,
+                "transport": get_transport(QDRANT_URL).connect()}
+
+    def openai_pool():
+        # öffnet die TLS-Verbindung im Pool; models.list ist billig und braucht keine Tokens
+        get_openai_client(OPENAI_API_KEY).models.list()
+
+    def embed_cache():
+        return {"warm_items": get_default_cache().warm()}
+
+    def indexes():
+        index, lexical = local_index(), lexical_index()
+        return {"local": len(index) if index is not None else None,
+                "lexical": len(lexical) if lexical is not None else None}
+
+    return [("qdrant", qdrant), ("openai", openai_pool), ("embed_cache", embed_cache), ("indexes", indexes)]
+
+
+def embed_texts(client: OpenAI, texts, priority=INTERACTIVE, dim=EMBED_DIM):
+    options = embedding_options(EMBED_MODEL, dim)
+
+    def _embed(missing):
+        with get_limiter().slot(sum(count_tokens(t, EMBED_MODEL) for t in missing), priority) as ticket:
+            resp = client.embeddings.create(model=EMBED_MODEL, input=missing, **options)
+        ticket.settle(resp.usage.total_tokens)
+        count_usage(resp.usage, "embedding")
+        return [d.embedding for d in resp.data]
+
+    with timed("embed"):
+        return embed_with_cache(get_default_cache(), cache_model(EMBED_MODEL, dim), texts, _embed)
 
 
 def upsert_points(points):
-    payload = {"points": points}
-    r = requests.put(f"{QDRANT_URL}/collections/{COLLECTION}/points?wait=true",
-                     headers={"Content-Type": "application/json"},
-                     data=json.dumps(payload), timeout=120)
-    if r.status_code >= 400:
-        _die(f"Upsert fehlgeschlagen: {r.status_code} {r.text}")
+    try:
+        with qdrant_call("upsert"):
+            get_transport(QDRANT_URL).upsert(COLLECTION, points, timeout=120)
+    except QdrantError as e:
+        _die(str(e))
 
 
-def ingest_topic(client: OpenAI, topic: str, max_chunks=5):
-    # einfache Generierung kurzer Chunks über Chat Completion
+def topic_doc_id(topic):
+    from slugify import slugify
+    return f"doc-{slugify(topic) or 'topic'}"
+
+
+def chunk_point_id(doc_id, chunk_id):
+    """Deterministische Punkt-ID: erneutes Ingest überschreibt statt zu duplizieren"""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"educhat:{doc_id}:{chunk_id}"))
+
+
+def generate_chunks(client: OpenAI, topic, max_chunks=5):
+    """Kurze Textabschnitte zu ``topic`` per Chat Completion; ValueError ohne JSON-Array"""
     sysmsg = "Erzeuge prägnante Textabschnitte (2–4 Sätze) zu einem Thema, JSON-Array mit title, content, tags."
     usermsg = f"Thema: {topic}\nErzeuge {max_chunks} Chunks als JSON-Array."
-    resp = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "system", "content": sysmsg},
-                  {"role": "user", "content": usermsg}],
-        temperature=0.2,
-        max_tokens=800
-    )
+    # Ingest ist Hintergrundarbeit und lässt Chat-Anfragen im Scheduler den Vortritt
+    with get_limiter().slot(count_tokens(sysmsg + usermsg, CHAT_MODEL) + 800, BULK) as ticket:
+        resp = client.chat.completions.create(
+            model=CHAT_MODEL,
+            messages=[{"role": "system", "content": sysmsg},
+                      {"role": "user", "content": usermsg}],
+            temperature=0.2,
+            max_tokens=800
+        )
+    ticket.settle(resp.usage.total_tokens)
+    count_usage(resp.usage)
     txt = resp.choices[0].message.content.strip()
     start, end = txt.find("["), txt.rfind("]")
     if start == -1 or end == -1:
-        _die("Antwort enthielt kein JSON-Array.")
-    chunks = json.loads(txt[start:end + 1])[:max_chunks]
-    vectors = embed_texts(client, [c.get("content", "") for c in chunks])
+        raise ValueError("Antwort enthielt kein JSON-Array.")
+    return json.loads(txt[start:end + 1])[:max_chunks]
+
 
-    doc_id = f"doc-{slugify(topic) or 'topic'}"
+def topic_points(topic, chunks, vectors):
+    doc_id = topic_doc_id(topic)
     created_at = _now()
     points = []
     for i, (chunk, vec) in enumerate(zip(chunks, vectors), start=1):
         points.append({
-            "id": int(time.time() * 1000) + i,
+            "id": chunk_point_id(doc_id, i),
             "vector": vec,
             "payload": {
                 "title": chunk.get("title", f"Chunk {i}"),
@@ -100,18 +316,208 @@ def ingest_topic(client: OpenAI, topic: str, max_chunks=5):
                 "source": f"generated:{doc_id}"
             }
         })
+    return points
+
+
+def ingest_topic(client: OpenAI, topic: str, max_chunks=5):
+    try:
+        chunks = generate_chunks(client, topic, max_chunks)
+    except ValueError as e:
+        _die(str(e))
+    vectors = embed_texts(client, [c.get("content", "") for c in chunks], priority=BULK)
+    points = topic_points(topic, chunks, vectors)
+    try:
+        delete_docs([topic_doc_id(topic)])
+    except Exception as e:
+        _die(f"Alte Chunks nicht gelöscht: {e}")
     upsert_points(points)
+    base_version = read_version(get_session(), QDRANT_URL, COLLECTION)
+    bump_version(get_session(), QDRANT_URL, COLLECTION)
+    _index_lexical(points, base_version)
     print(f"Ingestion abgeschlossen. Punkte: {len(points)} in Collection '{COLLECTION}'.")
 
 
-def search(vector):
-    body = {"vector": vector, "limit": TOP_K, "with_payload": True, "with_vector": False}
-    r = requests.post(f"{QDRANT_URL}/collections/{COLLECTION}/points/search",
-                      headers={"Content-Type": "application/json"},
-                      data=json.dumps(body), timeout=60)
-    if r.status_code >= 400:
-        _die(f"Search fehlgeschlagen: {r.status_code} {r.text}")
-    return r.json().get("result", [])
+def read_topics(path):
+    """Ein Thema pro Zeile; Leerzeilen und ``#``-Kommentare zählen nicht, gleiche doc_id nur einmal"""
+    topics = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            topic = line.strip()
+            if topic and not topic.startswith("#"):
+                topics.setdefault(topic_doc_id(topic), topic)
+    return list(topics.values())
+
+
+def _doc_filter(*doc_ids):
+    return {"must": [{"key": "doc_id", "match": {"any": list(doc_ids)}}]}
+
+
+def doc_exists(doc_id):
+    body = {"filter": _doc_filter(doc_id), "exact": False}
+    with qdrant_call("count"):
+        r = get_session().post(f"{QDRANT_URL}/collections/{COLLECTION}/points/count", data=json.dumps(body),
+                               timeout=30)
+    r.raise_for_status()
+    return r.json()["result"]["count"] > 0
+
+
+def delete_docs(doc_ids):
+    """Entfernt alle Chunks der Dokumente – vor erneutem Ingest, sonst blieben überzählige alte Chunks"""
+    with qdrant_call("delete"):
+        r = get_session().post(f"{QDRANT_URL}/collections/{COLLECTION}/points/delete?wait=true",
+                               data=json.dumps({"filter": _doc_filter(*doc_ids)}), timeout=60)
+    r.raise_for_status()
+
+
+class IngestStats:
+    """Zeit und Durchsatz je Stufe, von mehreren Threads gefüllt"""
+
+    def __init__(self):
+        self.stages = {}
+        self._lock = threading.Lock()
+        self.start = time.perf_counter()
+
+    def add(self, stage, seconds, items):
+        with self._lock:
+            entry = self.stages.setdefault(stage, {"calls": 0, "items": 0, "busy_s": 0.0})
+            entry["calls"] += 1
+            entry["items"] += items
+            entry["busy_s"] += seconds
+
+    def report(self):
+        wall = time.perf_counter() - self.start
+        print(f"{'Stufe':<10}{'Aufrufe':>9}{'Einheiten':>11}{'Einh./s':>10}{'Ø Aufruf ms':>13}")
+        for stage, e in self.stages.items():
+            print(f"{stage:<10}{e['calls']:>9}{e['items']:>11}{e['items'] / wall if wall else 0:>10.1f}"
+                  f"{1000 * e['busy_s'] / e['calls']:>13.0f}")
+        return wall
+
+
+def ingest_file(path, concurrency=INGEST_CONCURRENCY, max_chunks=5, skip_existing=True):
+    """Ingest vieler Themen aus einer Datei, Generierung, Embedding und Upsert überlappend.
+
+    Bis zu ``concurrency`` Themen werden gleichzeitig geprüft und generiert; fertige Chunks
+    sammeln sich zu Blöcken von INGEST_EMBED_BATCH, die je ein Embedding-Request und ein
+    Upsert werden (IMPORT_CONCURRENCY Blöcke gleichzeitig). Themen, deren doc_id schon in
+    der Collection steht, werden übersprungen; fehlgeschlagene Themen bremsen die übrigen nicht.
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    topics = read_topics(path)
+    client = get_openai_client(OPENAI_API_KEY)
+    stats = IngestStats()
+    skipped, failed, written, ingested = [], {}, [], []
+    print(f"{len(topics)} Themen aus {path}, {concurrency} gleichzeitig.")
+
+    def prepare(topic):
+        # None = schon vorhanden
+        t = time.perf_counter()
+        exists = skip_existing and doc_exists(topic_doc_id(topic))
+        stats.add("check", time.perf_counter() - t, 1)
+        if exists:
+            return None
+        t = time.perf_counter()
+        chunks = [c for c in generate_chunks(client, topic, max_chunks) if c.get("content", "").strip()]
+        stats.add("generate", time.perf_counter() - t, len(chunks))
+        return chunks
+
+    def store(batch):
+        t = time.perf_counter()
+        vectors = embed_texts(client, [c.get("content", "") for _, chunks in batch for c in chunks], BULK)
+        stats.add("embed", time.perf_counter() - t, len(vectors))
+        points, offset = [], 0
+        for topic, chunks in batch:
+            points.extend(topic_points(topic, chunks, vectors[offset:offset + len(chunks)]))
+            offset += len(chunks)
+        t = time.perf_counter()
+        if not skip_existing:
+            # ohne Überspringen kann ein Thema schon Chunks haben, ggf. mehr als jetzt erzeugt
+            delete_docs([topic_doc_id(topic) for topic, _ in batch])
+        _upsert_into(COLLECTION, points)
+        stats.add("upsert", time.perf_counter() - t, len(points))
+        return points
+
+    with ThreadPoolExecutor(concurrency) as generate_pool, ThreadPoolExecutor(IMPORT_CONCURRENCY) as store_pool:
+        prepared = {generate_pool.submit(prepare, topic): topic for topic in topics}
+        pending, batch, size = {}, [], 0
+
+        def flush():
+            nonlocal batch, size
+            if batch:
+                pending[store_pool.submit(store, batch)] = [topic for topic, _ in batch]
+                batch, size = [], 0
+
+        for future in as_completed(prepared):
+            topic = prepared[future]
+            try:
+                chunks = future.result()
+            except Exception as e:
+                failed[topic] = e
+                continue
+            if chunks is None:
+                skipped.append(topic)
+            elif not chunks:
+                failed[topic] = ValueError("keine Chunks erzeugt")
+            else:
+                batch.append((topic, chunks))
+                size += len(chunks)
+                if size >= INGEST_EMBED_BATCH:
+                    flush()
+        flush()
+        for future in as_completed(pending):
+            try:
+                written.extend(future.result())
+                ingested.extend(pending[future])
+            except Exception as e:
+                failed.update(dict.fromkeys(pending[future], e))
+
+    if written:
+        base_version = read_version(get_session(), QDRANT_URL, COLLECTION)
+        bump_version(get_session(), QDRANT_URL, COLLECTION)
+        _index_lexical(written, base_version)
+    wall = stats.report()
+    print(f"Ingestion abgeschlossen: {len(ingested)} Themen, {len(written)} Punkte in {wall:.1f}s "
+          f"({len(ingested) / wall if wall else 0:.1f} Themen/s), {len(skipped)} schon vorhanden, "
+          f"{len(failed)} fehlgeschlagen.")
+    for topic, error in failed.items():
+        print(f"  fehlgeschlagen: {topic}: {error}", file=sys.stderr)
+    return {"ingested": ingested, "skipped": skipped, "failed": failed, "points": len(written)}
+
+
+def search(vector, where=None, fields=None):
+    """Top-k Treffer; ``where`` filtert über Payload-Felder (z. B. tags, topic, doc_id),
+    ``fields`` begrenzt die gelieferten Payload-Felder"""
+    index = local_index()
+    if index is not None and _local_index_is_current(index):
+        with timed("search_local"):
+            return index.search(vector, TOP_K, where=where)
+
+    body = search_body(vector, TOP_K, where, fields)
+    with qdrant_call("search"):
+        return get_transport(QDRANT_URL).search(COLLECTION, body, timeout=60)
+
+
+def retrieve(client: OpenAI, question, session=None):
+    """Hybride Suche: BM25 und Vektorsuche per RRF fusioniert.
+
+    Ist der lexikalische Treffer eindeutig (alle Begriffe, klarer BM25-Vorsprung), entfällt das
+    Embedding ganz; der Vektor ist dann ``None`` und der Antwort-Cache wird übersprungen.
+    Mit ``session`` werden kurze Nachfragen um die vorige Frage ergänzt.
+    """
+    if session is not None:
+        question = session.retrieval_query(question)
+    lexical = lexical_index()
+    lexical_hits = []
+    if lexical is not None:
+        with timed("search_lexical"):
+            lexical_hits, confident = lexical.search_confident(question, TOP_K, LEXICAL_MARGIN)
+        if confident and LEXICAL_FAST_PATH:
+            return None, lexical_hits
+    vec = embed_texts(client, [question])[0]
+    hits = search(vec)
+    if lexical_hits:
+        hits = rrf_fuse([hits, lexical_hits], limit=TOP_K)
+    return vec, hits
 
 
 def is_answer_hallucinating(answer, context, question):
@@ -138,6 +544,13 @@ def is_answer_hallucinating(answer, context, question):
     return False
 
 
+def is_relevant(hit):
+    """Kosinus gegen MIN_SCORE; reine BM25-Treffer (ohne ``score``) gegen LEXICAL_MIN_COVERAGE"""
+    if "score" in hit:
+        return hit["score"] >= MIN_SCORE
+    return hit.get("coverage", 0.0) >= LEXICAL_MIN_COVERAGE
+
+
 def generate_fallback_answer(hits):
     """Generiere eine konservative Fallback-Antwort"""
     if not hits:
@@ -147,7 +560,7 @@ def generate_fallback_answer(hits):
     for i, hit in enumerate(hits[:3], 1):
         payload = hit.get("payload", {}) or {}
         title = payload.get("title", "Ohne Titel")
-        score = hit.get("score", 0.0)
+        score = hit.get("score", hit.get("coverage", 0.0))
 
         sources_info.append(f"[{i}] {title} (Relevanz: {score:.2f})")
 
@@ -155,34 +568,52 @@ def generate_fallback_answer(hits):
         sources_info)
 
 
-def answer_from_hits_improved(hits, question):
-    """Verbesserte Antwort-Generierung mit strengerer Quellenbindung"""
+def _prepare_answer(hits, question, vector=None, history="", follow_up=False):
+    """Filtert Quellen, prüft den Antwort-Cache und baut den Prompt.
+
+    ``history`` ist der gerenderte Gesprächsverlauf der Session, ``follow_up`` gesetzt, wenn
+    ``retrieve`` die Frage um die Vorfrage ergänzt hat. Gibt ``(antwort, None)`` zurück,
+    wenn keine Completion nötig ist, sonst ``(None, plan)``.
+    """
     if not hits:
-        return "Ich habe dazu keine Informationen in den vorhandenen Bildungsdaten gefunden."
+        return "Ich habe dazu keine Informationen in den vorhandenen Bildungsdaten gefunden.", None
 
     # Filtere nur hochqualitative Treffer
-    high_quality_hits = [h for h in hits if h.get("score", 0.0) >= MIN_SCORE]
+    high_quality_hits = [h for h in hits if is_relevant(h)]
 
     if not high_quality_hits:
-        return "Die gefundenen Informationen sind nicht ausreichend relevant, um Ihre Frage sicher zu beantworten."
+        return "Die gefundenen Informationen sind nicht ausreichend relevant, um Ihre Frage sicher zu beantworten.", None
 
-    # Bereite Quellen für den Prompt vor
-    context_parts = []
-    for i, hit in enumerate(high_quality_hits[:3], 1):
-        payload = hit.get("payload", {}) or {}
-        content = payload.get("content", "").strip()
-        title = payload.get("title", "").strip()
+    # Quellen ohne Duplikate, Nachbar-Chunks verbunden, im Token-Budget
+    with timed("context_pack"):
+        passages = pack_context(high_quality_hits, CONTEXT_TOKEN_BUDGET, CONTEXT_MAX_SOURCES,
+                                CONTEXT_DUP_SIMILARITY, CHAT_MODEL)
 
-        if content:
-            context_parts.append(f"[Quelle {i} - {title}]: {content}")
+    if not passages:
+        return "In den relevanten Dokumenten wurden keine konkreten Inhalte zu Ihrer Frage gefunden.", None
 
-    if not context_parts:
-        return "In den relevanten Dokumenten wurden keine konkreten Inhalte zu Ihrer Frage gefunden."
+    context = format_context(passages)
 
-    context = "\n\n".join(context_parts)
+    cache_key = None
+    # eine Nachfrage ergibt erst mit der Vorfrage Sinn; sonst bestimmen Suchanfrage (Vektor)
+    # und Quellen die Antwort, der Verlauf im Prompt dient nur dem Verständnis
+    if vector is not None and not follow_up and 0 < ANSWER_CACHE_THRESHOLD <= 1:
+        try:
+            cache_key = ([pid for p in passages for pid in p["ids"]], collection_version())
+        except Exception as e:
+            print(f"Versionsprüfung fehlgeschlagen, Cache übersprungen: {e}", file=sys.stderr)
+    if cache_key is not None:
+        cached = ANSWER_CACHE.lookup(vector, *cache_key)
+        count_cache("answer", cached is not None, cached is None)
+        if cached is not None:
+            return cached, None
 
     # Prompt mit strengen Anweisungen
-    prompt = f"""FRAGE: {question}
+    prompt = f"""BISHERIGES GESPRÄCH (nur zum Verständnis der Frage, keine Quelle):
+{history}
+
+""" if history else ""
+    prompt += f"""FRAGE: {question}
 
 VERFÜGBARE QUELLEN:
 {context}
@@ -194,37 +625,116 @@ ANWEISUNGEN:
 - Zitiere die Quellen mit [1], [2] etc.
 - Kurze, präzise Antwort"""
 
-    try:
-        client = OpenAI(api_key=OPENAI_API_KEY)
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": EDUCHAT_SYSTEM_PROMPT},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.1,  # Sehr niedrig für Konsistenz
-            max_tokens=500
-        )
+    return None, {"context": context, "prompt": prompt, "sources": high_quality_hits, "cache_key": cache_key}
+
+
+def _completion_request(plan):
+    return dict(
+        model=CHAT_MODEL,
+        messages=[
+            {"role": "system", "content": EDUCHAT_SYSTEM_PROMPT},
+            {"role": "user", "content": plan["prompt"]}
+        ],
+        temperature=0.1,  # Sehr niedrig für Konsistenz
+        max_tokens=500
+    )
+
+
+def _completion_slot(request):
+    """Scheduler-Platz für eine Chat-Completion; geschätzt werden Prompt plus max_tokens"""
+    prompt = "".join(m["content"] for m in request["messages"])
+    return get_limiter().slot(count_tokens(prompt, CHAT_MODEL) + request["max_tokens"], INTERACTIVE)
 
-        answer = response.choices[0].message.content.strip()
 
-        # Sicherheits-Check: Antwort validieren
-        if is_answer_hallucinating(answer, context, question):
-            return "Ich kann diese Frage auf Basis der verfügbaren Informationen nicht sicher beantworten."
+def _finish_answer(plan, question, answer, vector=None):
+    """Validiert die fertige Antwort und legt sie, falls gültig, im Cache ab; gibt (antwort, zurückgezogen) zurück"""
+    retracted = False
+    # Sicherheits-Check: Antwort validieren
+    with timed("hallucination_check"):
+        hallucinating = is_answer_hallucinating(answer, plan["context"], question)
+    if hallucinating:
+        answer, retracted = UNSAFE_ANSWER, True
 
+    # eine zurückgezogene Antwort nicht cachen: ein Fehlalarm gälte sonst für alle ähnlichen Fragen
+    if plan["cache_key"] is not None and not retracted:
+        ANSWER_CACHE.store(vector, *plan["cache_key"], answer)
+    return answer, retracted
+
+
+def answer_from_hits_improved(hits, question, vector=None, history="", follow_up=False):
+    """Verbesserte Antwort-Generierung mit strengerer Quellenbindung.
+
+    Mit ``vector`` (Embedding der Frage) werden Antworten für nahezu gleiche Fragen
+    mit denselben Quellen aus dem ANSWER_CACHE bedient.
+    """
+    answer, plan = _prepare_answer(hits, question, vector, history, follow_up)
+    if plan is None:
+        return answer
+
+    try:
+        client = get_openai_client(OPENAI_API_KEY)
+        request = _completion_request(plan)
+        with _completion_slot(request) as ticket, timed("completion"):
+            response = client.chat.completions.create(**request)
+        ticket.settle(response.usage.total_tokens)
+        count_usage(response.usage)
+        answer, _ = _finish_answer(plan, question, response.choices[0].message.content.strip(), vector)
         return answer
 
     except Exception as e:
         print(f"OpenAI Fehler: {e}", file=sys.stderr)
         # Fallback: Einfache Quellen-Auflistung
-        return generate_fallback_answer(high_quality_hits)
+        return generate_fallback_answer(plan["sources"])
+
+
+def stream_answer_improved(hits, question, vector=None, history="", follow_up=False):
+    """Wie answer_from_hits_improved, liefert aber Ereignisse, sobald Tokens eintreffen.
+
+    Erst ``{"type": "token", "text": ...}`` pro Stück, am Ende genau ein
+    ``{"type": "done", "answer": ..., "retracted": bool}``. Ist ``retracted`` gesetzt,
+    ersetzt ``answer`` den bisher gestreamten Text (Halluzinations-Check oder Fehler).
+    """
+    answer, plan = _prepare_answer(hits, question, vector, history, follow_up)
+    if plan is None:
+        yield {"type": "token", "text": answer}
+        yield {"type": "done", "answer": answer, "retracted": False}
+        return
+
+    parts = []
+    start = time.perf_counter()
+    try:
+        client = get_openai_client(OPENAI_API_KEY)
+        request = _completion_request(plan)
+        # der Platz bleibt belegt, bis der Stream fertig ist
+        with _completion_slot(request) as ticket:
+            for chunk in client.chat.completions.create(**request, stream=True):
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    if not parts:
+                        metrics.STAGE_SECONDS.observe(time.perf_counter() - start, stage="completion_first_token")
+                    parts.append(delta)
+                    yield {"type": "token", "text": delta}
+    except Exception as e:
+        print(f"OpenAI Fehler: {e}", file=sys.stderr)
+        yield {"type": "done", "answer": generate_fallback_answer(plan["sources"]), "retracted": True}
+        return
+    metrics.STAGE_SECONDS.observe(time.perf_counter() - start, stage="completion")
+    # der Stream liefert kein usage-Objekt, daher lokal gezählt
+    prompt_tokens = count_tokens(EDUCHAT_SYSTEM_PROMPT + plan["prompt"], CHAT_MODEL)
+    completion_tokens = count_tokens("".join(parts), CHAT_MODEL)
+    ticket.settle(prompt_tokens + completion_tokens)
+    metrics.TOKENS.inc(prompt_tokens, kind="prompt")
+    metrics.TOKENS.inc(completion_tokens, kind="completion")
+
+    answer, retracted = _finish_answer(plan, question, "".join(parts).strip(), vector)
+    yield {"type": "done", "answer": answer, "retracted": retracted}
 
 
 def answer_from_hits(hits):
     """Einfache Antwort für Kompatibilität"""
     if not hits:
         return "Ich weiß es nicht auf Basis der vorhandenen Daten."
-    if hits[0].get("score", 0.0) < MIN_SCORE:
+    if not is_relevant(hits[0]):
         return "Ich weiß es nicht auf Basis der vorhandenen Daten."
 
     lines = []
@@ -238,15 +748,26 @@ def answer_from_hits(hits):
     return "\n".join(lines).strip()
 
 
+def report_metrics():
+    """Beim Beenden: Tabelle auf stderr und, falls METRICS_TEXTFILE gesetzt, Textfile für Prometheus"""
+    if METRICS_SUMMARY:
+        print(metrics.summary(), file=sys.stderr)
+    try:
+        metrics.write_textfile()
+    except OSError as e:
+        print(f"Metriken nicht geschrieben: {e}", file=sys.stderr)
+
+
 def run_chat_improved():
     """Verbesserte Chat-Funktion mit konservativeren Antworten"""
-    client = OpenAI(api_key=OPENAI_API_KEY)
+    client = get_openai_client(OPENAI_API_KEY)
 
     print("=== EDUCHAT - Bildungsassistent ===")
     print("Ich antworte nur auf Basis verfügbarer Bildungsdaten.")
     print("Eingabe ':exit' zum Beenden\n")
 
-    conversation_history = []
+    # eine Session für die Konsole, gleiche Grenzen wie im HTTP-Dienst
+    session = SESSIONS.get("cli")
 
     while True:
         try:
@@ -265,18 +786,30 @@ def run_chat_improved():
             continue
 
         try:
-            # Embedding für Suche
-            vec = embed_texts(client, [question])[0]
-            hits = search(vec)
+            # Embedding für Suche (entfällt bei eindeutigem Stichworttreffer)
+            follow_up = session.is_follow_up(question)
+            vec, hits = retrieve(client, question, session)
+            history = session.render()
 
             # Verbesserte Antwort-Generierung
-            answer = answer_from_hits_improved(hits, question)
-
-            print(f"\nAntwort: {answer}")
+            if STREAM_ANSWERS:
+                print("\nAntwort: ", end="", flush=True)
+                for event in stream_answer_improved(hits, question, vector=vec, history=history,
+                                                    follow_up=follow_up):
+                    if event["type"] == "token":
+                        print(event["text"], end="", flush=True)
+                    else:
+                        answer = event["answer"]
+                        if event["retracted"]:
+                            print(f"\n\n[Antwort zurückgezogen] {answer}", end="")
+                print()
+            else:
+                answer = answer_from_hits_improved(hits, question, vector=vec, history=history, follow_up=follow_up)
+                print(f"\nAntwort: {answer}")
             print("-" * 80)
 
-            # Konversationshistorie für Kontext (optional)
-            conversation_history.append({"question": question, "answer": answer})
+            # Verlauf für Nachfragen, gedeckelt und verdichtet
+            session.add_turn(question, answer)
 
         except Exception as e:
             print(f"Fehler: {e}")
@@ -290,7 +823,7 @@ def run_chat():
     else:
         blocked = BLOCK_WORDS
 
-    client = OpenAI(api_key=OPENAI_API_KEY)
+    client = get_openai_client(OPENAI_API_KEY)
     print("SentinelAI – Console-Chat (nur Inhalte aus Qdrant). ':exit' zum Beenden.")
     while True:
         try:
@@ -305,25 +838,143 @@ def run_chat():
             print("Sicherheitsmeldung: Anfrage blockiert.");
             continue
         try:
-            vec = embed_texts(client, [q])[0]
-            hits = search(vec)
+            _, hits = retrieve(client, q)
             print(answer_from_hits(hits))
             print("-" * 60)
         except Exception as e:
             print(f"Fehler: {e}", file=sys.stderr)
 
 
+def export_snapshot(directory, dtype="float32", payloads="jsonl"):
+    """Schreibt die Collection als Snapshot – für den lokalen Index (LOCAL_INDEX_PATH) und für ``import``"""
+    from educhat_common.vector_index import export_snapshot as export_collection
+    # Version vor dem Lesen: ändert sich die Collection währenddessen, gilt der Snapshot als veraltet
+    version = read_version(get_session(), QDRANT_URL, COLLECTION)
+    start = time.perf_counter()
+    count = export_collection(get_session(), QDRANT_URL, COLLECTION, directory, dtype=dtype, payloads=payloads,
+                              batch_size=SNAPSHOT_BATCH_SIZE, model=EMBED_MODEL, version=version)
+    print(f"Export abgeschlossen: {count} Punkte aus '{COLLECTION}' nach {directory} "
+          f"({dtype}, {payloads}, {time.perf_counter() - start:.1f}s).")
+
+
+def _upsert_into(collection, points):
+    with qdrant_call("upsert"):
+        get_transport(QDRANT_URL).upsert(collection, points, timeout=120)
+    return len(points)
+
+
+def import_snapshot(directory):
+    """Spielt einen Snapshot ohne Embedding-Aufrufe in die Collection ein.
+
+    Blöcke zu SNAPSHOT_BATCH_SIZE Punkten, IMPORT_CONCURRENCY Upserts gleichzeitig; gelesen
+    wird gestreamt (Vektoren per mmap), damit auch große Snapshots kaum Speicher brauchen.
+    """
+    from educhat_common.migration import parallel_upsert
+    from educhat_common.vector_index import iter_snapshot, read_manifest
+
+    manifest = read_manifest(directory)
+    if manifest.get("dim") != EMBED_DIM:
+        _die(f"Snapshot hat Dimension {manifest.get('dim')}, erwartet {EMBED_DIM} (EMBED_DIM).")
+    if manifest.get("model") and manifest["model"] != EMBED_MODEL:
+        _die(f"Snapshot stammt von '{manifest['model']}', EMBED_MODEL ist '{EMBED_MODEL}'.")
+    ensure_collection()
+
+    batches = ([{"id": i, "vector": v, "payload": p} for i, v, p in zip(ids, vectors, payloads)]
+               for ids, vectors, payloads in iter_snapshot(directory, SNAPSHOT_BATCH_SIZE))
+    start = time.perf_counter()
+    try:
+        done = parallel_upsert(lambda points: _upsert_into(COLLECTION, points), batches, IMPORT_CONCURRENCY)
+    except QdrantError as e:
+        _die(str(e))
+    # Version des Snapshots übernehmen: ein lokaler Index aus demselben Verzeichnis gilt dann als aktuell
+    bump_version(get_session(), QDRANT_URL, COLLECTION, version=manifest.get("version"))
+    _version["value"] = None
+    elapsed = time.perf_counter() - start
+    print(f"Import abgeschlossen: {done} Punkte nach '{COLLECTION}' in {elapsed:.1f}s "
+          f"({done / elapsed if elapsed else 0:.0f} Punkte/s).")
+
+
+def migrate_dimension(dim, reembed=False, target=None, replace_collection=False, switch=True):
+    """Zieht die Collection auf ``dim`` Dimensionen um und schaltet sie per Alias um.
+
+    Standard ist Kürzen ohne API-Aufrufe, ``reembed`` embeddet die Payload-Texte neu.
+    Danach EMBED_DIM=dim setzen und die Dienste neu starten – bis dahin passen ihre
+    Anfrage-Vektoren nicht zur Collection.
+    """
+    from educhat_common.migration import MigrationError, migrate_collection
+
+    embed = None
+    if reembed:
+        try:
+            # vor dem Anlegen der Ziel-Collection: das Modell muss ``dim`` liefern können
+            embedding_options(EMBED_MODEL, dim)
+        except ValueError as e:
+            _die(str(e))
+        client = get_openai_client(OPENAI_API_KEY)
+
+        def embed(texts):
+            vectors = [None] * len(texts)
+            present = [i for i, t in enumerate(texts) if t.strip()]
+            # ein Scroll-Block wäre für einen Embedding-Request zu groß
+            for start in range(0, len(present), 256):
+                part = present[start:start + 256]
+                for i, vec in zip(part, embed_texts(client, [texts[i] for i in part], BULK, dim)):
+                    vectors[i] = vec
+            return vectors
+
+    try:
+        stats = migrate_collection(get_session(), QDRANT_URL, COLLECTION, dim, _upsert_into, embed=embed,
+                                   target=target, batch_size=SNAPSHOT_BATCH_SIZE, concurrency=IMPORT_CONCURRENCY,
+                                   replace_collection=replace_collection, switch=switch)
+    except (MigrationError, QdrantError, ValueError) as e:
+        _die(str(e))
+    print(f"Migration abgeschlossen: {stats['copied']} Punkte nach '{stats['target']}' in {stats['seconds']}s.")
+    if stats["switched"]:
+        # Antwort-Caches und lokale Indizes der Dienste auf dem alten Stand verwerfen
+        bump_version(get_session(), QDRANT_URL, COLLECTION)
+        if stats["source"] != COLLECTION:
+            print(f"Die alte Collection '{stats['source']}' bleibt zum Zurückschalten bestehen.")
+        print(f"Jetzt EMBED_DIM={dim} setzen und die Dienste neu starten.")
+
+
 def main():
+    if len(sys.argv) >= 3 and sys.argv[1] == "migrate":
+        args = sys.argv[3:]
+        if not sys.argv[2].isdigit() or int(sys.argv[2]) <= 0:
+            _die(f"Dimension muss eine positive ganze Zahl sein, nicht '{sys.argv[2]}'.")
+        if "--reembed" in args and not OPENAI_API_KEY:
+            _die("Bitte OPENAI_API_KEY setzen (--reembed braucht die Embeddings-API).")
+        target = args[args.index("--target") + 1] if "--target" in args[:-1] else None
+        migrate_dimension(int(sys.argv[2]), reembed="--reembed" in args, target=target,
+                          replace_collection="--replace-collection" in args, switch="--no-switch" not in args)
+        return
+    if len(sys.argv) >= 3 and sys.argv[1] == "export":
+        flags = set(sys.argv[3:])
+        export_snapshot(sys.argv[2], dtype="float16" if "--float16" in flags else "float32",
+                        payloads="msgpack" if "--msgpack" in flags else "jsonl")
+        return
+    if len(sys.argv) >= 3 and sys.argv[1] == "import":
+        import_snapshot(sys.argv[2])
+        return
     if not OPENAI_API_KEY:
         _die("Bitte OPENAI_API_KEY setzen.")
     ensure_collection()
-    if len(sys.argv) >= 3 and sys.argv[1] == "ingest":
-        topic = " ".join(sys.argv[2:])
-        ingest_topic(OpenAI(api_key=OPENAI_API_KEY), topic, max_chunks=5)
-    elif len(sys.argv) >= 2 and sys.argv[1] == "improved":
-        run_chat_improved()
-    else:
-        run_chat()
+    try:
+        if len(sys.argv) >= 4 and sys.argv[1] == "ingest" and sys.argv[2] == "--file":
+            args = sys.argv[4:]
+            concurrency = int(args[args.index("--concurrency") + 1]) if "--concurrency" in args[:-1] else INGEST_CONCURRENCY
+            result = ingest_file(sys.argv[3], concurrency=concurrency, skip_existing="--no-skip" not in args)
+            if result["failed"]:
+                sys.exit(1)
+        elif len(sys.argv) >= 3 and sys.argv[1] == "ingest":
+            topic = " ".join(sys.argv[2:])
+            ingest_topic(get_openai_client(OPENAI_API_KEY), topic, max_chunks=5)
+        elif len(sys.argv) >= 2 and sys.argv[1] == "improved":
+            run_chat_improved()
+        else:
+            run_chat()
+    finally:
+        report_metrics()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,179 @@
+"""Gesprächsverläufe pro Session mit festen Obergrenzen.
+
+Pro Session gilt ein Token-Budget für die letzten Runden; was herausfällt, wird
+lokal zu einer Zusammenfassung verdichtet (ohne zusätzlichen LLM-Aufruf), die
+selbst gedeckelt ist. Der Store hält höchstens ``max_sessions`` im Speicher und
+verdrängt nach LRU und TTL – mit ``spill_dir`` landen verdrängte Sessions auf
+Platte und werden beim nächsten Zugriff wieder geladen.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from educhat_common.lexical_index import tokenize
+from educhat_common.tokens import count_tokens
+
+# Kurze Nachfragen ("Und in Berlin?", "Wie lange dauert das?") brauchen das Thema der Vorfrage
+FOLLOW_UP_TERMS = 4
+
+_SENTENCE = re.compile(r"(?<=[.!?])\s")
+
+
+def _first_sentence(text, limit=160):
+    sentence = _SENTENCE.split(text.strip(), 1)[0]
+    return sentence if len(sentence) <= limit else sentence[:limit].rstrip() + " …"
+
+
+class Session:
+    def __init__(self, session_id, history_tokens=800, summary_tokens=300, model="gpt-4o-mini"):
+        self.id = session_id
+        self.history_tokens = history_tokens
+        self.summary_tokens = summary_tokens
+        self.model = model
+        self.turns = []        # [(frage, antwort, tokens)]
+        self.summary = []      # verdichtete ältere Runden, eine Zeile pro Runde
+        self.last_used = time.time()
+        self._lock = threading.Lock()
+
+    def add_turn(self, question, answer):
+        tokens = count_tokens(f"Nutzer: {question}\nAssistent: {answer}", self.model)
+        with self._lock:
+            self.turns.append((question, answer, tokens))
+            self._compact()
+
+    def _compact(self):
+        # die jüngste Runde bleibt immer vollständig
+        while len(self.turns) > 1 and sum(t for _, _, t in self.turns) > self.history_tokens:
+            question, answer, _ = self.turns.pop(0)
+            self.summary.append(f"- {question.strip()} → {_first_sentence(answer)}")
+        while len(self.summary) > 1 and count_tokens("\n".join(self.summary), self.model) > self.summary_tokens:
+            self.summary.pop(0)
+
+    def render(self):
+        """Verlauf für den Prompt; leer, solange es keine Runde gibt"""
+        parts = []
+        if self.summary:
+            parts.append("Frühere Themen:\n" + "\n".join(self.summary))
+        for question, answer, _ in self.turns:
+            parts.append(f"Nutzer: {question}\nAssistent: {answer}")
+        return "\n\n".join(parts)
+
+    def is_follow_up(self, question):
+        """Kurze Frage nach einer vorigen Runde – die Suche wird dann um die Vorfrage ergänzt"""
+        return bool(self.turns) and len(tokenize(question)) <= FOLLOW_UP_TERMS
+
+    def retrieval_query(self, question):
+        """Suchanfrage für Nachfragen um die vorige Frage ergänzen"""
+        if not self.is_follow_up(question):
+            return question
+        return f"{self.turns[-1][0]} {question}"
+
+    def to_dict(self):
+        return {"id": self.id, "turns": [list(t) for t in self.turns], "summary": self.summary,
+                "last_used": self.last_used}
+
+    @classmethod
+    def from_dict(cls, data, **limits):
+        session = cls(data["id"], **limits)
+        session.turns = [tuple(t) for t in data.get("turns", [])]
+        session.summary = list(data.get("summary", []))
+        session.last_used = data.get("last_used", time.time())
+        return session
+
+
+class SessionStore:
+    def __init__(self, max_sessions=10000, ttl=1800, history_tokens=800, summary_tokens=300,
+                 spill_dir="", model="gpt-4o-mini"):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.limits = {"history_tokens": history_tokens, "summary_tokens": summary_tokens, "model": model}
+        self.spill_dir = spill_dir
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _spill_path(self, session_id):
+        # Session-IDs kommen vom Client – nie direkt als Dateiname verwenden
+        return os.path.join(self.spill_dir, hashlib.sha256(session_id.encode("utf-8")).hexdigest() + ".json")
+
+    def _spill(self, session):
+        if not self.spill_dir or time.time() - session.last_used >= self.ttl:
+            return
+        tmp = self._spill_path(session.id) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(session.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp, self._spill_path(session.id))
+
+    def _unspill(self, session_id):
+        if not self.spill_dir:
+            return None
+        path = self._spill_path(session_id)
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        os.remove(path)
+        if time.time() - data.get("last_used", 0) >= self.ttl:
+            return None
+        return Session.from_dict(data, **self.limits)
+
+    def _evict(self):
+        now = time.time()
+        # abgelaufene Sessions liegen vorn, weil die Reihenfolge dem letzten Zugriff folgt
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if now - oldest.last_used < self.ttl and len(self._sessions) <= self.max_sessions:
+                break
+            self._sessions.popitem(last=False)
+            self._spill(oldest)
+
+    def get(self, session_id, create=True):
+        """Session zur ID; unbekannte werden angelegt (oder ``None`` mit ``create=False``)"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None and time.time() - session.last_used >= self.ttl:
+                del self._sessions[session_id]
+                session = None
+            if session is None:
+                session = self._unspill(session_id)
+            if session is None:
+                if not create:
+                    return None
+                session = Session(session_id, **self.limits)
+            session.last_used = time.time()
+            self._sessions[session_id] = session
+            self._sessions.move_to_end(session_id)
+            self._evict()
+            return session
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            if self.spill_dir:
+                try:
+                    os.remove(self._spill_path(session_id))
+                except OSError:
+                    pass
+
+    def prune(self):
+        """Abgelaufene Sessions entfernen – im Speicher und auf Platte –, auch ohne neuen Zugriff"""
+        with self._lock:
+            self._evict()
+        if not self.spill_dir:
+            return
+        cutoff = time.time() - self.ttl
+        for entry in os.scandir(self.spill_dir):
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError:
+                pass
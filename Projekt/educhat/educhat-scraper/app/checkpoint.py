@@ -0,0 +1,78 @@
+"""Checkpoint und JSONL-Journal, damit ein abgebrochener Lauf fortgesetzt werden kann."""
+import json
+import os
+
+
+class RunCheckpoint:
+    """Hält fest, welche Suchbegriffe fertig sind, und protokolliert jeden Kurs im Journal.
+
+    Existiert beim Start ein Checkpoint, wird der Lauf fortgesetzt: erledigte
+    Suchbegriffe werden übersprungen und die Kurs-IDs aus dem Journal zählen
+    weiter als gesehen. Sonst beginnt ein neues Journal.
+    """
+
+    def __init__(self, checkpoint_path, journal_path):
+        self.checkpoint_path = checkpoint_path
+        self.journal_path = journal_path
+        self.done_terms = {}
+        self.incomplete_terms = set()  # erledigt, aber nicht alle Treffer geholt
+        self.seen_ids = set()
+        self.resumed = os.path.exists(checkpoint_path)
+
+        os.makedirs(os.path.dirname(os.path.abspath(checkpoint_path)), exist_ok=True)
+        os.makedirs(os.path.dirname(os.path.abspath(journal_path)), exist_ok=True)
+        if self.resumed:
+            with open(checkpoint_path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.done_terms = data.get("done_terms", {})
+            self.incomplete_terms = set(data.get("incomplete_terms", []))
+            if os.path.exists(journal_path):
+                with open(journal_path, encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            self.seen_ids.add(json.loads(line)["id"])
+                        except (ValueError, KeyError):
+                            # abgeschnittene letzte Zeile nach einem Absturz
+                            continue
+            self._journal = open(journal_path, "a", encoding="utf-8")
+        else:
+            self._journal = open(journal_path, "w", encoding="utf-8")
+            self._write_checkpoint()
+
+    def append(self, courses):
+        for course in courses:
+            self._journal.write(json.dumps(course, ensure_ascii=False) + "\n")
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+
+    def mark_done(self, term, count, complete=True):
+        self.done_terms[term] = count
+        if complete:
+            self.incomplete_terms.discard(term)
+        else:
+            self.incomplete_terms.add(term)
+        self._write_checkpoint()
+
+    def complete_terms(self):
+        """Begriffe, deren Trefferliste vollständig ist – nur unter ihnen darf gelöscht werden.
+
+        Leere Ergebnisse zählen nicht (Fehler oder geänderte Seite), abgeschnittene auch nicht.
+        """
+        return [term for term, count in self.done_terms.items() if count and term not in self.incomplete_terms]
+
+    def _write_checkpoint(self):
+        tmp = self.checkpoint_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"done_terms": self.done_terms, "incomplete_terms": sorted(self.incomplete_terms)}, f,
+                      ensure_ascii=False)
+        os.replace(tmp, self.checkpoint_path)
+
+    def finish(self):
+        """Lauf abgeschlossen – Journal bleibt als Ergebnis, der Checkpoint wird entfernt"""
+        self._journal.close()
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+    def close(self):
+        if not self._journal.closed:
+            self._journal.close()
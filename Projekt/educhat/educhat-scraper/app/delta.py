@@ -0,0 +1,83 @@
+"""Stabile Kurs-IDs und ein Manifest der Inhalts-Hashes für inkrementelle Läufe."""
+import hashlib
+import json
+import os
+import uuid
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Parameter, die nur Tracking sind und die Identität eines Kurses nicht ändern
+TRACKING_PARAMS = {"utm_source", "utm_medium", "utm_campaign", "utm_term", "utm_content", "gclid", "fbclid"}
+# Felder aus der Such-API, die ins Embedding und in den Inhalts-Hash eingehen
+STRUCTURED_FIELDS = {"provider": "Anbieter", "location": "Ort", "start_date": "Beginn",
+                     "duration": "Dauer", "format": "Form", "price": "Kosten"}
+
+
+def _normalize(text):
+    return " ".join((text or "").split()).lower()
+
+
+def normalize_url(url: str) -> str:
+    """Schema/Host klein, ohne Fragment, Tracking-Parameter und abschließenden Slash, Query sortiert"""
+    parts = urlsplit((url or "").strip())
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in TRACKING_PARAMS)
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, urlencode(query), ""))
+
+
+def course_point_id(course) -> str:
+    """Deterministische UUID aus der Kurs-URL, ohne URL aus Titel + Beschreibung"""
+    if course.get("url"):
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, normalize_url(course["url"])))
+    key = _normalize(course.get("title")) + "\n" + _normalize(course.get("description"))
+    return str(uuid.uuid5(uuid.NAMESPACE_OID, key))
+
+
+def _structured(course):
+    return [f"{label}: {course[field]}" for field, label in STRUCTURED_FIELDS.items() if course.get(field)]
+
+
+def course_text(course) -> str:
+    """Text fürs Embedding; strukturierte Felder (nur aus dem API-Modus) hängen zeilenweise an"""
+    text = course["title"] + " " + course["description"]
+    return "\n".join([text] + _structured(course))
+
+
+def content_hash(course) -> str:
+    # ohne strukturierte Felder gleicher Hash wie bisher – Browser-Kurse werden nicht neu embeddet
+    key = "\n".join([_normalize(course.get("title")), _normalize(course.get("description"))]
+                    + [_normalize(line) for line in _structured(course)])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+class Manifest:
+    """Punkt-ID → Inhalts-Hash und Suchbegriff des letzten erfolgreichen Laufs"""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.entries = json.load(f).get("points", {})
+
+    def is_current(self, point_id, digest):
+        entry = self.entries.get(point_id)
+        return entry is not None and entry["hash"] == digest
+
+    def record(self, point_id, digest, search_term):
+        self.entries[point_id] = {"hash": digest, "search_term": search_term}
+
+    def stale(self, seen_ids, search_terms):
+        """IDs aus ``search_terms``, die in diesem Lauf nicht mehr gefunden wurden"""
+        return [pid for pid, entry in self.entries.items()
+                if pid not in seen_ids and entry.get("search_term") in search_terms]
+
+    def forget(self, point_ids):
+        for pid in point_ids:
+            self.entries.pop(pid, None)
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "points": self.entries}, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
@@ -0,0 +1,71 @@
+"""Seiten-Pool und Höflichkeits-Limit für parallele Playwright-Scrapes."""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse
+
+# Werden nie geladen – für das Auslesen der Kurse reicht HTML + JS
+BLOCKED_RESOURCE_TYPES = {"image", "font", "stylesheet", "media"}
+
+
+async def _block_heavy_resources(route):
+    if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+class HostLimiter:
+    """Begrenzt gleichzeitige Sitzungen pro Host und hält einen Mindestabstand zwischen deren Start"""
+
+    def __init__(self, per_host=2, min_interval=1.0):
+        self.per_host = per_host
+        self.min_interval = min_interval
+        self._semaphores = {}
+        self._locks = {}
+        self._last_start = {}
+
+    @asynccontextmanager
+    async def slot(self, url):
+        host = urlparse(url).netloc
+        semaphore = self._semaphores.setdefault(host, asyncio.Semaphore(self.per_host))
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with semaphore:
+            async with lock:
+                wait = self._last_start.get(host, 0.0) + self.min_interval - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                self._last_start[host] = time.monotonic()
+            yield
+
+
+class PagePool:
+    """Feste Anzahl wiederverwendeter Seiten in einem gemeinsamen Browser-Kontext"""
+
+    def __init__(self, browser, size=4, **context_options):
+        self.browser = browser
+        self.size = size
+        self.context_options = context_options
+        self.context = None
+        self._pages = asyncio.Queue()
+
+    async def start(self):
+        self.context = await self.browser.new_context(**self.context_options)
+        await self.context.route("**/*", _block_heavy_resources)
+        for _ in range(self.size):
+            self._pages.put_nowait(await self.context.new_page())
+
+    @asynccontextmanager
+    async def page(self):
+        page = await self._pages.get()
+        try:
+            yield page
+        finally:
+            if page.is_closed():
+                page = await self.context.new_page()
+            self._pages.put_nowait(page)
+
+    async def close(self):
+        if self.context is not None:
+            await self.context.close()
+            self.context = None
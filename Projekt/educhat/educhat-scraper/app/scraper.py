@@ -1,12 +1,24 @@
 import asyncio
-import logging
 import json
+import logging
 import os
+import sys
+from collections import namedtuple
 from datetime import datetime
-from playwright.async_api import async_playwright
-from qdrant_client import QdrantClient
-from qdrant_client.models import VectorParams, Distance, PointStruct
-from openai import OpenAI
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "educhat-common"))
+from educhat_common.clients import get_async_openai_client, get_session
+from educhat_common.collection_schema import ensure_collection_cached
+from educhat_common.collection_version import bump_version
+from educhat_common.embed_cache import get_default_cache
+from educhat_common.embedding import embed_batched
+from educhat_common import metrics
+from educhat_common.metrics import count_cache, qdrant_call, timed
+from educhat_common.qdrant_transport import get_transport
+from checkpoint import RunCheckpoint
+from delta import Manifest, content_hash, course_point_id, course_text
+from page_pool import HostLimiter, PagePool
+from search_api import DEFAULT_FIELDS, SearchApi
 
 #TODO: Scraper einarbeiten in die Qdrant Vektordatenbank
 
@@ -17,180 +29,423 @@ QDRANT_URL = os.getenv("QDRANT_URL", "http://qdrant:6333")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 SEARCH_TERMS = ["e", "a", "kurs"]  # Einfache Suchbegriffe weil die Seite Suchbegrife benötugt
 COLLECTION_NAME = "weiterbildungen"
+EMBED_MODEL = os.getenv("EMBED_MODEL", "text-embedding-3-small")
+EMBED_DIM = int(os.getenv("EMBED_DIM", "1536"))  # < volle Breite: gekürzte Embeddings (text-embedding-3-*)
+EMBED_BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", "50000"))  # Token-Budget pro Request
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))        # max. Texte pro Request
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))        # parallele Requests
+SEARCH_URL = os.getenv("SEARCH_URL", "https://mein-now.de/weiterbildungssuche/")
+SCRAPE_CONCURRENCY = int(os.getenv("SCRAPE_CONCURRENCY", "4"))      # Seiten im Pool
+SCRAPE_HOST_CONCURRENCY = int(os.getenv("SCRAPE_HOST_CONCURRENCY", "2"))  # gleichzeitige Sitzungen pro Host
+SCRAPE_HOST_DELAY = float(os.getenv("SCRAPE_HOST_DELAY", "1.0"))    # Sekunden zwischen Sitzungsstarts pro Host
+SCRAPE_MODE = os.getenv("SCRAPE_MODE", "auto")  # api, browser oder auto (API, bei Fehlern Browser)
+SEARCH_API_URL = os.getenv("SEARCH_API_URL", "")  # JSON-Endpunkt der Suchseite, leer = nur Browser
+SEARCH_API_TERM_PARAM = os.getenv("SEARCH_API_TERM_PARAM", "sw")
+SEARCH_API_PAGE_PARAM = os.getenv("SEARCH_API_PAGE_PARAM", "page")
+SEARCH_API_FIRST_PAGE = int(os.getenv("SEARCH_API_FIRST_PAGE", "0"))
+SEARCH_API_ITEMS = os.getenv("SEARCH_API_ITEMS", "items")  # Pfad zur Trefferliste im Antwort-JSON
+SEARCH_API_MORE = os.getenv("SEARCH_API_MORE", "more")     # Pfad zu "weitere Seiten", leer = bis leere Seite
+SEARCH_API_TOTAL = os.getenv("SEARCH_API_TOTAL", "total")  # Pfad zur Gesamtzahl, erlaubt parallele Seiten
+SEARCH_API_FIELDS = json.loads(os.getenv("SEARCH_API_FIELDS", "") or json.dumps(DEFAULT_FIELDS))  # Kursfeld → Pfad
+SEARCH_API_MAX_PAGES = int(os.getenv("SEARCH_API_MAX_PAGES", "200"))  # Seiten pro Suchbegriff
+SEARCH_API_CONCURRENCY = int(os.getenv("SEARCH_API_CONCURRENCY", "4"))  # gleichzeitige Requests pro Host
+SEARCH_API_DELAY = float(os.getenv("SEARCH_API_DELAY", "0.1"))  # Sekunden zwischen Requests pro Host
+SEARCH_API_RECORD = os.getenv("SEARCH_API_RECORD", "")  # JSONL-Aufnahme der Antworten für stubs.py --replay
+REQUEST_TIMEOUT = 60000      # ms für Seitenaufrufe
+WAIT_TIMEOUT = 15000         # ms für das Warten auf Ergebnisse
+ITEM_SELECTOR = 'article, [class*="card"], [class*="item"]'
+MANIFEST_PATH = os.getenv("MANIFEST_PATH", "/app/state/manifest.json")  # Inhalts-Hashes des letzten Laufs
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", "/app/state/checkpoint.json")  # erledigte Suchbegriffe
+JOURNAL_PATH = os.getenv("JOURNAL_PATH", "/app/state/courses.jsonl")  # alle Kurse des Laufs
+UPSERT_CHUNK_SIZE = int(os.getenv("UPSERT_CHUNK_SIZE", "128"))  # Kurse pro Embedding/Upsert-Block
+QUEUE_SIZE = int(os.getenv("QUEUE_SIZE", "1000"))  # max. gescrapte, noch nicht gespeicherte Kurse
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Ke übergabe
-client = OpenAI(api_key=OPENAI_API_KEY)
+class UpsertError(RuntimeError):
+    """Kurse eines Blocks nicht gespeichert; ``courses`` sind die betroffenen"""
+
+    def __init__(self, message, courses):
+        super().__init__(message)
+        self.courses = courses
+
+
+# Markiert in der Queue das Ende eines Suchbegriffs; ``complete`` = alle Treffer geholt
+TermDone = namedtuple("TermDone", "term count complete")
 
 
 class WeiterbildungScraper:
     def __init__(self):
-        self.qdrant = QdrantClient(url=QDRANT_URL)
+        self.qdrant = get_transport(QDRANT_URL)
         self.collection = COLLECTION_NAME
+        self.manifest = Manifest(MANIFEST_PATH)
+        self.changed = 0  # gespeicherte + gelöschte Punkte in diesem Lauf
+        self.api = None
+        self._browser_lock = asyncio.Lock()
+
+    def init_api(self):
+        """JSON-API der Suchseite; ohne SEARCH_API_URL oder im Browser-Modus bleibt ``self.api`` leer"""
+        if SCRAPE_MODE == "browser" or not SEARCH_API_URL:
+            return
+        self.api = SearchApi(
+            SEARCH_API_URL, base_url=SEARCH_URL, term_param=SEARCH_API_TERM_PARAM,
+            page_param=SEARCH_API_PAGE_PARAM, first_page=SEARCH_API_FIRST_PAGE, items=SEARCH_API_ITEMS,
+            more=SEARCH_API_MORE, total=SEARCH_API_TOTAL, fields=SEARCH_API_FIELDS,
+            max_pages=SEARCH_API_MAX_PAGES, concurrency=SEARCH_API_CONCURRENCY,
+            min_interval=SEARCH_API_DELAY, record_path=SEARCH_API_RECORD)
+        logger.info(f"Such-API aktiv: {SEARCH_API_URL} (Modus {SCRAPE_MODE})")
+
+    async def ensure_browser(self):
+        """Startet Chromium erst, wenn er gebraucht wird – im API-Modus meist nie"""
+        async with self._browser_lock:
+            if not hasattr(self, "pages"):
+                await self.init_browser()
 
     async def init_browser(self):
-        pw = await async_playwright().start()
-        self.browser = await pw.chromium.launch(headless=True)
-        logger.info("Browser initialisiert")
+        from playwright.async_api import async_playwright
+        self.playwright = await async_playwright().start()
+        self.browser = await self.playwright.chromium.launch(headless=True)
+        self.pages = PagePool(self.browser, size=SCRAPE_CONCURRENCY)
+        await self.pages.start()
+        self.hosts = HostLimiter(per_host=SCRAPE_HOST_CONCURRENCY, min_interval=SCRAPE_HOST_DELAY)
+        logger.info(f"Browser initialisiert ({SCRAPE_CONCURRENCY} Seiten)")
+
+    async def embed_texts(self, texts):
+        """Embeddet Texte gebündelt und parallel; fehlgeschlagene Einträge sind None"""
+        # Unveränderte Kursbeschreibungen kommen aus dem Cache
+        vectors, errors = await embed_batched(
+            # Client erst beim ersten Embedding, nicht schon beim Import
+            get_async_openai_client(OPENAI_API_KEY), EMBED_MODEL, texts,
+            max_tokens=EMBED_BATCH_TOKENS, max_items=EMBED_BATCH_SIZE,
+            concurrency=EMBED_CONCURRENCY, cache=get_default_cache(), dim=EMBED_DIM)
+        if errors:
+            logger.error(f"OpenAI Fehler bei {len(errors)} von {len(texts)} Texten")
+        return vectors, errors
 
     async def embed_text(self, text: str):
-        """Erstellt Embedding mit Fehlerbehandlung"""
+        """Erstellt ein einzelnes Embedding; Fehler werden weitergereicht statt Dummy-Vektor"""
+        vectors, errors = await self.embed_texts([text])
+        if errors:
+            raise errors[0]
+        return vectors[0]
+
+    async def _wait_until_idle(self, page):
+        """Wartet auf Netzwerkruhe statt einer festen Pause"""
+        from playwright.async_api import TimeoutError as PlaywrightTimeoutError
         try:
-            response = client.embeddings.create(
-                model="text-embedding-3-small",  # Verwende das kleinere Modell
-                input=text
-            )
-            return response.data[0].embedding
-        except Exception as e:
-            logger.error(f"OpenAI Fehler: {e}")
-            # Fallback: Einfachen Dummy-Vektor zurückgeben
-            return [0.1] * 384  # 384 Dimensionen für text-embedding-3-small
+            await page.wait_for_load_state("networkidle", timeout=WAIT_TIMEOUT)
+        except PlaywrightTimeoutError:
+            logger.debug("Keine Netzwerkruhe erreicht, fahre fort")
 
     async def scrape_search_term(self, term):
-        page = await self.browser.new_page()
-
-        try:
-            logger.info(f"Scraping für Begriff: {term}")
-            await page.goto("https://mein-now.de/weiterbildungssuche/", timeout=60000)
-            await page.wait_for_timeout(3000)
+        """``(kurse, vollständig)`` – nur vollständige Begriffe zählen beim Löschen verschwundener Kurse"""
+        with timed("scrape_term"):
+            if self.api is not None:
+                try:
+                    with timed("scrape_api"):
+                        result = await self.api.search(term)
+                    return result.courses, not result.truncated
+                except Exception as e:
+                    if SCRAPE_MODE == "api":
+                        logger.error(f"Fehler beim API-Abruf von '{term}': {e}")
+                        return [], False
+                    logger.warning(f"API-Abruf von '{term}' fehlgeschlagen ({e}), weiter mit dem Browser")
+            await self.ensure_browser()
+            with timed("scrape_browser"):
+                return await self._scrape_search_term(term)
+
+    async def _scrape_search_term(self, term):
+        from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+        async with self.hosts.slot(SEARCH_URL), self.pages.page() as page:
+            try:
+                logger.info(f"Scraping für Begriff: {term}")
+                await page.goto(SEARCH_URL, timeout=REQUEST_TIMEOUT, wait_until="domcontentloaded")
 
-            # Sucheingabe finden und ausfüllen
-            search_input = await page.query_selector("input[type='search']")
-            if search_input:
+                # Sucheingabe finden und ausfüllen
+                try:
+                    search_input = await page.wait_for_selector("input[type='search']", timeout=WAIT_TIMEOUT)
+                except PlaywrightTimeoutError:
+                    logger.warning("Suchfeld nicht gefunden")
+                    return [], False
                 await search_input.fill(term)
                 await search_input.press("Enter")
-                await page.wait_for_timeout(5000)
-            else:
-                logger.warning("Suchfeld nicht gefunden")
-                return []
-
-            # Mehr Ergebnisse laden
-            for i in range(3):
-                try:
-                    load_more = await page.query_selector("#load_more_angebote")
-                    if load_more and await load_more.is_visible():
+                await self._wait_until_idle(page)
+
+                # Mehr Ergebnisse laden; vollständig nur, wenn der Button am Ende verschwunden ist
+                complete = False
+                for i in range(4):
+                    try:
+                        load_more = await page.query_selector("#load_more_angebote")
+                        if not load_more or not await load_more.is_visible():
+                            complete = True
+                            break
+                        if i == 3:
+                            # Seitenlimit von drei Klicks erreicht, weitere Treffer bleiben liegen
+                            break
+                        before = await page.eval_on_selector_all(ITEM_SELECTOR, "items => items.length")
                         await load_more.click()
-                        await page.wait_for_timeout(3000)
+                        # fertig, sobald neue Einträge im DOM stehen
+                        await page.wait_for_function(
+                            "([selector, count]) => document.querySelectorAll(selector).length > count",
+                            arg=[ITEM_SELECTOR, before], timeout=WAIT_TIMEOUT)
                         logger.info(f"Mehr Ergebnisse geladen ({i + 1}/3)")
-                    else:
+                    except Exception as e:
+                        logger.warning(f"Konnte 'Mehr laden' nicht klicken: {e}")
                         break
-                except Exception as e:
-                    logger.warning(f"Konnte 'Mehr laden' nicht klicken: {e}")
-                    break
-
-            # Kurse extrahieren
-            courses = await page.evaluate("""
-                (searchTerm) => {
-                    const items = document.querySelectorAll('article, [class*="card"], [class*="item"]');
-                    console.log(`Gefundene Elemente: ${items.length}`);
-
-                    return Array.from(items).map((item, index) => {
-                        const titleElem = item.querySelector('h1, h2, h3, [class*="title"]');
-                        const linkElem = item.querySelector('a');
-
-                        return {
-                            id: `course_${Date.now()}_${index}`,
-                            title: titleElem ? titleElem.innerText.trim() : 'Kein Titel',
-                            description: item.innerText.substring(0, 300).trim(),
-                            url: linkElem ? linkElem.href : '',
-                            scraped_at: new Date().toISOString(),
-                            search_term: searchTerm
-                        };
-                    }).filter(course => course.title.length > 5); // Mindestens 5 Zeichen im Titel
-                }
-            """, term)
-
-            logger.info(f"Gefunden: {len(courses)} Kurse für '{term}'")
-            return courses
 
-        except Exception as e:
-            logger.error(f"Fehler beim Scraping von '{term}': {e}")
-            return []
-        finally:
-            await page.close()
+                # Kurse extrahieren
+                courses = await page.evaluate("""
+                    ([searchTerm, selector]) => {
+                        const items = document.querySelectorAll(selector);
+                        console.log(`Gefundene Elemente: ${items.length}`);
+
+                        return Array.from(items).map((item, index) => {
+                            const titleElem = item.querySelector('h1, h2, h3, [class*="title"]');
+                            const linkElem = item.querySelector('a');
+
+                            return {
+                                title: titleElem ? titleElem.innerText.trim() : 'Kein Titel',
+                                description: item.innerText.substring(0, 300).trim(),
+                                url: linkElem ? linkElem.href : '',
+                                scraped_at: new Date().toISOString(),
+                                search_term: searchTerm
+                            };
+                        }).filter(course => course.title.length > 5); // Mindestens 5 Zeichen im Titel
+                    }
+                """, [term, ITEM_SELECTOR])
+
+                logger.info(f"Gefunden: {len(courses)} Kurse für '{term}'")
+                return courses, complete
+
+            except Exception as e:
+                logger.error(f"Fehler beim Scraping von '{term}': {e}")
+                return [], False
 
     def init_qdrant(self):
         """Initialisiert Qdrant Collection"""
         try:
-            collections = self.qdrant.get_collections()
-            collection_names = [col.name for col in collections.collections]
-
-            if self.collection not in collection_names:
-                self.qdrant.create_collection(
-                    collection_name=self.collection,
-                    vectors_config=VectorParams(size=384, distance=Distance.COSINE)
-                )
-                logger.info(f"Collection '{self.collection}' erstellt")
-            else:
-                logger.info(f"Collection '{self.collection}' existiert bereits")
+            # gemeinsames Schema inkl. Payload-Index auf search_term
+            ensure_collection_cached(get_session(), QDRANT_URL, self.collection, EMBED_DIM)
+            logger.info(f"Collection '{self.collection}' bereit ({EMBED_DIM} Dimensionen)")
 
         except Exception as e:
             logger.error(f"Fehler bei Qdrant Initialisierung: {e}")
 
-    async def save_courses(self, courses):
-        """Speichert Kurse in Qdrant"""
+    @staticmethod
+    def identify(course):
+        """Setzt stabile ID und Inhalts-Hash"""
+        course["id"] = course_point_id(course)
+        course["content_hash"] = content_hash(course)
+        return course
+
+    async def upsert_chunk(self, courses):
+        """Embeddet und speichert neue/geänderte Kurse eines Blocks; gibt die Zahl gespeicherter zurück.
+
+        Bleiben Kurse ungespeichert (Embedding- oder Qdrant-Fehler), folgt ``UpsertError`` mit
+        genau diesen Kursen – die übrigen sind dann schon gespeichert und im Manifest.
+        """
+        changed = [c for c in courses if not self.manifest.is_current(c["id"], c["content_hash"])]
+        # das Manifest wirkt wie ein Cache: unverändert = Treffer
+        count_cache("manifest", len(courses) - len(changed), len(changed))
+        if not changed:
+            return 0
+
+        # Embeddings für alle geänderten Kurse in wenigen, parallelen Batches
+        with timed("embed"):
+            vectors, errors = await self.embed_texts(
+                [course_text(course) for course in changed])
+
+        points, failed = [], []
+        for i, (course, vector) in enumerate(zip(changed, vectors)):
+            if vector is None:
+                logger.error(f"Fehler beim Verarbeiten von Kurs {course['id']}: {errors.get(i)}")
+                failed.append(course)
+                continue
+            points.append({"id": course["id"], "vector": vector, "payload": course})
+        if not points:
+            raise UpsertError(f"{len(failed)} Kurse ohne Embedding", failed)
+
+        try:
+            # async, damit das Scraping weiterläuft
+            with qdrant_call("upsert"):
+                await self.qdrant.aupsert(self.collection, points)
+        except Exception as e:
+            raise UpsertError(f"Fehler beim Speichern in Qdrant: {e}", changed) from e
+
+        self.changed += len(points)
+        for point in points:
+            self.manifest.record(point["id"], point["payload"]["content_hash"], point["payload"]["search_term"])
+        try:
+            self.manifest.save()
+        except Exception as e:
+            logger.error(f"Fehler beim Speichern des Manifests: {e}")
+        logger.info(f"{len(points)} von {len(courses)} Kursen neu oder geändert gespeichert")
+        if failed:
+            raise UpsertError(f"{len(failed)} Kurse ohne Embedding", failed)
+        return len(points)
+
+    async def delete_stale(self, seen_ids, complete_terms):
+        """Löscht Kurse, die unter vollständig gescrapten Suchbegriffen nicht mehr auftauchen"""
+        stale = self.manifest.stale(set(seen_ids), set(complete_terms))
+        if not stale:
+            return
+        try:
+            with qdrant_call("delete"):
+                await self.qdrant.adelete(self.collection, stale)
+            self.changed += len(stale)
+            self.manifest.forget(stale)
+            self.manifest.save()
+            logger.info(f"{len(stale)} verschwundene Kurse aus Qdrant gelöscht")
+        except Exception as e:
+            logger.error(f"Fehler beim Löschen aus Qdrant: {e}")
+
+    async def publish_version(self):
+        """Erhöht die Versionsmarke der Collection, falls sich etwas geändert hat"""
+        if not self.changed:
+            return
+        try:
+            await asyncio.to_thread(bump_version, get_session(), QDRANT_URL, self.collection)
+            self.changed = 0
+        except Exception as e:
+            logger.error(f"Fehler beim Setzen der Versionsmarke: {e}")
+
+    async def save_courses(self, courses, complete_terms=()):
+        """Speichert eine fertige Kursliste blockweise in Qdrant und löscht verschwundene.
+
+        Gelöscht wird nur für Suchbegriffe aus ``complete_terms``, also solche,
+        die in diesem Lauf vollständig gescraped wurden.
+        """
         if not courses:
             logger.warning("Keine Kurse zum Speichern")
             return
 
-        points = []
+        # Ein Kurs unter mehreren Suchbegriffen zählt einmal
+        unique = {}
         for course in courses:
+            unique.setdefault(self.identify(course)["id"], course)
+        courses = list(unique.values())
+        for start in range(0, len(courses), UPSERT_CHUNK_SIZE):
             try:
-                # Embedding erstellen
-                vector = await self.embed_text(course["title"] + " " + course["description"])
-
-                points.append(
-                    PointStruct(
-                        id=hash(course["id"]) % (2 ** 63),
-                        vector=vector,
-                        payload=course
-                    )
-                )
-            except Exception as e:
-                logger.error(f"Fehler beim Verarbeiten von Kurs {course['id']}: {e}")
-
-        if points:
+                await self.upsert_chunk(courses[start:start + UPSERT_CHUNK_SIZE])
+            except UpsertError as e:
+                # nicht im Manifest, also auch nicht löschbar – der nächste Lauf versucht es erneut
+                logger.error(f"{e} ({len(e.courses)} Kurse)")
+        await self.delete_stale(unique, complete_terms)
+        await self.publish_version()
+
+    async def consume(self, queue, state):
+        """Speichert Kurse aus der Queue in Blöcken, sobald sie eintreffen.
+
+        Journal und ``seen_ids`` bekommen nur gespeicherte Kurse. Ein Begriff mit
+        ungespeicherten Kursen wird nicht als erledigt markiert – ein fortgesetzter Lauf
+        holt ihn erneut, und er zählt nicht beim Löschen verschwundener Kurse.
+        """
+        terms_of = {}     # Kurs-ID → alle Suchbegriffe, unter denen er auftauchte
+        failed_ids = set()
+        chunk = []
+        total = 0
+
+        async def flush():
+            nonlocal chunk
+            if not chunk:
+                return
+            stored = chunk
             try:
-                self.qdrant.upsert(
-                    collection_name=self.collection,
-                    points=points,
-                    wait=True
-                )
-                logger.info(f"{len(points)} Kurse in Qdrant gespeichert")
-            except Exception as e:
-                logger.error(f"Fehler beim Speichern in Qdrant: {e}")
-
-        # Zusätzlich als JSON speichern
-        try:
-            with open("/app/courses.json", "w", encoding="utf-8") as f:
-                json.dump(courses, f, ensure_ascii=False, indent=2)
-            logger.info(f"{len(courses)} Kurse in courses.json gespeichert")
-        except Exception as e:
-            logger.error(f"Fehler beim JSON-Speichern: {e}")
+                await self.upsert_chunk(chunk)
+            except UpsertError as e:
+                logger.error(f"{e} ({len(e.courses)} Kurse)")
+                failed = {c["id"] for c in e.courses}
+                failed_ids.update(failed)
+                stored = [c for c in chunk if c["id"] not in failed]
+            state.append(stored)
+            state.seen_ids.update(c["id"] for c in stored)
+            chunk = []
+
+        while True:
+            item = await queue.get()
+            if item is None:
+                await flush()
+                return total
+            if isinstance(item, TermDone):
+                # erst alles vom Begriff speichern, dann als erledigt markieren
+                await flush()
+                if any(item.term in terms_of[pid] for pid in failed_ids):
+                    logger.warning(f"'{item.term}' nicht vollständig gespeichert, bleibt offen")
+                else:
+                    state.mark_done(item.term, item.count, item.complete)
+                continue
+            course = self.identify(item)
+            if course["id"] in terms_of:
+                terms_of[course["id"]].add(course["search_term"])
+                continue
+            terms_of[course["id"]] = {course["search_term"]}
+            chunk.append(course)
+            total += 1
+            if len(chunk) >= UPSERT_CHUNK_SIZE:
+                await flush()
 
     async def run(self):
         """Hauptfunktion"""
         try:
-            await self.init_browser()
+            self.init_api()
+            if self.api is None:
+                await self.init_browser()
             self.init_qdrant()
 
-            all_courses = []
-            for term in SEARCH_TERMS:
-                courses = await self.scrape_search_term(term)
-                all_courses.extend(courses)
-                await asyncio.sleep(2)  # Pause zwischen Requests
+            state = RunCheckpoint(CHECKPOINT_PATH, JOURNAL_PATH)
+            if state.resumed:
+                logger.info(f"Setze Lauf fort: {len(state.done_terms)} Suchbegriffe bereits erledigt")
+            terms = [term for term in SEARCH_TERMS if term not in state.done_terms]
+
+            # Scrapen und Speichern laufen gleichzeitig; die Queue bremst die Scraper
+            queue = asyncio.Queue(maxsize=QUEUE_SIZE)
 
-            await self.save_courses(all_courses)
-            logger.info(f"SCRAPING ABGESCHLOSSEN: {len(all_courses)} Kurse gesammelt")
+            async def produce(term):
+                courses, complete = await self.scrape_search_term(term)
+                for course in courses:
+                    await queue.put(course)
+                await queue.put(TermDone(term, len(courses), complete))
+
+            consumer = asyncio.create_task(self.consume(queue, state))
+            try:
+                # Suchbegriffe parallel; Pool und HostLimiter begrenzen die Last
+                await asyncio.gather(*(produce(term) for term in terms))
+                await queue.put(None)
+                total = await consumer
+            finally:
+                consumer.cancel()
+                state.close()
+
+            # leere oder abgeschnittene Ergebnisse zählen nicht, damit nichts fälschlich gelöscht wird
+            await self.delete_stale(state.seen_ids, state.complete_terms())
+            await self.publish_version()
+            state.finish()
+            logger.info(f"SCRAPING ABGESCHLOSSEN: {total} Kurse gesammelt")
 
         except Exception as e:
             logger.error(f"Kritischer Fehler: {e}")
         finally:
+            if self.api is not None:
+                await self.api.close()
+                logger.info(f"Such-API: {self.api.requests} Requests")
+            if hasattr(self, 'pages'):
+                await self.pages.close()
             if hasattr(self, 'browser'):
                 await self.browser.close()
-            logger.info("Browser geschlossen")
+            if hasattr(self, 'playwright'):
+                await self.playwright.stop()
+                logger.info("Browser geschlossen")
+            self.report_metrics()
+
+    @staticmethod
+    def report_metrics():
+        """Zusammenfassung ins Log; mit METRICS_TEXTFILE zusätzlich für den Textfile-Collector"""
+        logger.info("Metriken des Laufs:\n" + metrics.summary())
+        try:
+            metrics.write_textfile()
+        except OSError as e:
+            logger.error(f"Metriken nicht geschrieben: {e}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,184 @@
+"""Browserloser Abruf der Weiterbildungssuche über die JSON-API, die auch die Suchseite aufruft.
+
+Die Suchseite lädt ihre Treffer per fetch nach. Dieselbe Schnittstelle liefert strukturierte
+Felder und alle Seiten, ohne Chromium und ohne das Limit von drei "Mehr laden"-Klicks.
+Endpunkt, Parameter und Feldnamen sind konfigurierbar (Browser-DevTools → Netzwerk → Fetch/XHR).
+
+Mit ``record_path`` wird jede Antwort als JSONL-Zeile mitgeschrieben; ``benchmarks/stubs.py
+--replay`` spielt solche Aufnahmen wieder ab.
+"""
+import asyncio
+import html
+import json
+import logging
+import math
+import random
+import re
+from collections import namedtuple
+from datetime import datetime
+from urllib.parse import urljoin, urlsplit
+
+import httpx
+
+from page_pool import HostLimiter
+
+logger = logging.getLogger(__name__)
+
+# Kursfeld → Pfad im API-Eintrag (Punkt-getrennt, Listen werden mit ", " verbunden)
+DEFAULT_FIELDS = {
+    "title": "title", "description": "description", "url": "url",
+    "provider": "provider", "location": "location", "start_date": "start_date",
+    "duration": "duration", "format": "format", "price": "price",
+}
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+# ``truncated``: bei ``max_pages`` abgebrochen, es gibt weitere Treffer
+SearchResult = namedtuple("SearchResult", "courses truncated")
+
+_TAG = re.compile(r"<[^>]+>")
+
+
+class SearchApiError(RuntimeError):
+    """Antwort passt nicht zur konfigurierten Struktur – Anlass für den Browser-Fallback"""
+
+
+def lookup(data, path):
+    """Wert unter ``a.b.c``; fehlt ein Schritt, ``None``"""
+    for key in path.split(".") if path else ():
+        if isinstance(data, dict):
+            data = data.get(key)
+        elif isinstance(data, list) and key.isdigit() and int(key) < len(data):
+            data = data[int(key)]
+        else:
+            return None
+    return data
+
+
+def clean_text(value):
+    """Skalar oder Liste als einzeiliger Text; HTML-Tags und Entities aus der API entfernt"""
+    if value is None or isinstance(value, dict):
+        return ""
+    if isinstance(value, list):
+        return ", ".join(t for t in (clean_text(v) for v in value) if t)
+    text = html.unescape(_TAG.sub(" ", str(value)))
+    return " ".join(text.split())
+
+
+class SearchApi:
+    def __init__(self, url, base_url=None, term_param="sw", page_param="page", first_page=0,
+                 items="items", more="more", total="", fields=None, max_pages=200, max_description=1000,
+                 concurrency=4, min_interval=0.0, timeout=30.0, retries=3, record_path=""):
+        self.url = url
+        self.base_url = base_url or url
+        self.term_param = term_param
+        self.page_param = page_param
+        self.first_page = first_page
+        self.items_path = items
+        self.more_path = more
+        self.total_path = total
+        self.fields = fields or DEFAULT_FIELDS
+        self.max_pages = max_pages
+        self.max_description = max_description
+        self.retries = retries
+        self.record_path = record_path
+        # ein Keep-Alive-Pool für alle Suchbegriffe; der HostLimiter hält den Abstand pro Host
+        self.client = httpx.AsyncClient(
+            timeout=timeout, follow_redirects=True,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+            headers={"Accept": "application/json", "User-Agent": "educhat-scraper/1.0"})
+        self.hosts = HostLimiter(per_host=concurrency, min_interval=min_interval)
+        self.requests = 0
+
+    async def close(self):
+        await self.client.aclose()
+
+    async def fetch_page(self, term, page):
+        params = {self.term_param: term, self.page_param: page}
+        for attempt in range(self.retries + 1):
+            async with self.hosts.slot(self.url):
+                r = await self.client.get(self.url, params=params)
+            self.requests += 1
+            if r.status_code in RETRY_STATUS and attempt < self.retries:
+                retry_after = r.headers.get("Retry-After", "")
+                delay = float(retry_after) if retry_after.isdigit() else random.uniform(0, 0.5 * 2 ** attempt)
+                logger.warning(f"Such-API {r.status_code} für '{term}' Seite {page}, neuer Versuch in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            r.raise_for_status()
+            try:
+                data = r.json()
+            except ValueError as e:
+                raise SearchApiError(f"Keine JSON-Antwort von {self.url}: {e}")
+            self._record(params, r.status_code, data)
+            return data
+
+    def _record(self, params, status, data):
+        if not self.record_path:
+            return
+        with open(self.record_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"path": urlsplit(self.url).path, "params": {k: str(v) for k, v in params.items()},
+                                "status": status, "body": data}, ensure_ascii=False) + "\n")
+
+    def _items(self, data):
+        items = lookup(data, self.items_path)
+        if not isinstance(items, list):
+            raise SearchApiError(f"Keine Trefferliste unter '{self.items_path}'")
+        return items
+
+    def parse_item(self, item, term, scraped_at):
+        course = {}
+        for field, path in self.fields.items():
+            value = clean_text(lookup(item, path))
+            if value:
+                course[field] = value
+        course.setdefault("title", "Kein Titel")
+        course["description"] = course.get("description", "")[:self.max_description]
+        # wie im Browser: absolute Links, damit die Kurs-ID zur URL passt
+        course["url"] = urljoin(self.base_url, course["url"]) if course.get("url") else ""
+        course["scraped_at"] = scraped_at
+        course["search_term"] = term
+        return course
+
+    def parse(self, items, term):
+        scraped_at = datetime.now().isoformat()
+        courses = [self.parse_item(item, term, scraped_at) for item in items if isinstance(item, dict)]
+        # gleiche Mindestlänge wie beim DOM-Scraping
+        return [c for c in courses if len(c["title"]) > 5]
+
+    def _has_more(self, data, items):
+        if self.more_path:
+            return bool(lookup(data, self.more_path))
+        return bool(items)
+
+    async def search(self, term):
+        """Alle Treffer eines Suchbegriffs als ``SearchResult``.
+
+        Nennt die API die Gesamtzahl (``total``), werden die restlichen Seiten parallel
+        geholt, sonst nacheinander, bis ``more`` falsch oder eine Seite leer ist. Ein bei
+        ``max_pages`` abgeschnittener Begriff ist nicht vollständig – fehlende Kurse dürfen
+        dann nicht als verschwunden gelten.
+        """
+        first = await self.fetch_page(term, self.first_page)
+        items = self._items(first)
+        pages = [items]
+        total = lookup(first, self.total_path)
+        if isinstance(total, (int, float)) and items:
+            count = min(math.ceil(total / len(items)), self.max_pages)
+            rest = await asyncio.gather(*(self.fetch_page(term, self.first_page + i) for i in range(1, count)))
+            pages.extend(self._items(data) for data in rest)
+            truncated = count * len(items) < total
+        else:
+            data, page = first, self.first_page
+            while self._has_more(data, pages[-1]) and len(pages) < self.max_pages:
+                page += 1
+                data = await self.fetch_page(term, page)
+                pages.append(self._items(data))
+                if not pages[-1]:
+                    break
+            truncated = len(pages) >= self.max_pages and self._has_more(data, pages[-1])
+        if truncated:
+            logger.warning(f"'{term}': nach {self.max_pages} Seiten abgebrochen, weitere Treffer vorhanden")
+
+        courses = self.parse([item for page_items in pages for item in page_items], term)
+        logger.info(f"Gefunden: {len(courses)} Kurse für '{term}' ({len(pages)} Seiten über die API)")
+        return SearchResult(courses, truncated)
@@ -0,0 +1,12 @@
+"""Gemeinsame Pfade: die Dienste sind keine Pakete, sondern Skripte neben educhat-common."""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in ("educhat-common", "educhat-embed-chat/app", "educhat-scraper/app", "benchmarks"):
+    sys.path.insert(0, os.path.join(ROOT, path))
+
+# ohne Datei-Cache und lokale Indizes: Tests sollen nichts unter ~ anlegen
+os.environ.setdefault("EMBED_CACHE_PATH", "")
+os.environ.setdefault("LEXICAL_INDEX_PATH", "")
+os.environ.setdefault("LOCAL_INDEX_PATH", "")
@@ -0,0 +1,61 @@
+import time
+
+import pytest
+
+from answer_cache import AnswerCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    return now
+
+
+def test_similar_question_with_same_hits_is_a_hit():
+    cache = AnswerCache(threshold=0.95)
+    cache.store([1.0, 0.0], ["a", "b"], "v1", "Antwort")
+
+    assert cache.lookup([0.99, 0.05], ["a", "b"], "v1") == "Antwort"
+    assert cache.lookup([0.6, 0.8], ["a", "b"], "v1") is None
+    assert cache.lookup([1.0, 0.0], ["b", "a"], "v1") is None
+
+
+def test_best_match_wins():
+    cache = AnswerCache(threshold=0.9)
+    cache.store([1.0, 0.1], ["a"], "v1", "nah")
+    cache.store([1.0, 0.0], ["a"], "v1", "genau")
+
+    assert cache.lookup([1.0, 0.0], ["a"], "v1") == "genau"
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = AnswerCache(ttl=60)
+    cache.store([1.0], ["a"], "v1", "Antwort")
+
+    clock[0] += 59
+    assert cache.lookup([1.0], ["a"], "v1") == "Antwort"
+    clock[0] += 2
+    assert cache.lookup([1.0], ["a"], "v1") is None
+    assert cache._size == 0
+
+
+def test_new_version_drops_everything():
+    cache = AnswerCache()
+    cache.store([1.0], ["a"], "v1", "alt")
+
+    assert cache.lookup([1.0], ["a"], "v2") is None
+    assert cache.lookup([1.0], ["a"], "v1") is None
+
+
+def test_least_recently_used_bucket_is_evicted():
+    cache = AnswerCache(max_entries=2)
+    cache.store([1.0], ["a"], "v1", "A")
+    cache.store([1.0], ["b"], "v1", "B")
+    assert cache.lookup([1.0], ["a"], "v1") == "A"
+
+    cache.store([1.0], ["c"], "v1", "C")
+
+    assert cache.lookup([1.0], ["b"], "v1") is None
+    assert cache.lookup([1.0], ["a"], "v1") == "A"
+    assert cache.lookup([1.0], ["c"], "v1") == "C"
@@ -0,0 +1,65 @@
+from types import SimpleNamespace
+
+import pytest
+
+import educhat_agent as agent
+from answer_cache import AnswerCache
+from session_store import Session
+
+
+class FakeOpenAI:
+    """Nur chat.completions.create, zählt die Aufrufe"""
+
+    def __init__(self):
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **request):
+        self.calls += 1
+        usage = SimpleNamespace(prompt_tokens=50, completion_tokens=10, total_tokens=60)
+        message = SimpleNamespace(content=f"Laut [1] passt Antwort {self.calls}.")
+        return SimpleNamespace(usage=usage, choices=[SimpleNamespace(message=message)])
+
+
+def hits(*ids):
+    return [{"id": pid, "score": 0.9, "payload": {"title": f"Kurs {pid}", "content": f"Inhalt von Kurs {pid}.",
+                                                  "doc_id": f"doc-{pid}", "chunk_id": 1}} for pid in ids]
+
+
+@pytest.fixture
+def openai(monkeypatch):
+    client = FakeOpenAI()
+    monkeypatch.setattr(agent, "ANSWER_CACHE", AnswerCache(threshold=0.95))
+    monkeypatch.setattr(agent, "ANSWER_CACHE_THRESHOLD", 0.95)
+    monkeypatch.setattr(agent, "collection_version", lambda: "v1")
+    monkeypatch.setattr(agent, "get_openai_client", lambda key: client)
+    return client
+
+
+def ask(session, question, vector, found):
+    follow_up = session.is_follow_up(question)
+    answer = agent.answer_from_hits_improved(found, question, vector=vector, history=session.render(),
+                                             follow_up=follow_up)
+    session.add_turn(question, answer)
+    return answer
+
+
+def test_unrelated_question_in_session_uses_answer_cache(openai):
+    excel = "Welche Excel Kurse für Fortgeschrittene mit Zertifikat gibt es online"
+    first = ask(Session("a"), excel, [1.0, 0.0, 0.0], hits(7, 8))
+
+    session = Session("b")
+    ask(session, "Welche Python Kurse gibt es abends in Berlin", [0.0, 1.0, 0.0], hits(1, 2))
+    assert openai.calls == 2
+    assert not session.is_follow_up(excel)
+    # eigenständige Frage mit Verlauf: Treffer aus Session a
+    assert ask(session, excel, [0.999, 0.01, 0.0], hits(7, 8)) == first
+    assert openai.calls == 2
+
+
+def test_follow_up_skips_answer_cache(openai):
+    session = Session("c")
+    ask(session, "Welche Python Kurse gibt es abends in Berlin", [0.0, 1.0, 0.0], hits(1, 2))
+    assert session.is_follow_up("Und in Hamburg?")
+    ask(session, "Und in Hamburg?", [0.0, 1.0, 0.0], hits(1, 2))
+    assert openai.calls == 2
@@ -0,0 +1,69 @@
+import asyncio
+
+import httpx
+import pytest
+
+from educhat_common import collection_version
+
+QDRANT = "http://qdrant:6333"
+
+
+@pytest.fixture(autouse=True)
+def fresh_meta(monkeypatch):
+    monkeypatch.setattr(collection_version, "_meta_ready", set())
+
+
+class FakeSession:
+    """Antwortet auf GET/PUT der Meta-Collection mit festen Statuscodes"""
+
+    def __init__(self, get_status, create_status=200):
+        self.statuses = {"GET": get_status, "CREATE": create_status}
+        self.calls = []
+
+    def _respond(self, method, url):
+        kind = "CREATE" if method == "PUT" and url.endswith(collection_version.META_COLLECTION) else method
+        self.calls.append(kind)
+        return httpx.Response(self.statuses.get(kind, 200), request=httpx.Request(method, url))
+
+    def get(self, url, **kwargs):
+        return self._respond("GET", url)
+
+    def put(self, url, **kwargs):
+        return self._respond("PUT", url)
+
+
+@pytest.mark.parametrize("get_status, create_status", [(200, None), (404, 200), (404, 409)])
+def test_meta_ready_after_success(get_status, create_status):
+    session = FakeSession(get_status, create_status)
+    collection_version.bump_version(session, QDRANT, "kurse")
+    collection_version.bump_version(session, QDRANT, "kurse")
+
+    assert QDRANT in collection_version._meta_ready
+    assert session.calls.count("GET") == 1
+
+
+@pytest.mark.parametrize("get_status, create_status", [(503, None), (404, 500)])
+def test_meta_not_ready_after_failure(get_status, create_status):
+    session = FakeSession(get_status, create_status)
+    with pytest.raises(httpx.HTTPStatusError):
+        collection_version.bump_version(session, QDRANT, "kurse")
+
+    assert QDRANT not in collection_version._meta_ready
+    assert "PUT" not in session.calls
+
+
+def test_async_bump_retries_meta_after_failed_create():
+    statuses = iter([404, 500, 404, 200, 200])
+
+    def handler(request):
+        return httpx.Response(next(statuses))
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            with pytest.raises(httpx.HTTPStatusError):
+                await collection_version.abump_version(client, QDRANT, "kurse")
+            assert QDRANT not in collection_version._meta_ready
+            await collection_version.abump_version(client, QDRANT, "kurse")
+
+    asyncio.run(run())
+    assert QDRANT in collection_version._meta_ready
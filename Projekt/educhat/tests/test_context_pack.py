@@ -0,0 +1,82 @@
+from context_pack import collapse_duplicates, format_context, merge_adjacent, pack_context
+from educhat_common.tokens import count_tokens
+
+TEXTS = {
+    "excel": "Excel für Fortgeschrittene: Pivot-Tabellen, SVERWEIS und Makros in zwölf Abenden.",
+    "python": "Python Grundlagen mit Übungen zu Listen, Schleifen und Funktionen für Einsteiger.",
+    "pflege": "Pflegeassistenz in Teilzeit mit Praktikum im Krankenhaus und staatlicher Prüfung.",
+}
+
+
+def hit(hit_id, score, content, **payload):
+    return {"id": hit_id, "score": score, "payload": dict(payload, content=content, title=f"Titel {hit_id}")}
+
+
+def ids(hits):
+    return [h["id"] for h in hits]
+
+
+def test_exact_duplicates_keep_best_score():
+    hits = [hit(1, 0.5, TEXTS["excel"], url="https://a/1"),
+            hit(2, 0.9, "  " + TEXTS["excel"].upper(), url="https://a/2"),
+            hit(3, 0.7, TEXTS["python"], url="https://a/2"),
+            hit(4, 0.6, TEXTS["pflege"], doc_id="d", chunk_id=0),
+            hit(5, 0.8, TEXTS["python"] + " Neu", doc_id="d", chunk_id=0)]
+
+    assert ids(collapse_duplicates(hits, similarity=1)) == [2, 5]
+
+
+def test_near_duplicates_collapse_by_similarity():
+    hits = [hit(1, 0.9, TEXTS["excel"]),
+            hit(2, 0.8, TEXTS["excel"].replace("zwölf", "zehn")),
+            hit(3, 0.7, TEXTS["python"])]
+
+    assert ids(collapse_duplicates(hits, similarity=0.8)) == [1, 3]
+    assert ids(collapse_duplicates(hits, similarity=1)) == [1, 2, 3]
+
+
+def test_adjacent_chunks_merge_in_order():
+    hits = [hit(1, 0.9, "zweiter Teil", doc_id="d", chunk_id=1),
+            hit(2, 0.8, TEXTS["python"]),
+            hit(3, 0.7, "erster Teil", doc_id="d", chunk_id=0),
+            hit(4, 0.6, "weit weg", doc_id="d", chunk_id=5)]
+
+    passages = merge_adjacent(hits)
+
+    assert [p["ids"] for p in passages] == [[1, 3], [2], [4]]
+    assert passages[0]["content"] == "erster Teil\nzweiter Teil"
+    assert passages[0]["score"] == 0.9
+
+
+def test_pack_context_respects_source_limit_and_budget():
+    hits = [hit(i, 1 - i / 10, f"{text} Kurs {i}") for i, text in enumerate(TEXTS.values())]
+
+    assert len(pack_context(hits, budget_tokens=10000, max_sources=2)) == 2
+
+    packed = pack_context(hits, budget_tokens=10000)
+    assert [p["ids"] for p in packed] == [[0], [1], [2]]
+    assert all(p["tokens"] == count_tokens(f"[Quelle {i} - {p['title']}]: ", "gpt-4o-mini")
+               + count_tokens(p["content"], "gpt-4o-mini") for i, p in enumerate(packed, 1))
+    assert format_context(packed).startswith("[Quelle 1 - Titel 0]: ")
+
+
+def test_pack_context_truncates_last_passage_into_budget():
+    long_text = " ".join(f"Satz {i} über Weiterbildung in der Region." for i in range(200))
+    hits = [hit(1, 0.9, TEXTS["excel"]), hit(2, 0.8, long_text)]
+    budget = 150
+
+    packed = pack_context(hits, budget_tokens=budget, min_tokens=20)
+
+    assert len(packed) == 2
+    assert packed[1]["content"].endswith(" …")
+    assert sum(p["tokens"] for p in packed) <= budget
+
+
+def test_pack_context_skips_passage_when_too_little_room():
+    long_text = " ".join(f"Satz {i} über Weiterbildung." for i in range(200))
+    hits = [hit(1, 0.9, TEXTS["excel"]), hit(2, 0.8, long_text)]
+    first = count_tokens("[Quelle 1 - Titel 1]: " + TEXTS["excel"], "gpt-4o-mini")
+
+    packed = pack_context(hits, budget_tokens=first + 30, min_tokens=60)
+
+    assert [p["ids"] for p in packed] == [[1]]
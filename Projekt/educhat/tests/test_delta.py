@@ -0,0 +1,25 @@
+from delta import Manifest
+
+
+def test_manifest_stale_only_for_given_terms(tmp_path):
+    manifest = Manifest(str(tmp_path / "manifest.json"))
+    for pid, term in [("a", "excel"), ("b", "excel"), ("c", "python"), ("d", None)]:
+        manifest.record(pid, "hash", term)
+
+    assert manifest.stale({"a"}, {"excel"}) == ["b"]
+    assert sorted(manifest.stale(set(), {"excel", "python"})) == ["a", "b", "c"]
+    assert manifest.stale(set(), set()) == []
+
+
+def test_manifest_round_trip(tmp_path):
+    path = str(tmp_path / "state" / "manifest.json")
+    manifest = Manifest(path)
+    manifest.record("a", "h1", "excel")
+    manifest.record("b", "h2", "excel")
+    manifest.forget(["b"])
+    manifest.save()
+
+    loaded = Manifest(path)
+    assert loaded.is_current("a", "h1")
+    assert not loaded.is_current("a", "h2")
+    assert not loaded.is_current("b", "h2")
@@ -0,0 +1,23 @@
+import pytest
+
+from educhat_common.lexical_index import rrf_fuse
+
+
+def test_rrf_prefers_hits_in_both_rankings():
+    dense = [{"id": "a", "score": 0.9}, {"id": "b", "score": 0.8}, {"id": "c", "score": 0.7}]
+    lexical = [{"id": "c", "coverage": 1.0}, {"id": "d", "coverage": 0.5}]
+
+    fused = rrf_fuse([dense, lexical], limit=3, k=60)
+
+    assert [h["id"] for h in fused] == ["c", "a", "b"]
+    assert fused[0]["rrf"] == pytest.approx(1 / 63 + 1 / 61)
+    assert fused[0]["score"] == 0.7 and fused[0]["coverage"] == 1.0
+    assert "coverage" not in fused[1]
+
+
+def test_rrf_keeps_best_score_and_lexical_only_hits():
+    fused = rrf_fuse([[{"id": "a", "score": 0.4}], [{"id": "a", "score": 0.6}], [{"id": "b", "coverage": 0.2}]])
+
+    assert fused[0]["id"] == "a" and fused[0]["score"] == 0.6
+    assert fused[1] == {"id": "b", "coverage": 0.2, "rrf": pytest.approx(1 / 61)}
+    assert rrf_fuse([]) == []
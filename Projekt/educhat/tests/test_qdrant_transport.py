@@ -0,0 +1,91 @@
+import asyncio
+import uuid
+
+import numpy as np
+import pytest
+
+pytest.importorskip("grpc")
+pytest.importorskip("qdrant_client")
+
+from educhat_common.qdrant_transport import GrpcTransport, grpc_target  # noqa: E402
+
+POINT_ID = str(uuid.uuid4())
+
+
+@pytest.fixture
+def transport():
+    t = GrpcTransport("http://qdrant:6333")
+    yield t
+    t.close()
+
+
+def test_grpc_target_defaults_to_rest_host():
+    assert grpc_target("http://qdrant:6333", grpc_url="") == "qdrant:6334"
+    assert grpc_target("http://qdrant:6333", grpc_url="grpc://other:7000") == "other:7000"
+
+
+def test_search_body_maps_to_search_points(transport):
+    body = {"vector": np.array([0.5, 0.25], dtype=np.float32), "limit": 5, "with_payload": {"include": ["title"]},
+            "score_threshold": 0.3, "params": {"hnsw_ef": 64, "quantization": {"rescore": True, "oversampling": 2.0}},
+            "filter": {"must": [{"key": "search_term", "match": {"any": ["excel", "python"]}}],
+                       "must_not": [{"key": "year", "match": {"value": 2020}}],
+                       "should": [{"key": "online", "match": {"value": True}}]}}
+    request = transport._search_points("weiterbildungen", body)
+
+    assert request.collection_name == "weiterbildungen"
+    assert list(request.vector) == [0.5, 0.25]
+    assert request.limit == 5
+    assert request.score_threshold == pytest.approx(0.3)
+    assert list(request.with_payload.include.fields) == ["title"]
+    assert not request.with_vectors.enable
+    assert request.params.hnsw_ef == 64
+    assert request.params.quantization.rescore
+    assert request.params.quantization.oversampling == 2.0
+
+    must = request.filter.must[0].field
+    assert must.key == "search_term" and list(must.match.keywords.strings) == ["excel", "python"]
+    assert request.filter.must_not[0].field.match.integer == 2020
+    assert request.filter.should[0].field.match.boolean is True
+
+
+def test_search_without_filter_or_threshold(transport):
+    request = transport._search_points("c", {"vector": [1.0], "limit": 3})
+
+    assert not request.HasField("filter")
+    assert not request.HasField("score_threshold")
+    assert request.with_payload.enable
+
+
+def test_upsert_and_delete_map_ids_and_payload(transport):
+    points = [{"id": POINT_ID, "vector": [0.1, 0.2], "payload": {"title": "Excel", "tags": ["a"]}},
+              {"id": 7, "vector": np.array([0.3, 0.4])}]
+    request = transport._upsert_points("c", points, wait=True)
+
+    assert request.wait
+    assert request.points[0].id.uuid == POINT_ID
+    assert request.points[1].id.num == 7
+    assert list(request.points[0].vectors.vector.data) == pytest.approx([0.1, 0.2])
+    assert transport._from_payload(request.points[0].payload) == {"title": "Excel", "tags": ["a"]}
+
+    delete = transport._delete_points("c", [POINT_ID, 7], wait=False)
+    assert not delete.wait
+    assert [i.WhichOneof("point_id_options") for i in delete.points.points.ids] == ["uuid", "num"]
+
+
+def test_hit_maps_back_to_rest_format(transport):
+    pb = transport.pb
+    point = pb.ScoredPoint(id=pb.PointId(uuid=POINT_ID), score=0.9, version=2,
+                           payload=transport._to_payload({"title": "Excel"}))
+
+    assert transport._hit(point) == {"id": POINT_ID, "version": 2, "score": pytest.approx(0.9),
+                                     "payload": {"title": "Excel"}}
+
+
+def test_async_stub_per_event_loop(transport):
+    async def stub():
+        first = transport._async_stub()
+        assert transport._async_stub() is first
+        return first
+
+    # jeder asyncio.run hat einen eigenen Loop und braucht einen eigenen aio-Kanal
+    assert asyncio.run(stub()) is not asyncio.run(stub())
@@ -0,0 +1,80 @@
+import asyncio
+
+from checkpoint import RunCheckpoint
+from delta import Manifest
+from scraper import TermDone, UpsertError, WeiterbildungScraper
+
+
+def course(term, n):
+    return {"title": f"Kurs {n}", "description": "Beschreibung", "url": f"https://kurse.example/{n}",
+            "search_term": term}
+
+
+def consume(items, fail_ids, tmp_path):
+    """Läuft ``consume`` mit einem Upsert, der für Kurse in ``fail_ids`` (URL-Nummer) scheitert"""
+    scraper = WeiterbildungScraper.__new__(WeiterbildungScraper)
+    failing = {WeiterbildungScraper.identify(course("", n))["id"] for n in fail_ids}
+
+    async def upsert_chunk(courses):
+        failed = [c for c in courses if c["id"] in failing]
+        if failed:
+            raise UpsertError("Fehler beim Speichern in Qdrant", failed)
+        return len(courses)
+
+    scraper.upsert_chunk = upsert_chunk
+    state = RunCheckpoint(str(tmp_path / "checkpoint.json"), str(tmp_path / "courses.jsonl"))
+
+    async def run():
+        queue = asyncio.Queue()
+        for item in items + [None]:
+            queue.put_nowait(item)
+        await scraper.consume(queue, state)
+
+    asyncio.run(run())
+    return state
+
+
+def test_failed_upsert_is_not_journaled_and_term_stays_open(tmp_path):
+    items = [course("excel", 1), course("excel", 2), TermDone("excel", 2, True),
+             course("python", 3), TermDone("python", 1, True)]
+    state = consume(items, fail_ids=[2], tmp_path=tmp_path)
+
+    assert list(state.done_terms) == ["python"]
+    assert state.complete_terms() == ["python"]
+    assert len(state.seen_ids) == 2
+    state.close()
+    journal = (tmp_path / "courses.jsonl").read_text(encoding="utf-8").splitlines()
+    assert len(journal) == 2
+
+
+def test_duplicate_of_failed_course_keeps_its_other_term_open(tmp_path):
+    items = [course("excel", 1), TermDone("excel", 1, True),
+             course("office", 1), course("office", 4), TermDone("office", 2, True)]
+    state = consume(items, fail_ids=[1], tmp_path=tmp_path)
+
+    assert state.done_terms == {}
+    assert len(state.seen_ids) == 1
+    state.close()
+
+
+def test_delete_stale_uses_async_delete(tmp_path):
+    deleted = []
+
+    class Qdrant:
+        async def adelete(self, collection, ids):
+            deleted.extend(ids)
+
+        def delete(self, collection, ids):
+            raise AssertionError("blockierendes delete im Event-Loop")
+
+    scraper = WeiterbildungScraper.__new__(WeiterbildungScraper)
+    scraper.qdrant, scraper.collection, scraper.changed = Qdrant(), "weiterbildungen", 0
+    scraper.manifest = Manifest(str(tmp_path / "manifest.json"))
+    for pid, term in [("a", "excel"), ("b", "excel"), ("c", "python")]:
+        scraper.manifest.record(pid, "hash", term)
+
+    asyncio.run(scraper.delete_stale({"a"}, ["excel"]))
+
+    assert deleted == ["b"]
+    assert scraper.changed == 1
+    assert set(Manifest(scraper.manifest.path).entries) == {"a", "c"}
@@ -0,0 +1,75 @@
+import asyncio
+
+import httpx
+import pytest
+
+from checkpoint import RunCheckpoint
+from search_api import SearchApi
+
+
+def fixture_api(pages, per_page=5, total=True, max_pages=200):
+    """Such-API mit ``pages`` Seiten à ``per_page`` Kursen; zählt die abgerufenen Seiten"""
+    fetched = []
+
+    def handler(request):
+        page = int(request.url.params["page"])
+        fetched.append(page)
+        items = [{"title": f"Kurs {page}-{i} Weiterbildung", "url": f"/kurs/{page}-{i}"}
+                 for i in range(per_page)] if page < pages else []
+        body = {"items": items, "more": page + 1 < pages}
+        if total:
+            body["total"] = pages * per_page
+        return httpx.Response(200, json=body)
+
+    api = SearchApi("https://kurse.example/api/search", total="total" if total else "", max_pages=max_pages)
+    api.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return api, fetched
+
+
+def search(api, term="python"):
+    async def run():
+        try:
+            return await api.search(term)
+        finally:
+            await api.close()
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("total", [True, False])
+def test_all_pages_within_cap(total):
+    api, fetched = fixture_api(pages=4, total=total)
+    result = search(api)
+    assert len(result.courses) == 20
+    assert not result.truncated
+    assert sorted(set(fetched)) == [0, 1, 2, 3]
+
+
+@pytest.mark.parametrize("total", [True, False])
+def test_more_pages_than_cap_is_truncated(total):
+    api, fetched = fixture_api(pages=7, total=total, max_pages=3)
+    result = search(api)
+    assert len(result.courses) == 15
+    assert result.truncated
+    assert max(fetched) == 2
+
+
+def test_parsed_courses_have_absolute_urls_and_term():
+    api, _ = fixture_api(pages=1)
+    course = search(api, "excel").courses[0]
+    assert course["url"] == "https://kurse.example/kurs/0-0"
+    assert course["search_term"] == "excel"
+
+
+def test_truncated_term_is_done_but_not_complete(tmp_path):
+    state = RunCheckpoint(str(tmp_path / "checkpoint.json"), str(tmp_path / "courses.jsonl"))
+    state.mark_done("python", 15, complete=False)
+    state.mark_done("excel", 20)
+    state.mark_done("leer", 0)
+    assert state.complete_terms() == ["excel"]
+    state.close()
+
+    # nach einem Neustart bleibt der Begriff erledigt, aber unvollständig
+    resumed = RunCheckpoint(str(tmp_path / "checkpoint.json"), str(tmp_path / "courses.jsonl"))
+    assert set(resumed.done_terms) == {"python", "excel", "leer"}
+    assert resumed.complete_terms() == ["excel"]
+    resumed.close()
@@ -0,0 +1,108 @@
+import time
+
+import pytest
+
+from educhat_common.tokens import count_tokens
+from session_store import Session, SessionStore
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    return now
+
+
+def turn_tokens(question, answer):
+    return count_tokens(f"Nutzer: {question}\nAssistent: {answer}", "gpt-4o-mini")
+
+
+def test_old_turns_are_compacted_into_summary():
+    answer = "Der Kurs dauert sechs Wochen. Danach gibt es ein Zertifikat."
+    budget = 2 * turn_tokens("Frage 1", answer)
+    session = Session("s", history_tokens=budget, summary_tokens=1000)
+    for i in range(1, 5):
+        session.add_turn(f"Frage {i}", answer)
+
+    assert [q for q, _, _ in session.turns] == ["Frage 3", "Frage 4"]
+    assert session.summary == ["- Frage 1 → Der Kurs dauert sechs Wochen.",
+                               "- Frage 2 → Der Kurs dauert sechs Wochen."]
+    rendered = session.render()
+    assert rendered.startswith("Frühere Themen:\n- Frage 1")
+    assert "Danach gibt es ein Zertifikat" not in rendered.split("Nutzer: Frage 3")[0]
+
+
+def test_latest_turn_stays_even_over_budget():
+    session = Session("s", history_tokens=1)
+    session.add_turn("Frage", "eine sehr lange Antwort " * 50)
+
+    assert len(session.turns) == 1
+    assert session.summary == []
+
+
+def test_summary_is_capped():
+    line_tokens = count_tokens("- Frage 1 → Antwort.", "gpt-4o-mini")
+    session = Session("s", history_tokens=1, summary_tokens=3 * line_tokens)
+    for i in range(1, 11):
+        session.add_turn(f"Frage {i}", "Antwort.")
+
+    assert 1 <= len(session.summary) <= 3
+    assert session.summary[-1] == "- Frage 9 → Antwort."
+
+
+def test_follow_up_query_includes_previous_question():
+    session = Session("s")
+    assert session.retrieval_query("Und in Berlin?") == "Und in Berlin?"
+
+    session.add_turn("Welche Excel Kurse gibt es?", "Einige.")
+    assert session.retrieval_query("Und in Berlin?") == "Welche Excel Kurse gibt es? Und in Berlin?"
+    long_question = "Welche Python Kurse mit Zertifikat gibt es in Hamburg online"
+    assert session.retrieval_query(long_question) == long_question
+
+
+def test_least_recently_used_session_is_evicted():
+    store = SessionStore(max_sessions=2)
+    first = store.get("a")
+    store.get("b")
+    assert store.get("a") is first
+
+    store.get("c")
+
+    assert len(store) == 2
+    assert store.get("b", create=False) is None
+    assert store.get("a", create=False) is first
+
+
+def test_expired_session_is_replaced(clock):
+    store = SessionStore(ttl=60)
+    session = store.get("a")
+    session.add_turn("Frage", "Antwort")
+
+    clock[0] += 61
+    assert store.get("a", create=False) is None
+    assert store.get("a").turns == []
+
+
+def test_evicted_session_is_spilled_and_reloaded(tmp_path):
+    store = SessionStore(max_sessions=1, spill_dir=str(tmp_path))
+    store.get("../a").add_turn("Frage", "Antwort")
+    store.get("b")
+
+    assert len(store) == 1
+    # die Session-ID kommt vom Client und landet nur gehasht im Dateinamen
+    [spilled] = tmp_path.iterdir()
+    assert len(spilled.stem) == 64 and spilled.suffix == ".json"
+
+    reloaded = store.get("../a", create=False)
+    assert [q for q, _, _ in reloaded.turns] == ["Frage"]
+
+
+def test_delete_removes_spilled_session(tmp_path):
+    store = SessionStore(max_sessions=1, spill_dir=str(tmp_path))
+    store.get("a").add_turn("Frage", "Antwort")
+    store.get("b")
+
+    store.delete("a")
+
+    assert store.get("a", create=False) is None
+    assert list(tmp_path.iterdir()) == []